@@ -1,10 +1,12 @@
 import os
+import time
 from dotenv import load_dotenv
 
 # Load .env before importing modules that read environment variables at import time.
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
 
-from flask import Flask, jsonify
+import click
+from flask import Flask, Response, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from dotenv import load_dotenv
@@ -13,16 +15,27 @@ load_dotenv()
 
 from routes.product_routes import product_bp
 from routes.invoice_routes import invoice_bp
+from routes.checkout_routes import checkout_bp
 from routes.payment_routes import payment_bp
-from routes.admin_product_import_routes import admin_import_bp
+from routes.admin_product_import_routes import admin_import_bp, run_product_import
 from routes.admin_promotion_routes import admin_promotions_bp
 from routes.admin_user_routes import admin_users_bp
 from routes.kpi_routes import kpi_bp
 from routes.recommendation_routes import recommendation_bp
+from routes.job_routes import job_bp
 
 
 from config import Config
 from extensions import db, migrate
+from services.catalog_cache import catalog_cache
+from services.http_cache import response_cache
+from services.http_client import http_client
+from services.token_cache import paypal_token_cache
+from services.kpi_snapshots import rebuild_kpi_rollups
+from services.jobs import work
+from services.request_metrics import request_metrics
+from services.reservations import DEFAULT_SWEEP_BATCH_SIZE, release_expired_reservations
+from security.authorization import admin_required
 import models
 
 from routes.auth_routes import auth_bp
@@ -105,6 +118,11 @@ def create_app(config_overrides=None):
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
+    catalog_cache.init_app(app)
+    response_cache.init_app(app)
+    http_client.init_app(app)
+    paypal_token_cache.init_app(app)
+    request_metrics.init_app(app)
 
     # Initialize JWT
     JWTManager(app)
@@ -116,12 +134,14 @@ def create_app(config_overrides=None):
     app.register_blueprint(auth_bp)
     app.register_blueprint(product_bp)
     app.register_blueprint(invoice_bp)
+    app.register_blueprint(checkout_bp)
     app.register_blueprint(payment_bp)
     app.register_blueprint(admin_import_bp)
     app.register_blueprint(admin_users_bp)
     app.register_blueprint(admin_promotions_bp)
     app.register_blueprint(kpi_bp)
     app.register_blueprint(recommendation_bp)
+    app.register_blueprint(job_bp)
 
     @app.before_request
     def ensure_super_admin():
@@ -137,6 +157,84 @@ def create_app(config_overrides=None):
     
 
 
+    @app.cli.command("rebuild-kpi-rollups")
+    def rebuild_kpi_rollups_command():
+        """Recompute the KPI daily rollups from invoices and users."""
+        result = rebuild_kpi_rollups()
+        print(f"Rebuilt KPI rollups for {result['days']} days.")
+
+    @app.cli.command("release-expired-reservations")
+    @click.option("--batch-size", default=DEFAULT_SWEEP_BATCH_SIZE, show_default=True)
+    @click.option("--interval", default=0, help="Keep sweeping every N seconds; 0 runs once.")
+    def release_expired_reservations_command(batch_size, interval):
+        """Hand stock held by abandoned invoices back to the catalog."""
+        while True:
+            try:
+                result = release_expired_reservations(batch_size=batch_size)
+            except Exception:
+                db.session.rollback()
+                if not interval:
+                    raise
+                # A failed sweep (deadlock, lost connection) is retried on the
+                # next tick instead of stopping the sweeper.
+                app.logger.exception("Releasing expired reservations failed")
+            else:
+                print(f"Released {result['units']} units from {result['invoices']} expired invoices.")
+            if not interval:
+                break
+            time.sleep(interval)
+
+    @app.cli.command("run-jobs")
+    @click.option("--poll-interval", default=1.0, show_default=True, help="Seconds to sleep when the queue is empty.")
+    @click.option("--max-jobs", default=None, type=int, help="Exit after running this many jobs.")
+    def run_jobs_command(poll_interval, max_jobs):
+        """Run queued background jobs (Algolia sync and events, product imports)."""
+        work(poll_interval=poll_interval, max_jobs=max_jobs)
+
+    @app.cli.command("import-openfoodfacts-dump")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--country", "countries", multiple=True, help="Keep products sold here, e.g. france. Repeatable.")
+    @click.option("--category", "categories", multiple=True, help="Keep products in this category. Repeatable.")
+    @click.option("--limit", default=None, type=int, help="Stop after this many products.")
+    @click.option("--batch-size", default=None, type=int, help="Products per transaction.")
+    def import_openfoodfacts_dump_command(path, countries, categories, limit, batch_size):
+        """Import products from an OpenFoodFacts JSONL or CSV dump (optionally gzipped)."""
+        if batch_size:
+            app.config["OPENFOODFACTS_DUMP_BATCH_SIZE"] = batch_size
+        started = time.monotonic()
+
+        def progress(checkpoint):
+            print(
+                f"record {checkpoint['next_record']}: {checkpoint['imported']} created, "
+                f"{checkpoint['updated']} updated, {checkpoint['skipped']} skipped "
+                f"({time.monotonic() - started:.0f}s)"
+            )
+
+        result = run_product_import(
+            source="dump",
+            dump_path=path,
+            limit=limit,
+            countries=countries,
+            categories=categories,
+            on_checkpoint=progress,
+        )
+        print(
+            f"Imported {result['imported']}, updated {result['updated']}, skipped {result['skipped']}, "
+            f"errors {result['errors']} in {time.monotonic() - started:.1f}s."
+        )
+
+    @app.cli.command("openfoodfacts-cache")
+    @click.option("--clear", is_flag=True, help="Delete every cached response.")
+    def openfoodfacts_cache_command(clear):
+        """Show (or clear) the on-disk OpenFoodFacts response cache."""
+        if not response_cache.enabled:
+            print("OpenFoodFacts cache is disabled; set OPENFOODFACTS_CACHE_PATH to enable it.")
+            return
+        if clear:
+            response_cache.clear()
+        stats = response_cache.stats()
+        print(f"{stats['entries']} responses, {stats['bytes'] / 1024 / 1024:.1f} MB in {stats['path']}")
+
     # ---------------- SYSTEM ROUTES ----------------
 
     @app.route("/", methods=["GET"])
@@ -171,6 +269,20 @@ def create_app(config_overrides=None):
         """
         return jsonify({"status": "ok"})
 
+    @app.route("/metrics", methods=["GET"])
+    @admin_required
+    def metrics():
+        """
+        Request and SQL metrics (Prometheus text format, admin only)
+        ---
+        tags:
+          - System
+        responses:
+          200:
+            description: Per-endpoint histograms for this worker process
+        """
+        return Response(request_metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
     return app
 
 
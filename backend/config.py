@@ -53,6 +53,108 @@ class Config:
         "true",
         "yes",
     )
+    # Access tokens are cached until this many seconds before they expire.
+    # By default each worker keeps its own; PAYPAL_TOKEN_CACHE_PATH shares
+    # one token file between the workers of a host, and
+    # PAYPAL_TOKEN_CACHE_BACKEND takes a dotted path to a backend class
+    # (get/set/delete, optional lock) for a store shared across hosts.
+    PAYPAL_TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv("PAYPAL_TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+    PAYPAL_TOKEN_CACHE_PATH = os.getenv("PAYPAL_TOKEN_CACHE_PATH", "")
+    PAYPAL_TOKEN_CACHE_BACKEND = os.getenv("PAYPAL_TOKEN_CACHE_BACKEND") or None
+
+    # ===============================
+    # Catalog cache configuration
+    # ===============================
+
+    # Dotted path to a shared backend class (get/set/delete_many/clear, and
+    # optionally get_counter/incr). Defaults to an in-process LRU per worker;
+    # the catalog version behind product ETags is kept in the database
+    # unless the backend has counters of its own.
+    CATALOG_CACHE_BACKEND = os.getenv("CATALOG_CACHE_BACKEND") or None
+    CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "5000"))
+
+    # /products/changes only returns changes at least this old, so rows
+    # stamped before a slow transaction committed are not skipped.
+    PRODUCT_CHANGES_LAG_SECONDS = int(os.getenv("PRODUCT_CHANGES_LAG_SECONDS", "30"))
+
+    # ===============================
+    # Stock reservations
+    # ===============================
+
+    # Stock added to an unpaid invoice is held this long after the last cart
+    # change or payment attempt; `flask release-expired-reservations` hands
+    # it back afterwards.
+    STOCK_RESERVATION_TTL_MINUTES = int(os.getenv("STOCK_RESERVATION_TTL_MINUTES", "30"))
+
+    # ===============================
+    # OpenFoodFacts import
+    # ===============================
+
+    # Barcode imports fetch this many products in parallel. Requests to the
+    # OpenFoodFacts host are also spaced to stay under its published limit
+    # of 100 product reads per minute; 0 disables the limit.
+    OPENFOODFACTS_FETCH_WORKERS = int(os.getenv("OPENFOODFACTS_FETCH_WORKERS", "8"))
+    OPENFOODFACTS_RATE_LIMIT_PER_MINUTE = int(os.getenv("OPENFOODFACTS_RATE_LIMIT_PER_MINUTE", "100"))
+    # Search imports download up to this many pages ahead of the page being
+    # written to the database.
+    OPENFOODFACTS_PREFETCH_PAGES = int(os.getenv("OPENFOODFACTS_PREFETCH_PAGES", "2"))
+    # Optional on-disk cache of product and search-page responses (a SQLite
+    # file shared by all workers). Entries are served for the TTL, then
+    # revalidated with ETag/Last-Modified; least recently used entries are
+    # evicted past the size limit. Offline mode only replays the cache.
+    OPENFOODFACTS_CACHE_PATH = os.getenv("OPENFOODFACTS_CACHE_PATH", "")
+    OPENFOODFACTS_CACHE_TTL_SECONDS = int(os.getenv("OPENFOODFACTS_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+    OPENFOODFACTS_CACHE_MAX_MB = int(os.getenv("OPENFOODFACTS_CACHE_MAX_MB", "256"))
+    OPENFOODFACTS_CACHE_OFFLINE = os.getenv("OPENFOODFACTS_CACHE_OFFLINE", "false").lower() in ("1", "true", "yes")
+    # Offline imports from the JSONL/CSV data dumps. Admins can only queue
+    # files from this directory (empty disables it for the API; the
+    # `flask import-openfoodfacts-dump` command takes any path).
+    OPENFOODFACTS_DUMP_DIR = os.getenv("OPENFOODFACTS_DUMP_DIR", "")
+    OPENFOODFACTS_DUMP_BATCH_SIZE = int(os.getenv("OPENFOODFACTS_DUMP_BATCH_SIZE", "1000"))
+
+    # ===============================
+    # Outbound HTTP (OpenFoodFacts, Algolia, PayPal)
+    # ===============================
+
+    # One keep-alive session per process with a connection pool per host.
+    # HTTP_POOL_MAXSIZE should be at least OPENFOODFACTS_FETCH_WORKERS, or the
+    # parallel import opens and drops extra connections.
+    HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+    HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))
+    # Connection errors, 429 and 5xx are retried this many times with
+    # exponential backoff (reads and statuses only for idempotent methods).
+    HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+    HTTP_RETRY_BACKOFF_SECONDS = float(os.getenv("HTTP_RETRY_BACKOFF_SECONDS", "0.5"))
+    # Used when a call does not pass its own timeout.
+    HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+    HTTP_READ_TIMEOUT_SECONDS = float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", "20"))
+
+    # ===============================
+    # Background jobs
+    # ===============================
+
+    # Jobs run in `flask run-jobs` workers. A failed attempt is retried after
+    # base * 2^(attempt-1) seconds, capped, until JOB_MAX_ATTEMPTS; a running
+    # job whose worker vanished is picked up again after the lock timeout.
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+    JOB_RETRY_BASE_SECONDS = int(os.getenv("JOB_RETRY_BASE_SECONDS", "10"))
+    JOB_RETRY_MAX_SECONDS = int(os.getenv("JOB_RETRY_MAX_SECONDS", "600"))
+    JOB_LOCK_TIMEOUT_SECONDS = int(os.getenv("JOB_LOCK_TIMEOUT_SECONDS", "900"))
+
+    # ===============================
+    # Request metrics
+    # ===============================
+
+    # Per-request SQL counts/timings: Server-Timing header, one JSON log line
+    # per request (logger "services.request_metrics", INFO) and /metrics.
+    REQUEST_METRICS_ENABLED = os.getenv("REQUEST_METRICS_ENABLED", "true").lower() in (
+        "1",
+        "true",
+        "yes",
+    )
+    # Level of the per-request log line's logger; empty leaves logging to
+    # the deployment's own configuration.
+    REQUEST_METRICS_LOG_LEVEL = os.getenv("REQUEST_METRICS_LOG_LEVEL", "INFO")
 
     # ===============================
     # Swagger configuration
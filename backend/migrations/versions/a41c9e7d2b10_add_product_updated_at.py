@@ -0,0 +1,28 @@
+"""add product updated_at
+
+Revision ID: a41c9e7d2b10
+Revises: c3a8e1f0b2d1
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a41c9e7d2b10"
+down_revision = "c3a8e1f0b2d1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("products", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("updated_at", sa.DateTime(), nullable=True))
+
+    op.execute("UPDATE products SET updated_at = created_at WHERE updated_at IS NULL")
+
+
+def downgrade():
+    with op.batch_alter_table("products", schema=None) as batch_op:
+        batch_op.drop_column("updated_at")
@@ -0,0 +1,26 @@
+"""add job checkpoint
+
+Revision ID: b3f6d1e8a4c7
+Revises: a7e3c5d9f2b4
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b3f6d1e8a4c7"
+down_revision = "a7e3c5d9f2b4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("jobs", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("checkpoint", sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("jobs", schema=None) as batch_op:
+        batch_op.drop_column("checkpoint")
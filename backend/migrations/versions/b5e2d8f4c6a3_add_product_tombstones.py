@@ -0,0 +1,40 @@
+"""add product tombstones for delta sync
+
+Revision ID: b5e2d8f4c6a3
+Revises: a41c9e7d2b10
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b5e2d8f4c6a3"
+down_revision = "a41c9e7d2b10"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "product_tombstones",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("barcode", sa.String(length=64), nullable=True),
+        sa.Column("deleted_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_product_tombstones_deleted_at",
+        "product_tombstones",
+        ["deleted_at"],
+        unique=False,
+    )
+    op.create_index("ix_products_updated_at", "products", ["updated_at"], unique=False)
+
+
+def downgrade():
+    op.drop_index("ix_products_updated_at", table_name="products")
+    op.drop_index("ix_product_tombstones_deleted_at", table_name="product_tombstones")
+    op.drop_table("product_tombstones")
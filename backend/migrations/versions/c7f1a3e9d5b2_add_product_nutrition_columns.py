@@ -0,0 +1,96 @@
+"""add typed product nutrition columns
+
+Revision ID: c7f1a3e9d5b2
+Revises: b5e2d8f4c6a3
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c7f1a3e9d5b2"
+down_revision = "b5e2d8f4c6a3"
+branch_labels = None
+depends_on = None
+
+
+# Kept local so the migration does not depend on application code.
+NUTRITION_COLUMNS = {
+    "energy_kcal_100g": "energy-kcal_100g",
+    "sugars_100g": "sugars_100g",
+    "fat_100g": "fat_100g",
+    "salt_100g": "salt_100g",
+    "proteins_100g": "proteins_100g",
+}
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _parse(value):
+    for candidate in (value, value.replace("'", '"')):
+        try:
+            parsed = json.loads(candidate)
+        except (TypeError, ValueError):
+            continue
+        return parsed if isinstance(parsed, dict) else {}
+    return {}
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def upgrade():
+    with op.batch_alter_table("products", schema=None) as batch_op:
+        for column in NUTRITION_COLUMNS:
+            batch_op.add_column(sa.Column(column, sa.Float(), nullable=True))
+
+    op.create_index("ix_products_sugars_100g", "products", ["sugars_100g"], unique=False)
+    op.create_index(
+        "ix_products_category_energy_kcal",
+        "products",
+        ["category", "energy_kcal_100g"],
+        unique=False,
+    )
+
+    bind = op.get_bind()
+    products = sa.table(
+        "products",
+        sa.column("id", sa.Integer),
+        sa.column("nutritional_info", sa.Text),
+        *[sa.column(column, sa.Float) for column in NUTRITION_COLUMNS],
+    )
+
+    # Walk the table by primary key in batches so memory stays flat.
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(products.c.id, products.c.nutritional_info)
+            .where(products.c.id > last_id, products.c.nutritional_info.isnot(None))
+            .order_by(products.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+
+        for row in rows:
+            nutriments = _parse(row.nutritional_info)
+            values = {column: _to_float(nutriments.get(key)) for column, key in NUTRITION_COLUMNS.items()}
+            if any(value is not None for value in values.values()):
+                bind.execute(products.update().where(products.c.id == row.id).values(**values))
+        last_id = rows[-1].id
+
+
+def downgrade():
+    op.drop_index("ix_products_category_energy_kcal", table_name="products")
+    op.drop_index("ix_products_sugars_100g", table_name="products")
+
+    with op.batch_alter_table("products", schema=None) as batch_op:
+        for column in reversed(list(NUTRITION_COLUMNS)):
+            batch_op.drop_column(column)
@@ -0,0 +1,30 @@
+"""add shared catalog version counters
+
+Revision ID: c9d4e2a7f6b1
+Revises: b3f6d1e8a4c7
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c9d4e2a7f6b1"
+down_revision = "b3f6d1e8a4c7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Rows are seeded on first use (see services.catalog_cache.DatabaseCounters).
+    op.create_table(
+        "catalog_versions",
+        sa.Column("key", sa.String(length=100), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("key"),
+    )
+
+
+def downgrade():
+    op.drop_table("catalog_versions")
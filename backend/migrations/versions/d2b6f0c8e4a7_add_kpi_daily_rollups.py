@@ -0,0 +1,125 @@
+"""add KPI daily rollup tables
+
+Revision ID: d2b6f0c8e4a7
+Revises: c7f1a3e9d5b2
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from datetime import date, datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d2b6f0c8e4a7"
+down_revision = "c7f1a3e9d5b2"
+branch_labels = None
+depends_on = None
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def upgrade():
+    rollups = op.create_table(
+        "kpi_daily_rollups",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("revenue", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("orders", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("new_customers", sa.Integer(), nullable=False, server_default="0"),
+        sa.PrimaryKeyConstraint("day"),
+    )
+    category_revenue = op.create_table(
+        "kpi_daily_category_revenue",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("category", sa.String(length=100), nullable=False),
+        sa.Column("revenue", sa.Float(), nullable=False, server_default="0"),
+        sa.PrimaryKeyConstraint("day", "category"),
+    )
+
+    # Backfill from existing paid invoices and customers. The result is one
+    # row per day, so building it in memory is fine.
+    bind = op.get_bind()
+    invoices = sa.table(
+        "invoices",
+        sa.column("id", sa.Integer),
+        sa.column("total_amount", sa.Float),
+        sa.column("payment_status", sa.String),
+        sa.column("paid_at", sa.DateTime),
+    )
+    invoice_items = sa.table(
+        "invoice_items",
+        sa.column("invoice_id", sa.Integer),
+        sa.column("product_id", sa.Integer),
+        sa.column("quantity", sa.Integer),
+        sa.column("unit_price", sa.Numeric(10, 2)),
+    )
+    products = sa.table("products", sa.column("id", sa.Integer), sa.column("category", sa.String))
+    users = sa.table(
+        "users",
+        sa.column("id", sa.Integer),
+        sa.column("role", sa.String),
+        sa.column("created_at", sa.DateTime),
+    )
+
+    paid = sa.and_(invoices.c.payment_status == "paid", invoices.c.paid_at.isnot(None))
+    paid_day = sa.func.date(invoices.c.paid_at)
+    days = {}
+
+    for day, revenue, orders in bind.execute(
+        sa.select(paid_day, sa.func.sum(invoices.c.total_amount), sa.func.count(invoices.c.id))
+        .where(paid)
+        .group_by(paid_day)
+    ):
+        row = days.setdefault(_as_date(day), {"revenue": 0.0, "orders": 0, "new_customers": 0})
+        row["revenue"] = float(revenue or 0)
+        row["orders"] = int(orders or 0)
+
+    created_day = sa.func.date(users.c.created_at)
+    for day, count in bind.execute(
+        sa.select(created_day, sa.func.count(users.c.id))
+        .where(users.c.role == "customer", users.c.created_at.isnot(None))
+        .group_by(created_day)
+    ):
+        row = days.setdefault(_as_date(day), {"revenue": 0.0, "orders": 0, "new_customers": 0})
+        row["new_customers"] = int(count or 0)
+
+    categories = {}
+    for day, category, revenue in bind.execute(
+        sa.select(
+            paid_day,
+            products.c.category,
+            sa.func.sum(invoice_items.c.quantity * invoice_items.c.unit_price),
+        )
+        .select_from(
+            invoices.join(invoice_items, invoice_items.c.invoice_id == invoices.c.id).join(
+                products, products.c.id == invoice_items.c.product_id
+            )
+        )
+        .where(paid)
+        .group_by(paid_day, products.c.category)
+    ):
+        key = (_as_date(day), (category or "Other")[:100])
+        categories[key] = categories.get(key, 0.0) + float(revenue or 0)
+
+    if days:
+        op.bulk_insert(rollups, [{"day": day, **values} for day, values in days.items()])
+    if categories:
+        op.bulk_insert(
+            category_revenue,
+            [
+                {"day": day, "category": category, "revenue": revenue}
+                for (day, category), revenue in categories.items()
+            ],
+        )
+
+
+def downgrade():
+    op.drop_table("kpi_daily_category_revenue")
+    op.drop_table("kpi_daily_rollups")
@@ -0,0 +1,44 @@
+"""add indexes for hot query predicates
+
+Revision ID: e4c9a2f7b1d3
+Revises: d2b6f0c8e4a7
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "e4c9a2f7b1d3"
+down_revision = "d2b6f0c8e4a7"
+branch_labels = None
+depends_on = None
+
+
+INDEXES = (
+    ("ix_invoices_user_created", "invoices", ["user_id", "created_at"]),
+    ("ix_invoices_user_status_created", "invoices", ["user_id", "payment_status", "created_at"]),
+    ("ix_invoices_paid_at", "invoices", ["paid_at"]),
+    ("ix_invoice_items_invoice_id", "invoice_items", ["invoice_id"]),
+    ("ix_invoice_items_product_id", "invoice_items", ["product_id"]),
+    ("ix_products_brand", "products", ["brand"]),
+    ("ix_products_name_brand", "products", ["name", "brand"]),
+)
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+    # Elsewhere the uq_invoices_paypal_order_id constraint already indexes
+    # webhook lookups; SQLite skipped that constraint, so index it here.
+    if op.get_bind().dialect.name == "sqlite":
+        op.create_index("ix_invoices_paypal_order_id", "invoices", ["paypal_order_id"], unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "sqlite":
+        op.drop_index("ix_invoices_paypal_order_id", table_name="invoices")
+
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
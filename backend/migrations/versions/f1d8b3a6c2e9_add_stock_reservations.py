@@ -0,0 +1,66 @@
+"""add stock reservations
+
+Revision ID: f1d8b3a6c2e9
+Revises: e4c9a2f7b1d3
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f1d8b3a6c2e9"
+down_revision = "e4c9a2f7b1d3"
+branch_labels = None
+depends_on = None
+
+
+# Matches the STOCK_RESERVATION_TTL_MINUTES default.
+BACKFILL_TTL = timedelta(minutes=30)
+
+
+def upgrade():
+    reservations = op.create_table(
+        "stock_reservations",
+        sa.Column("invoice_id", sa.Integer(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["invoice_id"], ["invoices.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("invoice_id"),
+    )
+    op.create_index("ix_stock_reservations_expires_at", "stock_reservations", ["expires_at"], unique=False)
+
+    # Open carts that already hold stock get a reservation counted from
+    # their creation, so long-abandoned ones are released on the first sweep.
+    bind = op.get_bind()
+    invoices = sa.table(
+        "invoices",
+        sa.column("id", sa.Integer),
+        sa.column("payment_status", sa.String),
+        sa.column("created_at", sa.DateTime),
+    )
+    invoice_items = sa.table("invoice_items", sa.column("invoice_id", sa.Integer))
+    rows = bind.execute(
+        sa.select(invoices.c.id, invoices.c.created_at)
+        .where(
+            invoices.c.payment_status.in_(["unpaid", "pending"]),
+            sa.exists().where(invoice_items.c.invoice_id == invoices.c.id),
+        )
+    ).all()
+    now = datetime.utcnow()
+    if rows:
+        op.bulk_insert(
+            reservations,
+            [
+                {"invoice_id": invoice_id, "expires_at": (created_at or now) + BACKFILL_TTL, "created_at": now}
+                for invoice_id, created_at in rows
+            ],
+        )
+
+
+def downgrade():
+    op.drop_index("ix_stock_reservations_expires_at", table_name="stock_reservations")
+    op.drop_table("stock_reservations")
@@ -36,11 +36,17 @@ class User(db.Model):
 
 class Product(db.Model):
     __tablename__ = "products"
+    __table_args__ = (
+        # Also serves plain category filters through its leading column.
+        db.Index("ix_products_category_energy_kcal", "category", "energy_kcal_100g"),
+        # Importer dedup for products without a barcode.
+        db.Index("ix_products_name_brand", "name", "brand"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
     name = db.Column(db.String(200), nullable=False)
-    brand = db.Column(db.String(100), nullable=False)
+    brand = db.Column(db.String(100), nullable=False, index=True)
     barcode = db.Column(db.String(64), unique=True, nullable=True)
     category = db.Column(db.String(100), nullable=False)
 
@@ -56,12 +62,20 @@ class Product(db.Model):
     icon = db.Column(db.String(20), nullable=True)
     nutritional_info = db.Column(db.Text, nullable=True)
     ingredients = db.Column(db.Text, nullable=True)
+
+    # Typed copies of nutritional_info (per 100g) for SQL filters and KPIs
+    energy_kcal_100g = db.Column(db.Float, nullable=True)
+    sugars_100g = db.Column(db.Float, nullable=True, index=True)
+    fat_100g = db.Column(db.Float, nullable=True)
+    salt_100g = db.Column(db.Float, nullable=True)
+    proteins_100g = db.Column(db.Float, nullable=True)
     dietary_tags = db.Column(db.Text, nullable=True)
 
     rating = db.Column(db.Float, nullable=True)
     reviews = db.Column(db.Integer, nullable=True)
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     invoice_items = db.relationship(
         "InvoiceItem",
@@ -71,8 +85,42 @@ class Product(db.Model):
     )
 
 
+class ProductTombstone(db.Model):
+    """
+    Record of a deleted product so delta sync clients can drop it.
+    """
+    __tablename__ = "product_tombstones"
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    product_id = db.Column(db.Integer, nullable=False)
+    barcode = db.Column(db.String(64), nullable=True)
+
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+class CatalogVersion(db.Model):
+    """
+    Shared counters, bumped after every catalog write. Product ETags are
+    built from them, so every worker process hands out the same tags.
+    """
+    __tablename__ = "catalog_versions"
+
+    key = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False)
+
+
 class Invoice(db.Model):
     __tablename__ = "invoices"
+    __table_args__ = (
+        # "My invoices", newest first.
+        db.Index("ix_invoices_user_created", "user_id", "created_at"),
+        # Recent paid invoices per user (recommendations).
+        db.Index("ix_invoices_user_status_created", "user_id", "payment_status", "created_at"),
+        # Also serves the webhook's lookup by order id; on SQLite, where the
+        # migration cannot add the constraint, ix_invoices_paypal_order_id does.
+        db.UniqueConstraint("paypal_order_id", name="uq_invoices_paypal_order_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -95,7 +143,7 @@ class Invoice(db.Model):
     payment_status = db.Column(db.String(30), nullable=False, default="unpaid")
     paypal_order_id = db.Column(db.String(128), nullable=True)
     paypal_capture_id = db.Column(db.String(128), nullable=True)
-    paid_at = db.Column(db.DateTime, nullable=True)
+    paid_at = db.Column(db.DateTime, nullable=True, index=True)
 
     user = db.relationship(
         "User",
@@ -122,13 +170,15 @@ class InvoiceItem(db.Model):
     invoice_id = db.Column(
         db.Integer,
         db.ForeignKey("invoices.id"),
-        nullable=False
+        nullable=False,
+        index=True
     )
 
     product_id = db.Column(
         db.Integer,
         db.ForeignKey("products.id"),
-        nullable=False
+        nullable=False,
+        index=True
     )
 
     quantity = db.Column(db.Integer, nullable=False)
@@ -145,6 +195,76 @@ class InvoiceItem(db.Model):
     )
 
 
+class StockReservation(db.Model):
+    """
+    Stock held by an unpaid invoice until expires_at.
+    Refreshed on every cart change; the sweeper releases expired ones.
+    """
+    __tablename__ = "stock_reservations"
+
+    invoice_id = db.Column(db.Integer, db.ForeignKey("invoices.id", ondelete="CASCADE"), primary_key=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class Job(db.Model):
+    """
+    Background job run by `flask run-jobs` workers.
+    payload, result and checkpoint hold JSON text.
+    """
+    __tablename__ = "jobs"
+    __table_args__ = (
+        db.Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=True)
+
+    # queued, running, succeeded, failed
+    status = db.Column(db.String(20), nullable=False, default="queued")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    locked_by = db.Column(db.String(255), nullable=True)
+
+    result = db.Column(db.Text, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    # Progress saved by long handlers; retries and resumes start from here.
+    checkpoint = db.Column(db.Text, nullable=True)
+
+    created_by = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+
+class KpiDailyRollup(db.Model):
+    """
+    Per-day totals for the admin dashboard, maintained incrementally when
+    invoices are paid (or reversed) and customers register.
+    """
+    __tablename__ = "kpi_daily_rollups"
+
+    day = db.Column(db.Date, primary_key=True)
+
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    new_customers = db.Column(db.Integer, nullable=False, default=0)
+
+
+class KpiDailyCategoryRevenue(db.Model):
+    """
+    Paid revenue per product category per day.
+    """
+    __tablename__ = "kpi_daily_category_revenue"
+
+    day = db.Column(db.Date, primary_key=True)
+    category = db.Column(db.String(100), primary_key=True)
+
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+
 class UserPreference(db.Model):
     __tablename__ = "user_preferences"
 
@@ -1,17 +1,23 @@
 import hashlib
 import json
+import os
 
-import requests
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity
 from sqlalchemy.exc import IntegrityError
 
 from extensions import db
 from models import Product
 from scripts.barcodes import BARCODES
 from security.authorization import admin_required
+from services.catalog_cache import catalog_cache
+from services.importer import IMPORT_BATCH_SIZE, insert_products_ignoring_conflicts, match_existing_products
+from services.jobs import enqueue_job, job_checkpoint, job_handler, job_json, save_checkpoint
+from services.nutrition import NUTRITION_COLUMNS, nutrition_columns
+from services.openfoodfacts_dump import dump_format, iter_dump_products
 from services.openfoodfacts_service import (
-    fetch_product_by_barcode,
-    fetch_products_page,
+    fetch_products_by_barcodes,
+    prefetch_products_pages,
 )
 
 
@@ -282,40 +288,38 @@ def _build_product_payload(data, fallback_barcode=None):
         "nutritional_info": json.dumps(nutriments) if nutriments else None,
         "ingredients": json.dumps(ingredients) if ingredients else None,
         "dietary_tags": json.dumps(dietary_tags) if dietary_tags else None,
+        **nutrition_columns(nutriments if isinstance(nutriments, dict) else None),
     }
 
 
-def _upsert_product(payload):
+def _apply_payload(existing, payload):
+    """Merge an imported payload into an existing (or pending) product."""
+    barcode = payload.get("barcode")
+    existing.category = payload["category"] or existing.category
+    existing.unit = payload["unit"] or existing.unit
+    existing.description = payload["description"] or existing.description
+    existing.picture_url = payload["picture_url"] or existing.picture_url
+    if payload["nutritional_info"]:
+        existing.nutritional_info = payload["nutritional_info"]
+        for column in NUTRITION_COLUMNS:
+            setattr(existing, column, payload[column])
+    existing.ingredients = payload["ingredients"] or existing.ingredients
+    existing.dietary_tags = payload["dietary_tags"] or existing.dietary_tags
+    if barcode and not existing.barcode:
+        existing.barcode = barcode
+
+    if not existing.price or existing.price <= 0:
+        existing.price = _infer_price(payload, barcode or str(existing.id), existing_price=existing.price)
+    if not existing.original_price or existing.original_price < existing.price:
+        existing.original_price = round(float(existing.price) * 1.12, 2)
+    if not existing.quantity_in_stock or existing.quantity_in_stock <= 0:
+        existing.quantity_in_stock = _infer_stock(barcode or str(existing.id))
+
+
+def _new_product(payload):
     barcode = payload.get("barcode")
-    existing = None
-    if barcode:
-        existing = Product.query.filter_by(barcode=barcode).first()
-    if not existing:
-        existing = Product.query.filter_by(name=payload["name"], brand=payload["brand"]).first()
-
-    if existing:
-        existing.category = payload["category"] or existing.category
-        existing.unit = payload["unit"] or existing.unit
-        existing.description = payload["description"] or existing.description
-        existing.picture_url = payload["picture_url"] or existing.picture_url
-        existing.nutritional_info = payload["nutritional_info"] or existing.nutritional_info
-        existing.ingredients = payload["ingredients"] or existing.ingredients
-        existing.dietary_tags = payload["dietary_tags"] or existing.dietary_tags
-        if barcode and not existing.barcode:
-            existing.barcode = barcode
-
-        if not existing.price or existing.price <= 0:
-            existing.price = _infer_price(payload, barcode or str(existing.id), existing_price=existing.price)
-        if not existing.original_price or existing.original_price < existing.price:
-            existing.original_price = round(float(existing.price) * 1.12, 2)
-        if not existing.quantity_in_stock or existing.quantity_in_stock <= 0:
-            existing.quantity_in_stock = _infer_stock(barcode or str(existing.id))
-
-        db.session.commit()
-        return "updated"
-
     price = _infer_price(payload, barcode or payload["name"])
-    product = Product(
+    return Product(
         name=payload["name"],
         brand=payload["brand"],
         barcode=barcode,
@@ -329,13 +333,99 @@ def _upsert_product(payload):
         nutritional_info=payload["nutritional_info"],
         ingredients=payload["ingredients"],
         dietary_tags=payload["dietary_tags"],
+        **{column: payload[column] for column in NUTRITION_COLUMNS},
     )
 
+
+def _upsert_product(payload):
+    barcode = payload.get("barcode")
+    existing = None
+    if barcode:
+        existing = Product.query.filter_by(barcode=barcode).first()
+    if not existing:
+        existing = Product.query.filter_by(name=payload["name"], brand=payload["brand"]).first()
+
+    if existing:
+        _apply_payload(existing, payload)
+        db.session.commit()
+        catalog_cache.invalidate(existing.id)
+        return "updated"
+
+    product = _new_product(payload)
     db.session.add(product)
     db.session.commit()
+    catalog_cache.invalidate(product.id)
     return "created"
 
 
+def _upsert_products_one_by_one(payloads):
+    statuses = []
+    for payload in payloads:
+        try:
+            statuses.append(_upsert_product(payload))
+        except IntegrityError:
+            db.session.rollback()
+            statuses.append("skipped")
+        except Exception:  # noqa: BLE001
+            db.session.rollback()
+            statuses.append("error")
+    return statuses
+
+
+def _upsert_products(payloads):
+    """
+    Upsert a batch of payloads in one transaction and return one status per
+    payload ("created", "updated", "skipped" or "error"), the same ones
+    _upsert_product would report row by row.
+
+    Existing rows are resolved with one IN query per key, updates go out
+    with the commit and new rows in one INSERT ... ON CONFLICT DO NOTHING,
+    so a product a concurrent import created first counts as skipped, as
+    the IntegrityError did before. Should the batch fail, it is retried
+    row by row so the counts stay exact.
+    """
+    if not payloads:
+        return []
+
+    by_barcode, by_name_brand = match_existing_products(payloads)
+    statuses = []
+    pending = []
+    updated_ids = set()
+    try:
+        for payload in payloads:
+            barcode = payload.get("barcode")
+            product = by_barcode.get(barcode) if barcode else None
+            if product is None:
+                product = by_name_brand.get((payload["name"], payload["brand"]))
+
+            if product is None:
+                # Later duplicates in this batch update the pending row.
+                product = _new_product(payload)
+                pending.append((len(statuses), product))
+                statuses.append("created")
+            else:
+                _apply_payload(product, payload)
+                statuses.append("updated")
+                if product.id is not None:
+                    updated_ids.add(product.id)
+
+            if product.barcode:
+                by_barcode.setdefault(product.barcode, product)
+            by_name_brand.setdefault((product.name, product.brand), product)
+
+        inserted = insert_products_ignoring_conflicts([product for _, product in pending])
+        for index, product in pending:
+            if product.barcode and product.barcode not in inserted:
+                statuses[index] = "skipped"
+        db.session.commit()
+    except Exception:  # noqa: BLE001
+        db.session.rollback()
+        return _upsert_products_one_by_one(payloads)
+
+    catalog_cache.invalidate(*updated_ids)
+    return statuses
+
+
 def _parse_positive_int(value, field_name, default=None, max_allowed=None):
     if value is None:
         return default
@@ -354,156 +444,341 @@ def _parse_positive_int(value, field_name, default=None, max_allowed=None):
     return parsed
 
 
-@admin_import_bp.post("/import")
-@admin_required
-def import_products():
-    """
-    Import products from OpenFoodFacts.
-    Query params:
-    - source=search|barcodes (default: search)
-    - pages (search mode only, default: 12)
-    - page_size (search mode only, default: 100, max: 100)
-    - limit (optional max products to process)
-    """
-    source = (_clean_text(request.args.get("source")) or "search").lower()
-    if source not in {"search", "barcodes"}:
-        return jsonify({"message": "source must be 'search' or 'barcodes'"}), 400
+class ImportSourceUnavailable(Exception):
+    """OpenFoodFacts could not be reached; result holds the stats so far."""
 
-    try:
-        limit = _parse_positive_int(request.args.get("limit"), "limit", default=None)
-        pages = _parse_positive_int(request.args.get("pages"), "pages", default=12)
-        page_size = _parse_positive_int(request.args.get("page_size"), "page_size", default=100, max_allowed=100)
-    except ValueError as exc:
-        return jsonify({"message": str(exc)}), 400
+    def __init__(self, result):
+        super().__init__(f"{result['message']}: {result.get('last_network_error')}")
+        self.result = result
 
-    imported = 0
-    updated = 0
-    skipped = 0
-    errors = 0
-    attempted = 0
-    last_network_error = None
 
-    def process_payload(raw_product, fallback_barcode=None):
-        nonlocal imported, updated, skipped, errors, attempted
-        attempted += 1
+IMPORT_COUNTERS = ("attempted", "imported", "updated", "skipped", "errors")
 
-        payload = _build_product_payload(raw_product, fallback_barcode=fallback_barcode)
-        if not payload:
-            skipped += 1
-            return
 
-        try:
-            status = _upsert_product(payload)
+def run_product_import(
+    source="search",
+    limit=None,
+    pages=12,
+    page_size=100,
+    barcodes=None,
+    dump_path=None,
+    countries=None,
+    categories=None,
+    checkpoint=None,
+    on_checkpoint=None,
+):
+    """
+    Import products from OpenFoodFacts and return the stats. Raises
+    ImportSourceUnavailable when the first fetches all fail. barcodes
+    overrides the built-in list for source="barcodes". source="dump"
+    streams the JSONL or CSV export at dump_path instead, keeping only
+    products sold in `countries` and filed under `categories`; it needs no
+    network and writes OPENFOODFACTS_DUMP_BATCH_SIZE products per batch.
+
+    Downloads run ahead of the database work (parallel barcode lookups,
+    prefetched search pages) and products are written IMPORT_BATCH_SIZE at
+    a time, one transaction per batch.
+
+    After each committed batch (barcodes) or page (search) the progress is
+    passed to on_checkpoint (dumps: after each batch, as a record number). Passing that dict back as checkpoint carries
+    on after the last saved position with the counts so far. The first
+    barcode or page that cannot be fetched holds the checkpoint where it
+    is, so a resumed run fetches it again. Writes are upserts, so a batch
+    replayed after a crash between its commit and its checkpoint updates
+    the same rows instead of duplicating them.
+    """
+    checkpoint = checkpoint or {}
+    counts = {key: int(checkpoint.get(key, 0)) for key in IMPORT_COUNTERS}
+    # Only writes made by this run count against the "unreachable" stop.
+    written_before = counts["imported"] + counts["updated"]
+    last_network_error = checkpoint.get("last_network_error")
+    checkpoint_held = False
+
+    def save(**position):
+        if on_checkpoint is not None and not checkpoint_held:
+            on_checkpoint({**position, **counts, "last_network_error": last_network_error})
+
+    def nothing_written():
+        return counts["imported"] + counts["updated"] == written_before
+
+    def process_batch(rows):
+        """rows: (raw_product, fallback_barcode) pairs."""
+        counts["attempted"] += len(rows)
+
+        payloads = []
+        for raw_product, fallback_barcode in rows:
+            payload = _build_product_payload(raw_product, fallback_barcode=fallback_barcode)
+            if payload:
+                payloads.append(payload)
+            else:
+                counts["skipped"] += 1
+
+        for status in _upsert_products(payloads):
             if status == "created":
-                imported += 1
+                counts["imported"] += 1
+            elif status == "updated":
+                counts["updated"] += 1
+            elif status == "skipped":
+                counts["skipped"] += 1
             else:
-                updated += 1
-        except IntegrityError:
-            db.session.rollback()
-            skipped += 1
-        except Exception:  # noqa: BLE001
-            db.session.rollback()
-            errors += 1
+                counts["errors"] += 1
+
+    def summary():
+        return {
+            "processed": counts["imported"] + counts["updated"] + counts["skipped"] + counts["errors"],
+            "imported": counts["imported"],
+            "updated": counts["updated"],
+            "skipped": counts["skipped"],
+            "errors": counts["errors"],
+        }
+
+    def unreachable(**extra):
+        return ImportSourceUnavailable(
+            {
+                "message": "Import stopped: cannot reach OpenFoodFacts",
+                "source": source,
+                **extra,
+                **summary(),
+                "last_network_error": last_network_error,
+            }
+        )
 
     if source == "barcodes":
-        selected_barcodes = BARCODES[:limit] if limit else BARCODES
+        available_barcodes = BARCODES if barcodes is None else barcodes
+        selected_barcodes = available_barcodes[:limit] if limit else available_barcodes
+        resume_from = min(int(checkpoint.get("next_barcode", 0)), len(selected_barcodes))
+        position = resume_from
         consecutive_network_errors = 0
-
-        for barcode in selected_barcodes:
-            try:
-                data = fetch_product_by_barcode(barcode)
-                consecutive_network_errors = 0
-                if not data:
-                    skipped += 1
-                    attempted += 1
+        batch = []
+
+        def flush():
+            nonlocal batch
+            process_batch(batch)
+            batch = []
+            save(next_barcode=position)
+
+        # Downloads run ahead in a thread pool; writes stay on this thread
+        # and its session, in barcode order.
+        fetched = fetch_products_by_barcodes(
+            selected_barcodes[resume_from:],
+            workers=current_app.config.get("OPENFOODFACTS_FETCH_WORKERS", 8),
+            per_minute=current_app.config.get("OPENFOODFACTS_RATE_LIMIT_PER_MINUTE"),
+        )
+        try:
+            for barcode, data, network_error in fetched:
+                if network_error is None:
+                    position += 1
+                    consecutive_network_errors = 0
+                    if not data:
+                        counts["skipped"] += 1
+                        counts["attempted"] += 1
+                        continue
+                    batch.append((data, barcode))
+                    if len(batch) >= IMPORT_BATCH_SIZE:
+                        flush()
                     continue
-                process_payload(data, fallback_barcode=barcode)
-            except requests.RequestException as exc:
-                db.session.rollback()
-                errors += 1
-                attempted += 1
+
+                if not checkpoint_held:
+                    # Commit what came before this barcode and stop the
+                    # checkpoint here; the rest of the run is redone on resume.
+                    flush()
+                    checkpoint_held = True
+                position += 1
+                counts["errors"] += 1
+                counts["attempted"] += 1
                 consecutive_network_errors += 1
-                last_network_error = str(exc)
-
-                if imported == 0 and updated == 0 and consecutive_network_errors >= 3:
-                    return jsonify(
-                        {
-                            "message": "Import stopped: cannot reach OpenFoodFacts",
-                            "source": source,
-                            "attempted": len(selected_barcodes),
-                            "processed": imported + updated + skipped + errors,
-                            "imported": imported,
-                            "updated": updated,
-                            "skipped": skipped,
-                            "errors": errors,
-                            "last_network_error": last_network_error,
-                        }
-                    ), 502
+                last_network_error = str(network_error)
+
+                if consecutive_network_errors >= 3:
+                    # Write what is buffered first: the stop only applies
+                    # while nothing at all could be imported.
+                    flush()
+                    if nothing_written():
+                        raise unreachable(attempted=len(selected_barcodes))
+            flush()
+        finally:
+            fetched.close()
+    elif source == "dump":
+        resume_from = int(checkpoint.get("next_record", 0))
+        batch_size = current_app.config.get("OPENFOODFACTS_DUMP_BATCH_SIZE", 1000)
+        batch = []
+        # Last record handled; the one that trips `limit` is not.
+        processed = saved = resume_from
+
+        records = iter_dump_products(dump_path, countries=countries, categories=categories, start=resume_from)
+        try:
+            for position, raw_product in records:
+                if limit and counts["attempted"] + len(batch) >= limit:
+                    break
+                processed = position
+                if raw_product is None:
+                    counts["attempted"] += 1
+                    counts["errors"] += 1
+                    continue
+                batch.append((raw_product, None))
+                if len(batch) >= batch_size:
+                    process_batch(batch)
+                    batch = []
+                    save(next_record=processed)
+                    saved = processed
+            process_batch(batch)
+            if processed != saved:
+                save(next_record=processed)
+        finally:
+            records.close()
     else:
-        processed_limit_reached = False
+        resume_from = int(checkpoint.get("page", 0))
         consecutive_network_errors = 0
-        off_total_count = None
 
-        for page in range(1, pages + 1):
-            if limit and attempted >= limit:
-                processed_limit_reached = True
-                break
+        fetched_pages = prefetch_products_pages(
+            pages,
+            page_size=page_size,
+            depth=current_app.config.get("OPENFOODFACTS_PREFETCH_PAGES", 2),
+            first_page=resume_from + 1,
+        )
+        try:
+            for page, page_result, network_error in fetched_pages:
+                if limit and counts["attempted"] >= limit:
+                    break
 
-            try:
-                page_result = fetch_products_page(page=page, page_size=page_size)
+                if network_error is not None:
+                    counts["errors"] += 1
+                    consecutive_network_errors += 1
+                    last_network_error = str(network_error)
+                    if nothing_written() and consecutive_network_errors >= 3:
+                        raise unreachable(attempted_pages=pages)
+                    # Later pages are still written, but a resumed run
+                    # starts again from this one.
+                    checkpoint_held = True
+                    continue
                 consecutive_network_errors = 0
-            except requests.RequestException as exc:
-                errors += 1
-                consecutive_network_errors += 1
-                last_network_error = str(exc)
-                if imported == 0 and updated == 0 and consecutive_network_errors >= 3:
-                    return jsonify(
-                        {
-                            "message": "Import stopped: cannot reach OpenFoodFacts",
-                            "source": source,
-                            "attempted_pages": pages,
-                            "processed": imported + updated + skipped + errors,
-                            "imported": imported,
-                            "updated": updated,
-                            "skipped": skipped,
-                            "errors": errors,
-                            "last_network_error": last_network_error,
-                        }
-                    ), 502
-                continue
-
-            if off_total_count is None:
-                off_total_count = page_result.get("count")
-
-            products = page_result.get("products") or []
-            if not products:
-                break
-
-            for row in products:
-                if limit and attempted >= limit:
-                    processed_limit_reached = True
+
+                products = page_result.get("products") or []
+                if not products:
                     break
-                process_payload(row, fallback_barcode=_extract_barcode(row))
 
-            if processed_limit_reached:
-                break
+                if limit:
+                    products = products[: limit - counts["attempted"]]
+                process_batch([(row, _extract_barcode(row)) for row in products])
+                save(page=page)
+        finally:
+            fetched_pages.close()
 
     result = {
         "message": "Import completed",
         "source": source,
-        "attempted": attempted,
-        "processed": imported + updated + skipped + errors,
-        "imported": imported,
-        "updated": updated,
-        "skipped": skipped,
-        "errors": errors,
+        "attempted": counts["attempted"],
+        **summary(),
     }
     if source == "barcodes":
-        result["total_available"] = len(BARCODES)
+        result["total_available"] = len(BARCODES if barcodes is None else barcodes)
     if source == "search":
         result["pages_requested"] = pages
         result["page_size"] = page_size
+    if source == "dump":
+        result["file"] = os.path.basename(dump_path)
+        result["countries"] = list(countries or [])
+        result["categories"] = list(categories or [])
+    if checkpoint:
+        position_key = {"barcodes": "next_barcode", "dump": "next_record"}.get(source, "page")
+        result["resumed_from"] = {position_key: resume_from}
     if last_network_error:
         result["last_network_error"] = last_network_error
 
-    return jsonify(result), 200
+    return result
+
+
+def resolve_dump_file(name):
+    """
+    Absolute path of a dump file inside OPENFOODFACTS_DUMP_DIR. Raises
+    ValueError when dump imports are disabled, the name escapes the
+    directory, the file is missing or its format is not supported.
+    """
+    dump_dir = current_app.config.get("OPENFOODFACTS_DUMP_DIR")
+    if not dump_dir:
+        raise ValueError("Dump imports are disabled; set OPENFOODFACTS_DUMP_DIR")
+    if not name:
+        raise ValueError("file is required for source=dump")
+
+    root = os.path.realpath(dump_dir)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        raise ValueError(f"Dump file not found: {name}")
+    dump_format(path)
+    return path
+
+
+def _split_list_arg(name):
+    values = []
+    for value in request.args.getlist(name):
+        values.extend(part.strip() for part in value.split(",") if part.strip())
+    return values
+
+
+@job_handler("products.import")
+def _import_products_job(source, limit, pages, page_size, file=None, countries=None, categories=None):
+    # Raising on an unreachable source lets the job queue retry with backoff;
+    # every attempt (and a resume after the last one) starts from the
+    # job's checkpoint rather than from the first page.
+    return run_product_import(
+        source=source,
+        limit=limit,
+        pages=pages,
+        page_size=page_size,
+        dump_path=resolve_dump_file(file) if source == "dump" else None,
+        countries=countries,
+        categories=categories,
+        checkpoint=job_checkpoint(),
+        on_checkpoint=save_checkpoint,
+    )
+
+
+@admin_import_bp.post("/import")
+@admin_required
+def import_products():
+    """
+    Queue an import of products from OpenFoodFacts.
+    Query params:
+    - source=search|barcodes|dump (default: search)
+    - pages (search mode only, default: 12)
+    - page_size (search mode only, default: 100, max: 100)
+    - file (dump mode only: a JSONL/CSV export, optionally gzipped, in
+      OPENFOODFACTS_DUMP_DIR)
+    - country, category (dump mode only, repeatable or comma-separated:
+      keep products sold there / filed there, e.g. country=france)
+    - limit (optional max products to process)
+    Returns 202 with the job; poll GET /jobs/<id> for the stats and
+    checkpoint, and POST /jobs/<id>/resume to carry on after a failure.
+    """
+    source = (_clean_text(request.args.get("source")) or "search").lower()
+    if source not in {"search", "barcodes", "dump"}:
+        return jsonify({"message": "source must be 'search', 'barcodes' or 'dump'"}), 400
+
+    try:
+        limit = _parse_positive_int(request.args.get("limit"), "limit", default=None)
+        pages = _parse_positive_int(request.args.get("pages"), "pages", default=12)
+        page_size = _parse_positive_int(request.args.get("page_size"), "page_size", default=100, max_allowed=100)
+    except ValueError as exc:
+        return jsonify({"message": str(exc)}), 400
+
+    job_payload = {"source": source, "limit": limit, "pages": pages, "page_size": page_size}
+    if source == "dump":
+        try:
+            resolve_dump_file(request.args.get("file"))
+        except ValueError as exc:
+            return jsonify({"message": str(exc)}), 400
+        job_payload.update(
+            file=request.args.get("file"),
+            countries=_split_list_arg("country"),
+            categories=_split_list_arg("category"),
+        )
+
+    job = enqueue_job(
+        "products.import",
+        job_payload,
+        created_by=int(get_jwt_identity()),
+    )
+    payload = {"message": "Import queued", "job": job_json(job), "status_url": f"/jobs/{job.id}"}
+    db.session.commit()
+
+    return jsonify(payload), 202
@@ -12,6 +12,7 @@ from flask_jwt_extended import (
 from extensions import db
 from models import User, UserPreference
 from security_utils import hash_password
+from services.kpi_snapshots import record_customer_registered
 
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/auth")
@@ -170,6 +171,7 @@ def register():
     )
 
     db.session.add(user)
+    record_customer_registered(user)
     db.session.commit()
 
     return jsonify(
@@ -0,0 +1,78 @@
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from extensions import db
+from routes.invoice_routes import build_invoice
+from services.basket import parse_basket_lines, reserve_basket
+from services.catalog_cache import catalog_cache
+from services.reservations import hold_reservation
+
+
+checkout_bp = Blueprint("checkout", __name__, url_prefix="/checkout")
+
+
+@checkout_bp.post("")
+@jwt_required()
+def checkout():
+    """
+    Create an invoice with its items and reserve stock in one transaction
+    ---
+    tags:
+      - Invoices
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            deliveryAddress:
+              type: object
+            paymentMethod:
+              type: string
+            items:
+              type: array
+              items:
+                type: object
+                properties:
+                  product_id:
+                    type: integer
+                  quantity:
+                    type: integer
+    responses:
+      201:
+        description: Invoice created with every item reserved
+      400:
+        description: Nothing was created; errors or per-line results explain why
+    """
+    user_id = int(get_jwt_identity())
+    data = request.get_json(silent=True) or {}
+
+    # Validate everything before touching the database so row locks are
+    # only held for the writes themselves.
+    invoice, errors = build_invoice(user_id, data)
+    parsed, basket_error = parse_basket_lines(data.get("items"))
+    if basket_error:
+        errors = {**(errors or {}), "items": basket_error}
+    if errors:
+        return jsonify({"errors": errors}), 400
+
+    db.session.add(invoice)
+    results, reserved = reserve_basket(invoice, parsed)
+    if not reserved:
+        db.session.rollback()
+        return jsonify({"message": "Checkout failed, nothing was ordered", "results": results}), 400
+
+    payload = {
+        "message": "Checkout completed",
+        "invoice_id": invoice.id,
+        "created_at": invoice.created_at.isoformat(),
+        "payment_status": invoice.payment_status,
+        "total_amount": float(invoice.total_amount),
+        "results": results,
+    }
+    hold_reservation(invoice)
+    db.session.commit()
+    catalog_cache.forget(*{result["product_id"] for result in results})
+
+    return jsonify(payload), 201
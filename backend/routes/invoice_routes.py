@@ -1,8 +1,15 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import joinedload, selectinload
 
 from extensions import db
 from models import Invoice, InvoiceItem, Product
+from services.basket import parse_basket_lines, parse_quantity, reserve_basket
+from services.catalog_cache import catalog_cache
+from services.inventory import release_stock, reserve_stock, stock_levels
+from services.reservations import hold_reservation
+from services.streaming import STREAM_BATCH_SIZE, requested_stream_format, stream_json_rows
 
 
 invoice_bp = Blueprint("invoices", __name__, url_prefix="/invoices")
@@ -56,16 +63,31 @@ def _validate_billing_fields(delivery):
     }
 
 
-def parse_quantity(value):
-    if value is None:
-        return None, "quantity is required"
-    try:
-        quantity = int(value)
-    except (TypeError, ValueError):
-        return None, "quantity must be an integer"
-    if quantity <= 0:
-        return None, "quantity must be greater than 0"
-    return quantity, None
+def build_invoice(user_id, data):
+    """
+    Build an unsaved Invoice from a request body with deliveryAddress and
+    paymentMethod. Returns (invoice, None) or (None, errors).
+    """
+    delivery = data.get("deliveryAddress") or {}
+    billing = _validate_billing_fields(delivery)
+    if billing["errors"]:
+        return None, billing["errors"]
+
+    invoice = Invoice(
+        user_id=user_id,
+        total_amount=0,
+        delivery_full_name=f"{billing['first_name']} {billing['last_name']}".strip(),
+        delivery_email=delivery.get("email"),
+        delivery_phone=delivery.get("phone"),
+        delivery_address=billing["address"],
+        delivery_apartment=delivery.get("apartment"),
+        delivery_city=billing["city"],
+        delivery_state=delivery.get("state"),
+        delivery_zip_code=billing["zip_code"],
+        delivery_notes=delivery.get("deliveryNotes"),
+        payment_method=data.get("paymentMethod"),
+    )
+    return invoice, None
 
 
 def get_owned_invoice(invoice_id, user_id):
@@ -74,6 +96,9 @@ def get_owned_invoice(invoice_id, user_id):
         return None, (jsonify({"message": "Invoice not found"}), 404)
     if invoice.user_id != user_id:
         return None, (jsonify({"message": "You are not allowed to modify this invoice"}), 403)
+    if invoice.payment_status == "expired":
+        # Its stock went back to the catalog; start a new invoice instead.
+        return None, (jsonify({"message": "Invoice has expired"}), 409)
     return invoice, None
 
 
@@ -94,26 +119,9 @@ def create_invoice():
     user_id = int(get_jwt_identity())
 
     data = request.get_json(silent=True) or {}
-    delivery = data.get("deliveryAddress") or {}
-    billing = _validate_billing_fields(delivery)
-
-    if billing["errors"]:
-        return jsonify({"errors": billing["errors"]}), 400
-
-    invoice = Invoice(
-        user_id=user_id,
-        total_amount=0,
-        delivery_full_name=f"{billing['first_name']} {billing['last_name']}".strip(),
-        delivery_email=delivery.get("email"),
-        delivery_phone=delivery.get("phone"),
-        delivery_address=billing["address"],
-        delivery_apartment=delivery.get("apartment"),
-        delivery_city=billing["city"],
-        delivery_state=delivery.get("state"),
-        delivery_zip_code=billing["zip_code"],
-        delivery_notes=delivery.get("deliveryNotes"),
-        payment_method=data.get("paymentMethod"),
-    )
+    invoice, errors = build_invoice(user_id, data)
+    if errors:
+        return jsonify({"errors": errors}), 400
 
     db.session.add(invoice)
     db.session.commit()
@@ -159,9 +167,10 @@ def add_invoice_item(invoice_id):
     if not product:
         return jsonify({"message": "Product not found"}), 404
 
-    if product.quantity_in_stock < quantity:
+    if reserve_stock(product.id, quantity) is None:
+        db.session.rollback()
         return jsonify(
-            {"message": "Not enough stock", "available_stock": product.quantity_in_stock}
+            {"message": "Not enough stock", "available_stock": stock_levels([product.id]).get(product.id, 0)}
         ), 400
 
     unit_price = product.price
@@ -174,11 +183,13 @@ def add_invoice_item(invoice_id):
         unit_price=unit_price,
     )
 
-    product.quantity_in_stock -= quantity
-    invoice.total_amount = float(invoice.total_amount) + line_total
+    # Computed in SQL so concurrent edits of one invoice do not lose updates.
+    invoice.total_amount = Invoice.total_amount + line_total
 
     db.session.add(item)
+    hold_reservation(invoice)
     db.session.commit()
+    catalog_cache.forget(product.id)
 
     return jsonify(
         {
@@ -196,6 +207,66 @@ def add_invoice_item(invoice_id):
     ), 201
 
 
+@invoice_bp.post("/<int:invoice_id>/items/bulk")
+@jwt_required()
+def add_invoice_items_bulk(invoice_id):
+    """
+    Add several items to an invoice in one transaction
+    ---
+    tags:
+      - Invoices
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            items:
+              type: array
+              items:
+                type: object
+                properties:
+                  product_id:
+                    type: integer
+                  quantity:
+                    type: integer
+    responses:
+      201:
+        description: All items added; one result per line
+      400:
+        description: Nothing was added; per-line results say which lines failed
+    """
+    user_id = int(get_jwt_identity())
+    data = request.get_json(silent=True) or {}
+
+    parsed, basket_error = parse_basket_lines(data.get("items"))
+    if basket_error:
+        return jsonify({"errors": {"items": basket_error}}), 400
+
+    invoice, invoice_error = get_owned_invoice(invoice_id, user_id)
+    if invoice_error:
+        return invoice_error
+
+    results, reserved = reserve_basket(invoice, parsed)
+    if not reserved:
+        db.session.rollback()
+        return jsonify({"message": "No items were added", "results": results}), 400
+
+    # Build the response before commit expires every row it touches.
+    payload = {
+        "message": "Items added successfully",
+        "invoice_id": invoice.id,
+        "results": results,
+        "new_total_amount": float(invoice.total_amount),
+    }
+    hold_reservation(invoice)
+    db.session.commit()
+    catalog_cache.forget(*{result["product_id"] for result in results})
+
+    return jsonify(payload), 201
+
+
 @invoice_bp.patch("/<int:invoice_id>/items/<int:item_id>")
 @jwt_required()
 def update_invoice_item(invoice_id, item_id):
@@ -227,22 +298,21 @@ def update_invoice_item(invoice_id, item_id):
     old_quantity = item.quantity
     quantity_delta = new_quantity - old_quantity
 
-    if quantity_delta > 0 and product.quantity_in_stock < quantity_delta:
+    if quantity_delta > 0 and reserve_stock(product.id, quantity_delta) is None:
+        db.session.rollback()
         return jsonify(
-            {"message": "Not enough stock", "available_stock": product.quantity_in_stock}
+            {"message": "Not enough stock", "available_stock": stock_levels([product.id]).get(product.id, 0)}
         ), 400
+    if quantity_delta < 0:
+        release_stock(product.id, abs(quantity_delta))
 
-    if quantity_delta > 0:
-        product.quantity_in_stock -= quantity_delta
-    elif quantity_delta < 0:
-        product.quantity_in_stock += abs(quantity_delta)
-
-    invoice.total_amount = float(invoice.total_amount) + (
-        float(item.unit_price) * quantity_delta
-    )
+    invoice.total_amount = Invoice.total_amount + float(item.unit_price) * quantity_delta
     item.quantity = new_quantity
 
+    hold_reservation(invoice)
     db.session.commit()
+    if quantity_delta:
+        catalog_cache.forget(product.id)
 
     return jsonify(
         {
@@ -283,11 +353,16 @@ def delete_invoice_item(invoice_id, item_id):
         return jsonify({"message": "Product not found"}), 404
 
     line_total = float(item.unit_price) * item.quantity
-    product.quantity_in_stock += item.quantity
-    invoice.total_amount = max(0.0, float(invoice.total_amount) - line_total)
+    release_stock(product.id, item.quantity)
+    invoice.total_amount = case(
+        (Invoice.total_amount > line_total, Invoice.total_amount - line_total),
+        else_=0.0,
+    )
 
     db.session.delete(item)
+    hold_reservation(invoice)
     db.session.commit()
+    catalog_cache.forget(product.id)
 
     return jsonify(
         {
@@ -310,7 +385,12 @@ def get_invoice_details(invoice_id):
       - Invoices
     """
     user_id = int(get_jwt_identity())
-    invoice = Invoice.query.get(invoice_id)
+    # Items and their products in one extra query instead of one per line.
+    invoice = (
+        Invoice.query.options(selectinload(Invoice.invoice_items).joinedload(InvoiceItem.product))
+        .filter_by(id=invoice_id)
+        .first()
+    )
     if not invoice:
         return jsonify({"message": "Invoice not found"}), 404
 
@@ -357,6 +437,18 @@ def get_invoice_details(invoice_id):
     ), 200
 
 
+def _invoice_summary_json(row):
+    invoice, item_count = row
+    return {
+        "invoice_id": invoice.id,
+        "total_amount": float(invoice.total_amount),
+        "created_at": invoice.created_at.isoformat(),
+        "payment_status": invoice.payment_status,
+        "payment_method": invoice.payment_method,
+        "item_count": int(item_count or 0),
+    }
+
+
 @invoice_bp.get("/me")
 @jwt_required()
 def get_my_invoices():
@@ -365,25 +457,36 @@ def get_my_invoices():
     ---
     tags:
       - Invoices
+    parameters:
+      - name: stream
+        in: query
+        type: boolean
+        required: false
+        description: Stream the list incrementally
+      - name: format
+        in: query
+        type: string
+        required: false
+        description: ndjson to stream one invoice per line
     """
     user_id = int(get_jwt_identity())
-    invoices = (
-        Invoice.query.filter_by(user_id=user_id)
+
+    item_count = (
+        select(func.count(InvoiceItem.id))
+        .where(InvoiceItem.invoice_id == Invoice.id)
+        .correlate(Invoice)
+        .scalar_subquery()
+    )
+    query = (
+        db.session.query(Invoice, item_count)
+        .filter(Invoice.user_id == user_id)
         .order_by(Invoice.created_at.desc())
-        .all()
     )
 
-    result = []
-    for invoice in invoices:
-        result.append(
-            {
-                "invoice_id": invoice.id,
-                "total_amount": float(invoice.total_amount),
-                "created_at": invoice.created_at.isoformat(),
-                "payment_status": invoice.payment_status,
-                "payment_method": invoice.payment_method,
-                "item_count": len(invoice.invoice_items),
-            }
-        )
+    stream_format = requested_stream_format()
+    if stream_format:
+        return stream_json_rows(query.yield_per(STREAM_BATCH_SIZE), _invoice_summary_json, stream_format)
+
+    result = [_invoice_summary_json(row) for row in query.all()]
 
     return jsonify(result), 200
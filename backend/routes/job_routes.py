@@ -0,0 +1,73 @@
+from flask import Blueprint, jsonify
+from flask_jwt_extended import get_jwt_identity, jwt_required
+
+from extensions import db
+from models import Job, User
+from services.jobs import job_json, resume_job
+
+
+job_bp = Blueprint("jobs", __name__, url_prefix="/jobs")
+
+
+def _visible_job(job_id):
+    """The job if the current user created it or is an admin, else None."""
+    user_id = int(get_jwt_identity())
+    job = db.session.get(Job, job_id)
+    if not job:
+        return None
+
+    # Users can follow their own jobs; admins can follow any.
+    if job.created_by != user_id:
+        user = db.session.get(User, user_id)
+        if not user or user.role != "admin":
+            return None
+    return job
+
+
+@job_bp.get("/<int:job_id>")
+@jwt_required()
+def get_job(job_id):
+    """
+    Get the status of a background job
+    ---
+    tags:
+      - Jobs
+    responses:
+      200:
+        description: Job status, attempts, result once succeeded and the last error
+      404:
+        description: Job not found
+    """
+    job = _visible_job(job_id)
+    if not job:
+        return jsonify({"message": "Job not found"}), 404
+
+    return jsonify(job_json(job)), 200
+
+
+@job_bp.post("/<int:job_id>/resume")
+@jwt_required()
+def resume(job_id):
+    """
+    Queue a failed job again from its last checkpoint
+    ---
+    tags:
+      - Jobs
+    responses:
+      202:
+        description: Job queued again; work saved in its checkpoint is not redone
+      404:
+        description: Job not found
+      409:
+        description: Only failed jobs can be resumed
+    """
+    job = _visible_job(job_id)
+    if not job:
+        return jsonify({"message": "Job not found"}), 404
+
+    if not resume_job(job):
+        return jsonify({"message": f"Job is {job.status}; only failed jobs can be resumed"}), 409
+
+    payload = {"message": "Job resumed", "job": job_json(job), "status_url": f"/jobs/{job.id}"}
+    db.session.commit()
+    return jsonify(payload), 202
@@ -1,23 +1,42 @@
 from datetime import datetime, timedelta
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required
-from sqlalchemy import func
+from sqlalchemy import and_, case, func, select
 from services.kpi_service import get_top_high_sugar_products
 from services.kpi_service import get_average_calories_by_category
 from services.kpi_service import get_best_selling_products
 from services.kpi_service import get_low_stock_products
+from services.kpi_snapshots import category_revenue
+from services.kpi_snapshots import daily_rollups
+from services.kpi_snapshots import revenue_and_orders
+from services.kpi_snapshots import window_metrics
 from extensions import db
 from models import Invoice
-from models import User
 from models import Product
 from models import Promotion
-from models import InvoiceItem
 from security.authorization import admin_required
 
 # Blueprint MUST be defined at top-level
 kpi_bp = Blueprint("kpis", __name__, url_prefix="/kpis")
 
 
+def _period_bounds(period, now):
+    """
+    Return (start, previous_start) for a dashboard period ending now.
+    The previous period ends where the current one starts.
+    """
+    if period == "day":
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    elif period == "week":
+        start = now - timedelta(days=7)
+    elif period == "year":
+        start = now - timedelta(days=365)
+    else:
+        start = now - timedelta(days=30)
+
+    return start, start - (now - start)
+
+
 @kpi_bp.get("/average-calories-by-category")
 @jwt_required()
 def average_calories_by_category():
@@ -158,46 +177,22 @@ def revenue_metrics():
         description: day, week, month, year
     responses:
       200:
-        description: Revenue metrics
+        description: Revenue metrics (paid invoices, by payment date)
     """
     period = (request.args.get("period") or "month").lower()
     now = datetime.utcnow()
-
-    if period == "day":
-        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    elif period == "week":
-        start = now - timedelta(days=7)
-    elif period == "year":
-        start = now - timedelta(days=365)
-    else:
-        start = now - timedelta(days=30)
-
-    delta = now - start
-    prev_end = start
-    prev_start = start - delta
-
-    total_revenue = db.session.query(func.coalesce(func.sum(Invoice.total_amount), 0)).scalar() or 0
-    total_orders = db.session.query(func.count(Invoice.id)).scalar() or 0
-
-    period_revenue = (
-        db.session.query(func.coalesce(func.sum(Invoice.total_amount), 0))
-        .filter(Invoice.created_at >= start, Invoice.created_at <= now)
-        .scalar()
-        or 0
-    )
-    period_orders = (
-        db.session.query(func.count(Invoice.id))
-        .filter(Invoice.created_at >= start, Invoice.created_at <= now)
-        .scalar()
-        or 0
-    )
-
-    prev_revenue = (
-        db.session.query(func.coalesce(func.sum(Invoice.total_amount), 0))
-        .filter(Invoice.created_at >= prev_start, Invoice.created_at < prev_end)
-        .scalar()
-        or 0
-    )
+    start, prev_start = _period_bounds(period, now)
+
+    # One round trip: whole days come from the KPI rollups, only partial
+    # days are scanned, each window is a conditional-aggregation column.
+    metrics, _ = window_metrics({
+        "total": (None, now),
+        "period": (start, now),
+        "previous": (prev_start, start),
+    })
+    total_revenue, total_orders = metrics["total"]["revenue"], metrics["total"]["orders"]
+    period_revenue, period_orders = metrics["period"]["revenue"], metrics["period"]["orders"]
+    prev_revenue = metrics["previous"]["revenue"]
 
     average_order_value = total_revenue / total_orders if total_orders else 0
     period_average_order_value = period_revenue / period_orders if period_orders else 0
@@ -231,37 +226,19 @@ def order_customer_metrics():
         description: day, week, month, year
     responses:
       200:
-        description: Order and customer metrics
+        description: Order and customer metrics (orders are paid invoices)
     """
     period = (request.args.get("period") or "month").lower()
     now = datetime.utcnow()
+    start, prev_start = _period_bounds(period, now)
 
-    if period == "day":
-        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    elif period == "week":
-        start = now - timedelta(days=7)
-    elif period == "year":
-        start = now - timedelta(days=365)
-    else:
-        start = now - timedelta(days=30)
-
-    delta = now - start
-    prev_end = start
-    prev_start = start - delta
-
-    total_orders = db.session.query(func.count(Invoice.id)).scalar() or 0
-    period_orders = (
-        db.session.query(func.count(Invoice.id))
-        .filter(Invoice.created_at >= start, Invoice.created_at <= now)
-        .scalar()
-        or 0
-    )
-    prev_orders = (
-        db.session.query(func.count(Invoice.id))
-        .filter(Invoice.created_at >= prev_start, Invoice.created_at < prev_end)
-        .scalar()
-        or 0
+    metrics, customers = window_metrics(
+        {"total": (None, now), "period": (start, now), "previous": (prev_start, start)},
+        customers=True,
     )
+    total_orders = metrics["total"]["orders"]
+    period_orders = metrics["period"]["orders"]
+    prev_orders = metrics["previous"]["orders"]
 
     order_growth = ((period_orders - prev_orders) / prev_orders * 100) if prev_orders > 0 else 0
 
@@ -281,24 +258,9 @@ def order_customer_metrics():
             or 0
         )
 
-    total_customers = (
-        db.session.query(func.count(User.id))
-        .filter(User.role == "customer")
-        .scalar()
-        or 0
-    )
-    period_customers = (
-        db.session.query(func.count(User.id))
-        .filter(User.role == "customer", User.created_at >= start, User.created_at <= now)
-        .scalar()
-        or 0
-    )
-    active_customers = (
-        db.session.query(func.count(User.id))
-        .filter(User.role == "customer", User.status == "active")
-        .scalar()
-        or 0
-    )
+    total_customers = customers["total"]
+    period_customers = metrics["period"]["new_customers"]
+    active_customers = customers["active"]
 
     return jsonify({
         "period": period,
@@ -325,36 +287,30 @@ def product_promotion_metrics():
       200:
         description: Product and promotion metrics
     """
-    total_products = db.session.query(func.count(Product.id)).scalar() or 0
-    low_stock_products = (
-        db.session.query(func.count(Product.id))
-        .filter(Product.quantity_in_stock < 10, Product.quantity_in_stock > 0)
-        .scalar()
-        or 0
-    )
-    out_of_stock_products = (
-        db.session.query(func.count(Product.id))
-        .filter(Product.quantity_in_stock == 0)
-        .scalar()
-        or 0
-    )
-    inventory_value = (
-        db.session.query(func.coalesce(func.sum(Product.price * Product.quantity_in_stock), 0))
-        .scalar()
-        or 0
-    )
-
     today = datetime.utcnow().date()
-    active_promotions = (
-        db.session.query(func.count(Promotion.id))
-        .filter(
-            Promotion.status == "active",
-            Promotion.start_date <= today,
-            Promotion.end_date >= today
-        )
-        .scalar()
-        or 0
-    )
+    low_stock = and_(Product.quantity_in_stock < 10, Product.quantity_in_stock > 0)
+    products = select(
+        func.count(Product.id).label("total_products"),
+        func.coalesce(func.sum(case((low_stock, 1), else_=0)), 0).label("low_stock_products"),
+        func.coalesce(func.sum(case((Product.quantity_in_stock == 0, 1), else_=0)), 0).label("out_of_stock_products"),
+        func.coalesce(func.sum(Product.price * Product.quantity_in_stock), 0).label("inventory_value"),
+    ).subquery()
+    promotions = select(
+        func.count(Promotion.id).label("active_promotions"),
+    ).where(
+        Promotion.status == "active",
+        Promotion.start_date <= today,
+        Promotion.end_date >= today
+    ).subquery()
+
+    # Both subqueries aggregate to one row, so this is a single round trip.
+    (
+        total_products,
+        low_stock_products,
+        out_of_stock_products,
+        inventory_value,
+        active_promotions,
+    ) = db.session.execute(select(products, promotions)).one()
 
     promo_usage = 0
     if hasattr(Invoice, "promo_code"):
@@ -387,26 +343,32 @@ def dashboard_charts():
       200:
         description: Chart datasets
     """
-    today = datetime.utcnow().date()
+    now = datetime.utcnow()
+    today = now.date()
     start_date = today - timedelta(days=6)
 
-    revenue_rows = (
-        db.session.query(func.date(Invoice.created_at), func.coalesce(func.sum(Invoice.total_amount), 0))
-        .filter(Invoice.created_at >= start_date)
-        .group_by(func.date(Invoice.created_at))
-        .all()
-    )
-    revenue_by_date = {row[0]: float(row[1]) for row in revenue_rows}
+    month_labels = []
+    month_cursor = today.replace(day=1)
+    for _ in range(6):
+        month_labels.append(month_cursor)
+        prev_month = month_cursor.replace(day=1) - timedelta(days=1)
+        month_cursor = prev_month.replace(day=1)
+    month_labels.reverse()
+
+    # One pass over at most ~6 months of daily rollups feeds both the
+    # revenue trend and the customer growth chart.
+    daily = daily_rollups(month_labels[0], now)
+
     revenue_trend = []
     for day_offset in range(7):
         day = start_date + timedelta(days=day_offset)
         label = day.strftime("%b %d").replace(" 0", " ")
         revenue_trend.append({
             "date": label,
-            "revenue": round(revenue_by_date.get(day, 0), 2)
+            "revenue": round(daily.get(day, {}).get("revenue", 0), 2)
         })
 
-    total_orders = db.session.query(func.count(Invoice.id)).scalar() or 0
+    _, total_orders = revenue_and_orders(None, now)
     if hasattr(Invoice, "status"):
         status_rows = (
             db.session.query(Invoice.status, func.count(Invoice.id))
@@ -425,33 +387,16 @@ def dashboard_charts():
             {"name": "Delivered", "value": int(total_orders), "color": "#10b981"}
         ]
 
-    category_rows = (
-        db.session.query(Product.category, func.coalesce(func.sum(InvoiceItem.quantity * InvoiceItem.unit_price), 0))
-        .join(InvoiceItem, InvoiceItem.product_id == Product.id)
-        .group_by(Product.category)
-        .order_by(func.coalesce(func.sum(InvoiceItem.quantity * InvoiceItem.unit_price), 0).desc())
-        .all()
-    )
+    category_totals = category_revenue(now)
     category_chart_data = [
-        {"category": row[0] or "Other", "revenue": round(float(row[1]), 2)}
-        for row in category_rows
+        {"category": category or "Other", "revenue": round(revenue, 2)}
+        for category, revenue in sorted(category_totals.items(), key=lambda item: item[1], reverse=True)
     ]
 
-    month_labels = []
-    month_cursor = today.replace(day=1)
-    for _ in range(6):
-        month_labels.append(month_cursor)
-        prev_month = month_cursor.replace(day=1) - timedelta(days=1)
-        month_cursor = prev_month.replace(day=1)
-    month_labels.reverse()
-
-    customer_rows = (
-        db.session.query(func.date_trunc("month", User.created_at), func.count(User.id))
-        .filter(User.role == "customer")
-        .group_by(func.date_trunc("month", User.created_at))
-        .all()
-    )
-    customer_counts = {row[0].date(): int(row[1]) for row in customer_rows}
+    customer_counts = {}
+    for day, values in daily.items():
+        month_start = day.replace(day=1)
+        customer_counts[month_start] = customer_counts.get(month_start, 0) + values["new_customers"]
     customer_growth_data = []
     for month_start in month_labels:
         label = month_start.strftime("%b %Y")
@@ -3,9 +3,10 @@ from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import get_jwt_identity, jwt_required
+from sqlalchemy import update
 
 from extensions import db
-from models import Invoice, Product
+from models import Invoice, InvoiceItem, Product
 from services.paypal_service import (
     _is_mock_mode,
     capture_paypal_order,
@@ -14,6 +15,11 @@ from services.paypal_service import (
     verify_paypal_webhook_signature,
 )
 from services.algolia_service import send_purchase_event_to_algolia
+from services.catalog_cache import catalog_cache
+from services.inventory import release_stock_many
+from services.jobs import enqueue_job, job_handler
+from services.kpi_snapshots import record_invoice_paid, record_invoice_reversed
+from services.reservations import OPEN_STATUSES, clear_reservation, hold_reservation, reclaim_expired_invoice
 
 
 payment_bp = Blueprint("payments", __name__, url_prefix="/payments")
@@ -60,28 +66,77 @@ def _get_webhook_order_id(resource):
 
 def _restore_invoice_stock(invoice):
     """Return reserved stock to products when a payment fails."""
+    quantities = {}
     for item in invoice.invoice_items:
-        product = Product.query.get(item.product_id)
-        if product is not None:
-            product.quantity_in_stock += item.quantity
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    release_stock_many(quantities)
 
 
 def _fail_invoice(invoice):
     """Mark an invoice as failed and restore its reserved stock."""
     if invoice.payment_status == "failed":
         return  # already failed — stock was already restored
-    _restore_invoice_stock(invoice)
+    if invoice.payment_status == "paid":
+        record_invoice_reversed(invoice)
+    if invoice.payment_status == "expired":
+        product_ids = []  # the reservation sweep already restored it
+    else:
+        _restore_invoice_stock(invoice)
+        # Read before commit: afterwards the relationship would be reloaded.
+        product_ids = [item.product_id for item in invoice.invoice_items]
     invoice.payment_status = "failed"
+    clear_reservation(invoice)
     db.session.commit()
+    catalog_cache.forget(*product_ids)
 
 
-def _send_algolia_purchase_event(invoice, user_id):
-    product_object_ids = [str(item.product_id) for item in invoice.invoice_items if item.product_id is not None]
-    if not product_object_ids:
-        return {"sent": False, "reason": "no invoice items"}
+def _mark_paid(invoice, order_id, capture_id, from_statuses=OPEN_STATUSES):
+    """
+    Mark invoice paid only if it is still in one of from_statuses. A
+    conditional UPDATE rather than an attribute write, so an invoice the
+    reservation sweep expired while PayPal answered is never marked paid
+    over the top. Returns whether the row was updated.
+    """
+    result = db.session.execute(
+        update(Invoice)
+        .where(Invoice.id == invoice.id, Invoice.payment_status.in_(from_statuses))
+        .values(
+            payment_method="paypal",
+            payment_status="paid",
+            paypal_order_id=order_id,
+            paypal_capture_id=capture_id,
+            paid_at=datetime.utcnow(),
+        )
+        .execution_options(synchronize_session="fetch")
+    )
+    return result.rowcount == 1
 
+
+@job_handler("algolia.purchase_event")
+def _send_algolia_purchase_event(user_id, product_object_ids):
     send_purchase_event_to_algolia(user_id=user_id, product_object_ids=product_object_ids)
-    return {"sent": True}
+    return {"sent": len(product_object_ids)}
+
+
+def _queue_algolia_purchase_event(invoice, user_id):
+    """
+    Queue the purchase event in the payment's transaction; a job worker
+    sends it, so the capture response never waits on Algolia.
+    """
+    # Only the ids are needed, so skip loading the line items as objects.
+    product_ids = db.session.query(InvoiceItem.product_id).filter(
+        InvoiceItem.invoice_id == invoice.id,
+        InvoiceItem.product_id.isnot(None),
+    ).order_by(InvoiceItem.id)
+    product_object_ids = [str(product_id) for (product_id,) in product_ids]
+    if not product_object_ids:
+        return None
+
+    return enqueue_job(
+        "algolia.purchase_event",
+        {"user_id": user_id, "product_object_ids": product_object_ids},
+        created_by=user_id,
+    )
 
 
 @payment_bp.post("/paypal/create-order")
@@ -113,6 +168,12 @@ def paypal_create_order():
     if invoice.payment_status == "paid":
         return jsonify({"message": "Invoice is already paid", "invoice": _invoice_json(invoice)}), 400
 
+    reclaimed = []
+    if invoice.payment_status == "expired":
+        reclaimed = reclaim_expired_invoice(invoice)
+        if reclaimed is None:
+            return jsonify({"message": "Invoice has expired and its items are no longer in stock"}), 409
+
     try:
         order = create_paypal_order(
             total_amount,
@@ -125,7 +186,10 @@ def paypal_create_order():
     invoice.payment_method = "paypal"
     invoice.payment_status = "pending"
     invoice.paypal_order_id = order["order_id"]
+    # Give the buyer the full TTL to approve the payment.
+    hold_reservation(invoice)
     db.session.commit()
+    catalog_cache.forget(*reclaimed)
 
     return (
         jsonify(
@@ -172,6 +236,15 @@ def paypal_capture_order():
     if not order_id:
         return jsonify({"message": "order_id is required"}), 400
 
+    if invoice.payment_status == "expired":
+        # Take the stock back before charging; commit so the product rows
+        # are not locked while PayPal answers.
+        reclaimed = reclaim_expired_invoice(invoice)
+        if reclaimed is None:
+            return jsonify({"message": "Invoice has expired and its items are no longer in stock"}), 409
+        db.session.commit()
+        catalog_cache.forget(*reclaimed)
+
     try:
         capture_payload = capture_paypal_order(order_id)
     except Exception as exc:  # noqa: BLE001
@@ -212,18 +285,38 @@ def paypal_capture_order():
             400,
         )
 
-    invoice.payment_method = "paypal"
-    invoice.payment_status = "paid"
-    invoice.paypal_order_id = order_id
-    invoice.paypal_capture_id = capture.get("capture_id")
-    invoice.paid_at = datetime.utcnow()
+    reclaimed = []
+    if not _mark_paid(invoice, order_id, capture.get("capture_id")):
+        db.session.refresh(invoice)
+        if invoice.payment_status == "paid":
+            # The capture webhook got here first.
+            return jsonify({"message": "Invoice is already paid", "invoice": _invoice_json(invoice)}), 200
+        if invoice.payment_status != "expired":
+            return (
+                jsonify({"message": "Invoice changed while the payment was captured", "invoice": _invoice_json(invoice)}),
+                409,
+            )
+        # The sweep released the stock while PayPal answered. The buyer has
+        # been charged, so take it back; as in the webhook, if it has sold
+        # out meanwhile the order still stands.
+        reclaimed = reclaim_expired_invoice(invoice) or []
+        if not _mark_paid(invoice, order_id, capture.get("capture_id"), from_statuses=OPEN_STATUSES + ("expired",)):
+            # The webhook settled it in the meantime and recorded the sale.
+            db.session.rollback()
+            return jsonify({"message": "Invoice is already paid", "invoice": _invoice_json(invoice)}), 200
+
+    # Only reached by the request whose UPDATE made the invoice paid, so a
+    # concurrent webhook cannot count the sale in the KPI rollups twice.
+    record_invoice_paid(invoice)
+    clear_reservation(invoice)
+    algolia_job = _queue_algolia_purchase_event(invoice, user_id)
+    if algolia_job is None:
+        algolia_event = {"queued": False, "reason": "no invoice items"}
+    else:
+        algolia_event = {"queued": True, "job_id": algolia_job.id}
     db.session.commit()
-
-    algolia_event = {"sent": False}
-    try:
-        algolia_event = _send_algolia_purchase_event(invoice, user_id)
-    except Exception as exc:  # noqa: BLE001
-        algolia_event = {"sent": False, "reason": str(exc)}
+    if reclaimed:
+        catalog_cache.forget(*reclaimed)
 
     return (
         jsonify(
@@ -302,11 +395,31 @@ def paypal_webhook():
                 200,
             )
 
-        invoice.payment_method = "paypal"
-        invoice.payment_status = "paid"
-        invoice.paypal_capture_id = resource.get("id")
-        invoice.paid_at = datetime.utcnow()
+        # Only the request whose UPDATE flips the invoice to paid records it
+        # in the KPI rollups; the capture endpoint may have got there first.
+        reclaimed = []
+        paid_now = _mark_paid(invoice, invoice.paypal_order_id, resource.get("id"))
+        if not paid_now:
+            db.session.refresh(invoice)
+            status = invoice.payment_status
+            if status == "paid":
+                invoice.paypal_capture_id = resource.get("id")
+            else:
+                # The buyer has been charged, so take the stock back the sweep
+                # (or a failed payment) released; if it has sold out
+                # meanwhile the order still stands.
+                reclaimed = reclaim_expired_invoice(invoice) or []
+                paid_now = _mark_paid(
+                    invoice,
+                    invoice.paypal_order_id,
+                    resource.get("id"),
+                    from_statuses=OPEN_STATUSES + (status,),
+                )
+        if paid_now:
+            record_invoice_paid(invoice)
+        clear_reservation(invoice)
         db.session.commit()
+        catalog_cache.forget(*reclaimed)
         return (
             jsonify(
                 {
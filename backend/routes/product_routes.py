@@ -1,13 +1,25 @@
+import base64
+import binascii
 import json
-from flask import Blueprint, jsonify
-from models import Product
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import Blueprint, current_app, jsonify, make_response
+from models import Product, ProductTombstone
 from flask import request
+from sqlalchemy import and_, or_
 from sqlalchemy.exc import IntegrityError
 from extensions import db
 from security.authorization import admin_required
+from services.catalog_cache import catalog_cache
+from services.nutrition import apply_nutrition_columns
+from services.streaming import STREAM_BATCH_SIZE, requested_stream_format, stream_json_rows
 
 product_bp = Blueprint("products", __name__, url_prefix="/products")
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+DEFAULT_CHANGES_LAG_SECONDS = 30
+
 def parse_json_list(value):
     if not value:
         return []
@@ -35,7 +47,7 @@ def normalize_barcode(value):
     barcode = str(value).strip()
     return barcode or None
 
-def serialize_product(product):
+def _build_product_json(product):
     return {
         "id": product.id,
         "name": product.name,
@@ -58,24 +70,388 @@ def serialize_product(product):
         "created_at": product.created_at.isoformat()
     }
 
+
+def serialize_product(product):
+    return catalog_cache.get_or_build(product, _build_product_json)
+
+def catalog_conditional(rows):
+    """
+    Tag 200 responses with the catalog version and the stock of the
+    products they show, and answer If-None-Match with 304 before the
+    handler loads or serializes anything.
+
+    rows takes the view's arguments and returns the Product query the
+    response is built from. A ValueError from it leaves the handler to
+    answer the bad request.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            # Tag before the handler queries: a concurrent write can then
+            # only make the tag older than the body, never newer.
+            try:
+                etag = catalog_cache.etag(rows(*args, **kwargs))
+            except ValueError:
+                return fn(*args, **kwargs)
+            if request.if_none_match.contains(etag):
+                response = make_response("", 304)
+            else:
+                response = make_response(fn(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _encode_token(payload):
+    raw = json.dumps(payload).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_token(token):
+    padded = token + "=" * (-len(token) % 4)
+    payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    if not isinstance(payload, dict):
+        raise ValueError("token payload must be an object")
+    return payload
+
+
+def encode_cursor(last_id):
+    return _encode_token({"id": last_id})
+
+
+def decode_cursor(token):
+    try:
+        last_id = int(_decode_token(token)["id"])
+    except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError):
+        raise ValueError("cursor is invalid")
+    return last_id
+
+
+def encode_change_token(changed_at, last_id, last_tombstone_id=0):
+    return _encode_token({"ts": changed_at.isoformat(), "id": last_id, "tid": last_tombstone_id})
+
+
+def decode_change_token(token):
+    try:
+        payload = _decode_token(token)
+        changed_at = datetime.fromisoformat(payload["ts"])
+        last_id = int(payload["id"])
+        last_tombstone_id = int(payload.get("tid", 0))
+    except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError):
+        raise ValueError("since is invalid")
+    return changed_at, last_id, last_tombstone_id
+
+
+def _after_keyset(stamp_column, id_column, since_at, since_id):
+    return or_(stamp_column > since_at, and_(stamp_column == since_at, id_column > since_id))
+
+
+def _parse_bool_arg(value, field_name):
+    normalized = str(value).strip().lower()
+    if normalized in ("1", "true", "yes"):
+        return True
+    if normalized in ("0", "false", "no"):
+        return False
+    raise ValueError(f"{field_name} must be true or false")
+
+
+def _parse_number_arg(value, field_name):
+    try:
+        parsed = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field_name} must be a number")
+    if parsed < 0:
+        raise ValueError(f"{field_name} must be >= 0")
+    return parsed
+
+
+def _parse_page_size(value):
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        parsed = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be a positive integer")
+    if parsed <= 0:
+        raise ValueError("limit must be a positive integer")
+    return min(parsed, MAX_PAGE_SIZE)
+
+
+def apply_product_filters(query, args):
+    """
+    Push the listing filters from the query string into SQL.
+    Raises ValueError with a client-facing message on bad input.
+    """
+    category = (args.get("category") or "").strip()
+    if category:
+        query = query.filter(Product.category == category)
+
+    brand = (args.get("brand") or "").strip()
+    if brand:
+        query = query.filter(Product.brand == brand)
+
+    if args.get("in_stock") not in (None, ""):
+        if _parse_bool_arg(args.get("in_stock"), "in_stock"):
+            query = query.filter(Product.quantity_in_stock > 0)
+        else:
+            query = query.filter(Product.quantity_in_stock <= 0)
+
+    min_price = None
+    if args.get("min_price") not in (None, ""):
+        min_price = _parse_number_arg(args.get("min_price"), "min_price")
+        query = query.filter(Product.price >= min_price)
+
+    if args.get("max_price") not in (None, ""):
+        max_price = _parse_number_arg(args.get("max_price"), "max_price")
+        if min_price is not None and max_price < min_price:
+            raise ValueError("max_price must be >= min_price")
+        query = query.filter(Product.price <= max_price)
+
+    if args.get("max_kcal") not in (None, ""):
+        query = query.filter(Product.energy_kcal_100g <= _parse_number_arg(args.get("max_kcal"), "max_kcal"))
+
+    if args.get("max_sugars") not in (None, ""):
+        query = query.filter(Product.sugars_100g <= _parse_number_arg(args.get("max_sugars"), "max_sugars"))
+
+    # dietary_tags is stored as a JSON list, so match the quoted tag to avoid
+    # "vegan" also matching a hypothetical "non-vegan" entry.
+    tags = args.get("dietary_tags") or args.get("dietaryTags") or ""
+    for tag in [item.strip().lower() for item in tags.split(",") if item.strip()]:
+        query = query.filter(Product.dietary_tags.like(f'%"{tag}"%'))
+
+    return query
+
+
+def product_listing_query(args):
+    """
+    The query GET /products/ reads and its page size, None when the
+    listing is not paginated. Raises ValueError on bad input.
+    """
+    query = apply_product_filters(Product.query, args)
+    page_size = None
+    if "limit" in args or "cursor" in args:
+        page_size = _parse_page_size(args.get("limit"))
+        cursor = (args.get("cursor") or "").strip()
+        if cursor:
+            query = query.filter(Product.id > decode_cursor(cursor))
+    return query.order_by(Product.id.asc()), page_size
+
+
+def _listing_rows():
+    query, page_size = product_listing_query(request.args)
+    # The page the handler loads, look-ahead row included.
+    return query if page_size is None else query.limit(page_size + 1)
+
+
 @product_bp.get("/")
+@catalog_conditional(_listing_rows)
 def get_products():
     """
-    Get all products
+    Get products
     ---
     tags:
       - Products
+    parameters:
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Page size (max 200). Enables paginated mode.
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: next_cursor from a previous page. Enables paginated mode.
+      - name: category
+        in: query
+        type: string
+        required: false
+      - name: brand
+        in: query
+        type: string
+        required: false
+      - name: in_stock
+        in: query
+        type: boolean
+        required: false
+      - name: min_price
+        in: query
+        type: number
+        required: false
+      - name: max_price
+        in: query
+        type: number
+        required: false
+      - name: dietary_tags
+        in: query
+        type: string
+        required: false
+        description: Comma separated tags, all of which must match
+      - name: max_kcal
+        in: query
+        type: number
+        required: false
+        description: Max energy per 100g
+      - name: max_sugars
+        in: query
+        type: number
+        required: false
+        description: Max sugars per 100g
+      - name: stream
+        in: query
+        type: boolean
+        required: false
+        description: Stream the full list incrementally (ignored when paginating)
+      - name: format
+        in: query
+        type: string
+        required: false
+        description: ndjson to stream one product per line
     responses:
       200:
-        description: List of products
+        description: >
+          List of products. When limit or cursor is given the response is
+          an object with items and next_cursor instead of a bare list.
+      400:
+        description: Invalid query parameter
+      304:
+        description: Catalog unchanged since the If-None-Match ETag
     """
-
-    products = Product.query.all()
+    try:
+        query, page_size = product_listing_query(request.args)
+    except ValueError as exc:
+        return jsonify({"message": str(exc)}), 400
+
+    if page_size is None:
+        stream_format = requested_stream_format()
+        if stream_format:
+            return stream_json_rows(query.yield_per(STREAM_BATCH_SIZE), serialize_product, stream_format)
+
+        products = query.all()
+        return jsonify([serialize_product(product) for product in products]), 200
+
+    # Fetch one extra row to know whether another page exists without a COUNT.
+    products = query.limit(page_size + 1).all()
+    has_more = len(products) > page_size
+    products = products[:page_size]
+
+    return jsonify(
+        {
+            "items": [serialize_product(product) for product in products],
+            "next_cursor": encode_cursor(products[-1].id) if has_more else None,
+            "limit": page_size,
+        }
+    ), 200
+
+
+@product_bp.get("/changes")
+def get_product_changes():
+    """
+    Get catalog changes since a sync token
+    ---
+    tags:
+      - Products
+    parameters:
+      - name: since
+        in: query
+        type: string
+        required: false
+        description: next_token from a previous call. Omit for a full sync.
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Max created/updated products per call (max 200)
+    responses:
+      200:
+        description: >
+          Products created, updated and deleted after the token. Apply
+          deleted before created/updated, and keep calling with next_token
+          while has_more is true. Changes show up once they are
+          PRODUCT_CHANGES_LAG_SECONDS old.
+      400:
+        description: Invalid query parameter
+    """
+    try:
+        page_size = _parse_page_size(request.args.get("limit"))
+        since = (request.args.get("since") or "").strip()
+        since_at, since_id, since_tombstone_id = decode_change_token(since) if since else (None, 0, 0)
+    except ValueError as exc:
+        return jsonify({"message": str(exc)}), 400
+
+    # updated_at and deleted_at are stamped when a row is flushed, not when
+    # its transaction commits, so a slow transaction can commit rows older
+    # than what a client has already seen. Only hand out changes older than
+    # the lag, which any such transaction has committed by then.
+    horizon = datetime.utcnow() - timedelta(
+        seconds=current_app.config.get("PRODUCT_CHANGES_LAG_SECONDS", DEFAULT_CHANGES_LAG_SECONDS)
+    )
+
+    # Keyset on (updated_at, id) so many rows sharing one timestamp still page.
+    query = Product.query.filter(Product.updated_at < horizon)
+    if since_at is not None:
+        query = query.filter(_after_keyset(Product.updated_at, Product.id, since_at, since_id))
+    products = query.order_by(Product.updated_at.asc(), Product.id.asc()).limit(page_size + 1).all()
+    has_more = len(products) > page_size
+    products = products[:page_size]
+
+    # Deletions are few, so return every tombstone in the same time window
+    # as this page of products rather than paging them separately. Same
+    # keyset as products, on (deleted_at, tombstone id).
+    tombstone_query = ProductTombstone.query.filter(ProductTombstone.deleted_at < horizon)
+    if since_at is not None:
+        tombstone_query = tombstone_query.filter(
+            _after_keyset(ProductTombstone.deleted_at, ProductTombstone.id, since_at, since_tombstone_id)
+        )
+    if has_more:
+        tombstone_query = tombstone_query.filter(ProductTombstone.deleted_at <= products[-1].updated_at)
+    tombstones = tombstone_query.order_by(ProductTombstone.deleted_at.asc(), ProductTombstone.id.asc()).all()
+
+    next_at, next_id, next_tombstone_id = since_at, since_id, since_tombstone_id
+    if products:
+        next_at, next_id = products[-1].updated_at, products[-1].id
+        if next_at != since_at:
+            next_tombstone_id = 0
+    if tombstones:
+        last = tombstones[-1]
+        if next_at is None or last.deleted_at > next_at:
+            next_at, next_id, next_tombstone_id = last.deleted_at, 0, last.id
+        elif last.deleted_at == next_at:
+            next_tombstone_id = last.id
+
+    created = []
+    updated = []
+    for product in products:
+        # Same (timestamp, id) ordering as the token, so a row created in the
+        # microsecond the previous page ended on still counts as created.
+        if since_at is None or (product.created_at, product.id) > (since_at, since_id):
+            created.append(serialize_product(product))
+        else:
+            updated.append(serialize_product(product))
 
-    return jsonify([serialize_product(product) for product in products]), 200
+    return jsonify(
+        {
+            "created": created,
+            "updated": updated,
+            "deleted": [
+                {"id": tombstone.product_id, "barcode": tombstone.barcode}
+                for tombstone in tombstones
+            ],
+            "next_token": encode_change_token(next_at, next_id, next_tombstone_id) if next_at else (since or None),
+            "has_more": has_more,
+        }
+    ), 200
 
 
 @product_bp.get("/barcode/<string:barcode>")
+@catalog_conditional(lambda barcode: Product.query.filter_by(barcode=(barcode or "").strip()))
 def get_product_by_barcode(barcode):
     """
     Get product by barcode
@@ -91,6 +467,8 @@ def get_product_by_barcode(barcode):
     responses:
       200:
         description: Product found
+      304:
+        description: Catalog unchanged since the If-None-Match ETag
       404:
         description: Product not found
     """
@@ -106,6 +484,7 @@ def get_product_by_barcode(barcode):
 
 
 @product_bp.get("/<int:product_id>")
+@catalog_conditional(lambda product_id: Product.query.filter_by(id=product_id))
 def get_product_by_id(product_id):
     """
     Get product by ID
@@ -121,6 +500,8 @@ def get_product_by_id(product_id):
     responses:
       200:
         description: Product found
+      304:
+        description: Catalog unchanged since the If-None-Match ETag
       404:
         description: Product not found
     """
@@ -215,6 +596,7 @@ def create_product():
         rating=data.get("rating"),
         reviews=data.get("reviews"),
     )
+    apply_nutrition_columns(product)
 
     db.session.add(product)
     try:
@@ -223,6 +605,7 @@ def create_product():
         db.session.rollback()
         return jsonify({"message": "Barcode already exists"}), 409
 
+    catalog_cache.invalidate(product.id)
     return jsonify(serialize_product(product)), 201
 
 @product_bp.put("/<int:product_id>")
@@ -281,6 +664,7 @@ def update_product(product_id):
         product.icon = data["icon"]
     if "nutritional_info" in data:
         product.nutritional_info = data["nutritional_info"]
+        apply_nutrition_columns(product)
     if "ingredients" in data:
         product.ingredients = normalize_list_field(data.get("ingredients"))
     if "dietaryTags" in data or "dietary_tags" in data:
@@ -296,6 +680,7 @@ def update_product(product_id):
         db.session.rollback()
         return jsonify({"message": "Barcode already exists"}), 409
 
+    catalog_cache.invalidate(product.id)
     return jsonify(serialize_product(product)), 200
 
 
@@ -326,7 +711,9 @@ def delete_product(product_id):
     if not product:
         return jsonify({"message": "Product not found"}), 404
 
+    db.session.add(ProductTombstone(product_id=product.id, barcode=product.barcode))
     db.session.delete(product)
     db.session.commit()
+    catalog_cache.invalidate(product_id)
 
     return jsonify({"message": "Product deleted successfully"}), 200
@@ -4,9 +4,12 @@ from flask import Blueprint, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy import or_
 
+from extensions import db
 from models import Invoice, Product, User
 from security.authorization import admin_required
 from services.algolia_service import sync_products_to_algolia
+from services.http_client import http_client
+from services.jobs import enqueue_job, job_handler, job_json
 
 ALGOLIA_APP_ID = os.getenv("ALGOLIA_APP_ID", "")
 ALGOLIA_ADMIN_API_KEY = os.getenv("ALGOLIA_WRITE_API_KEY", "")
@@ -39,7 +42,7 @@ def _recommend_for_product(product_id: int, limit: int = 8):
             }
         ]
     }
-    resp = requests.post(url, headers=_headers(), json=payload, timeout=20)
+    resp = http_client.post(url, headers=_headers(), json=payload, timeout=20)
     resp.raise_for_status()
     data = resp.json()
     return data.get("results", [{}])[0].get("hits", [])
@@ -160,34 +163,25 @@ def _top_up_recommendations(existing, purchased_product_ids, limit=12):
     return existing[:limit]
 
 
-@recommendation_bp.post("/sync-products")
-@admin_required
-def sync_products():
+@job_handler("algolia.sync_products")
+def _sync_products_job():
     try:
-        result = sync_products_to_algolia()
-        return jsonify({"message": "Products synced to Algolia", **result}), 200
+        return sync_products_to_algolia()
     except requests.HTTPError as exc:
+        # Keep Algolia's own explanation in the job's last_error.
         response = getattr(exc, "response", None)
         provider_status = getattr(response, "status_code", None)
-        provider_body = None
-        if response is not None:
-            try:
-                provider_body = response.text
-            except Exception:  # noqa: BLE001
-                provider_body = None
-
-        return (
-            jsonify(
-                {
-                    "message": "Algolia sync failed",
-                    "provider_status": provider_status,
-                    "provider_error": provider_body or str(exc),
-                }
-            ),
-            502,
-        )
-    except Exception as exc:  # noqa: BLE001
-        return jsonify({"message": "Algolia sync failed", "error": str(exc)}), 502
+        provider_body = getattr(response, "text", None) if response is not None else None
+        raise RuntimeError(f"Algolia sync failed ({provider_status}): {provider_body or exc}") from exc
+
+
+@recommendation_bp.post("/sync-products")
+@admin_required
+def sync_products():
+    job = enqueue_job("algolia.sync_products", created_by=int(get_jwt_identity()))
+    payload = {"message": "Algolia sync queued", "job": job_json(job), "status_url": f"/jobs/{job.id}"}
+    db.session.commit()
+    return jsonify(payload), 202
 
 
 @recommendation_bp.get("/<int:user_id>")
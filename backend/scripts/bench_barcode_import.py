@@ -0,0 +1,103 @@
+"""
+Benchmark barcode imports against a local stub of the OpenFoodFacts API.
+
+Starts a threaded HTTP server that answers every product lookup after a
+fixed delay, points the importer at it and runs the same barcode import
+with growing OPENFOODFACTS_FETCH_WORKERS on a fresh SQLite database each
+time. Wall time should fall roughly in proportion to the worker count
+until the database writes dominate.
+
+Usage: python scripts/bench_barcode_import.py [--barcodes N] [--latency-ms MS] [workers ...]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import create_app
+from extensions import db
+from routes.admin_product_import_routes import run_product_import
+from services import openfoodfacts_service
+
+
+DEFAULT_WORKERS = (1, 2, 4, 8, 16)
+
+
+def make_handler(latency):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            barcode = self.path.rstrip("/").rsplit("/", 1)[-1]
+            body = json.dumps({
+                "status": 1,
+                "product": {
+                    "code": barcode,
+                    "product_name": f"Bench Product {barcode}",
+                    "brands": "Bench Brand",
+                    "categories": "Snacks",
+                    "nutriments": {"sugars_100g": 10, "energy-kcal_100g": 400},
+                },
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+
+def run(barcode_count, latency, worker_counts):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    openfoodfacts_service.BASE_V2_URL = f"http://127.0.0.1:{server.server_port}/api/v2/product"
+    barcodes = [f"{4000000000000 + index}" for index in range(barcode_count)]
+
+    print(f"{barcode_count} barcodes, {latency * 1000:.0f} ms stub latency")
+    print(f"{'workers':>8} {'time_s':>8} {'per_s':>8} {'speedup':>8} {'imported':>9}")
+    baseline = None
+    try:
+        for workers in worker_counts:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                app = create_app(
+                    {
+                        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}",
+                        "_SUPER_ADMIN_SEEDED": True,
+                        "OPENFOODFACTS_FETCH_WORKERS": workers,
+                        "OPENFOODFACTS_RATE_LIMIT_PER_MINUTE": 0,
+                        "OPENFOODFACTS_CACHE_PATH": "",
+                    }
+                )
+                with app.app_context():
+                    db.create_all()
+                    started = time.perf_counter()
+                    result = run_product_import(source="barcodes", barcodes=barcodes)
+                    elapsed = time.perf_counter() - started
+                    db.session.remove()
+                    db.engine.dispose()
+
+            baseline = baseline or elapsed
+            print(
+                f"{workers:>8} {elapsed:>8.2f} {barcode_count / elapsed:>8.1f} "
+                f"{baseline / elapsed:>7.1f}x {result['imported']:>9}"
+            )
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--barcodes", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("workers", type=int, nargs="*")
+    args = parser.parse_args()
+    run(args.barcodes, args.latency_ms / 1000.0, args.workers or DEFAULT_WORKERS)
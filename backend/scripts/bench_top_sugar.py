@@ -0,0 +1,107 @@
+"""
+Benchmark the top high-sugar KPI against the old load-everything approach.
+
+Builds throwaway SQLite catalogs of growing size and reports wall time and
+peak Python memory (tracemalloc) for both implementations. The SQL top-K
+path should stay flat while the legacy path grows with the catalog.
+
+Usage: python scripts/bench_top_sugar.py [size ...]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import create_app
+from extensions import db
+from models import Product
+from services.kpi_service import get_top_high_sugar_products
+
+
+DEFAULT_SIZES = (1000, 10000, 50000)
+TOP_K = 5
+
+
+def legacy_top_high_sugar_products(limit=TOP_K):
+    result = []
+    for product in Product.query.all():
+        if not product.nutritional_info:
+            continue
+        try:
+            nutriments = json.loads(product.nutritional_info.replace("'", '"'))
+            sugar = nutriments.get("sugars_100g", 0)
+        except Exception:
+            continue
+        result.append({
+            "id": product.id,
+            "name": product.name,
+            "brand": product.brand,
+            "category": product.category,
+            "sugars_100g": sugar,
+        })
+    result.sort(key=lambda x: x["sugars_100g"], reverse=True)
+    return result[:limit]
+
+
+def seed_catalog(size):
+    rng = random.Random(size)
+    rows = []
+    for index in range(size):
+        sugars = round(rng.uniform(0, 80), 1)
+        rows.append({
+            "name": f"Bench Product {index}",
+            "brand": "Bench",
+            "category": "Snacks",
+            "price": 1.0,
+            "quantity_in_stock": 10,
+            "nutritional_info": json.dumps({"sugars_100g": sugars, "energy-kcal_100g": 400}),
+            "sugars_100g": sugars,
+            "energy_kcal_100g": 400.0,
+        })
+    db.session.execute(Product.__table__.insert(), rows)
+    db.session.commit()
+
+
+def measure(fn):
+    db.session.expunge_all()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def run(sizes):
+    print(f"{'products':>10} {'impl':>8} {'time_ms':>10} {'peak_kb':>10}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            app = create_app(
+                {
+                    "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}",
+                    "_SUPER_ADMIN_SEEDED": True,
+                }
+            )
+            with app.app_context():
+                db.create_all()
+                seed_catalog(size)
+
+                top_k, top_k_time, top_k_peak = measure(lambda: get_top_high_sugar_products(TOP_K))
+                legacy, legacy_time, legacy_peak = measure(legacy_top_high_sugar_products)
+                assert [row["id"] for row in top_k] == [row["id"] for row in legacy]
+
+                print(f"{size:>10} {'top-k':>8} {top_k_time * 1000:>10.1f} {top_k_peak / 1024:>10.1f}")
+                print(f"{size:>10} {'legacy':>8} {legacy_time * 1000:>10.1f} {legacy_peak / 1024:>10.1f}")
+                db.session.remove()
+                db.engine.dispose()
+
+
+if __name__ == "__main__":
+    requested = [int(arg) for arg in sys.argv[1:]]
+    run(requested or DEFAULT_SIZES)
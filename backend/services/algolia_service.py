@@ -1,8 +1,8 @@
 import os
 from typing import List, Dict
-import requests
 
 from models import Product
+from services.http_client import http_client
 
 ALGOLIA_APP_ID = os.getenv("ALGOLIA_APP_ID", "")
 ALGOLIA_ADMIN_API_KEY = os.getenv("ALGOLIA_WRITE_API_KEY", "")
@@ -49,7 +49,7 @@ def sync_products_to_algolia() -> Dict[str, int]:
         requests_payload.append({"action": "updateObject", "body": record})
 
     url = f"https://{ALGOLIA_APP_ID}.algolia.net/1/indexes/{ALGOLIA_INDEX_NAME}/batch"
-    resp = requests.post(
+    resp = http_client.post(
         url,
         headers=_search_headers(),
         json={"requests": requests_payload},
@@ -78,5 +78,5 @@ def send_purchase_event_to_algolia(user_id: int, product_object_ids: List[str])
         ]
     }
 
-    resp = requests.post(url, headers=_search_headers(), json=payload, timeout=20)
+    resp = http_client.post(url, headers=_search_headers(), json=payload, timeout=20)
     resp.raise_for_status()
@@ -0,0 +1,157 @@
+from sqlalchemy import select, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from extensions import db
+from models import Invoice, InvoiceItem, Product
+from services.inventory import reserve_stock_many, stock_levels
+
+
+MAX_BASKET_LINES = 100
+
+
+def parse_quantity(value):
+    if value is None:
+        return None, "quantity is required"
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        return None, "quantity must be an integer"
+    if quantity <= 0:
+        return None, "quantity must be greater than 0"
+    return quantity, None
+
+
+def parse_basket_lines(lines):
+    """
+    Parse a list of {product_id, quantity} dicts.
+    Returns (parsed, error): parsed holds (product_id, quantity, errors) per
+    line, error is set when the list itself is unusable.
+    """
+    if not isinstance(lines, list) or not lines:
+        return None, "items must be a non-empty list"
+    if len(lines) > MAX_BASKET_LINES:
+        return None, f"At most {MAX_BASKET_LINES} items per request"
+
+    parsed = []
+    for line in lines:
+        line = line if isinstance(line, dict) else {}
+        quantity, quantity_error = parse_quantity(line.get("quantity"))
+        errors = {}
+        try:
+            product_id = int(line.get("product_id"))
+        except (TypeError, ValueError):
+            product_id = None
+            errors["product_id"] = "product_id is required"
+        if quantity_error:
+            errors["quantity"] = quantity_error
+        parsed.append((product_id, quantity, errors))
+    return parsed, None
+
+
+def _check_lines(parsed, products, stock):
+    """
+    Check every line against stock ({product_id: quantity}).
+    Returns (results, requested, ok) where requested sums the quantity
+    taken per product.
+    """
+    results = []
+    requested = {}
+    ok = True
+    for index, (product_id, quantity, errors) in enumerate(parsed):
+        errors = dict(errors)
+        result = {"index": index, "product_id": product_id}
+
+        if not errors and product_id not in products:
+            errors["product_id"] = "Product not found"
+        if not errors:
+            # The same product may appear on several lines; check the total.
+            already = requested.get(product_id, 0)
+            if stock.get(product_id, 0) < already + quantity:
+                result["available_stock"] = max(0, stock.get(product_id, 0) - already)
+                errors["quantity"] = "Not enough stock"
+            else:
+                requested[product_id] = already + quantity
+
+        if errors:
+            ok = False
+            result.update({"status": "error", "errors": errors})
+        else:
+            result.update({"status": "ok", "quantity": quantity})
+        results.append(result)
+    return results, requested, ok
+
+
+def reserve_basket(invoice, parsed):
+    """
+    Add parsed basket lines to invoice and take their stock, all or nothing.
+
+    Product rows are locked FOR UPDATE in id order, so concurrent baskets
+    sharing products queue up instead of deadlocking. Stock is then taken
+    with one conditional UPDATE, which also catches databases without row
+    locks (SQLite). Lines are flushed, but the caller commits (or rolls
+    back when any line failed).
+
+    Returns (results, ok): one result dict per line, and whether every
+    line was reserved.
+    """
+    product_ids = sorted({product_id for product_id, _, _ in parsed if product_id is not None})
+    products = {
+        product.id: product
+        for product in Product.query.filter(Product.id.in_(product_ids))
+        .order_by(Product.id)
+        .with_for_update()
+        .all()
+    } if product_ids else {}
+
+    stock = {product_id: product.quantity_in_stock for product_id, product in products.items()}
+    results, requested, ok = _check_lines(parsed, products, stock)
+    if not ok:
+        return results, False
+
+    remaining = reserve_stock_many(requested)
+    if remaining is None:
+        # Someone else took stock since we read it; report against fresh levels.
+        results, _, _ = _check_lines(parsed, products, stock_levels(products))
+        return results, False
+
+    items = []
+    basket_total = 0.0
+    for product_id, quantity, _ in parsed:
+        product = products[product_id]
+        items.append(
+            InvoiceItem(
+                invoice=invoice,
+                product_id=product.id,
+                quantity=quantity,
+                unit_price=product.price,
+            )
+        )
+        basket_total += float(product.price) * quantity
+
+    db.session.add_all(items)
+    db.session.flush()
+
+    # Added in SQL so concurrent edits of one invoice do not lose updates;
+    # RETURNING hands the new total back without reloading the invoice.
+    statement = (
+        update(Invoice)
+        .where(Invoice.id == invoice.id)
+        .values(total_amount=Invoice.total_amount + basket_total)
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.get_bind().dialect.update_returning:
+        new_total = db.session.execute(statement.returning(Invoice.total_amount)).scalar_one()
+    else:
+        db.session.execute(statement)
+        new_total = db.session.execute(
+            select(Invoice.total_amount).where(Invoice.id == invoice.id)
+        ).scalar_one()
+    set_committed_value(invoice, "total_amount", new_total)
+
+    for result, item in zip(results, items):
+        result.update({
+            "id": item.id,
+            "unit_price": float(item.unit_price),
+            "remaining_stock": remaining[item.product_id],
+        })
+    return results, True
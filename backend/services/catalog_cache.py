@@ -0,0 +1,214 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import import_string
+
+from extensions import db
+from models import CatalogVersion, Product
+
+
+DEFAULT_CACHE_SIZE = 5000
+CATALOG_VERSION_KEY = "catalog:version"
+
+
+class LocalLRUBackend:
+    """
+    In-process LRU store used when no shared backend is configured.
+    Every gunicorn worker holds its own copy.
+    """
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DatabaseCounters:
+    """
+    Counters in the catalog_versions table, so every process using the
+    database (all gunicorn workers and the job worker) sees the same
+    catalog version. incr commits the session straight away, which is why
+    invalidate must only be called once the write itself is committed.
+    """
+
+    def _read(self, key):
+        return db.session.execute(select(CatalogVersion.version).where(CatalogVersion.key == key)).scalar()
+
+    def get_counter(self, key):
+        value = self._read(key)
+        if value is None:
+            value = self._seed(key)
+        return value
+
+    def incr(self, key):
+        value = self._bump(key)
+        if value is None:
+            self._seed(key)
+            value = self._bump(key)
+        db.session.commit()
+        return value
+
+    def _bump(self, key):
+        """Add one to the counter; None when its row does not exist yet."""
+        statement = (
+            update(CatalogVersion)
+            .where(CatalogVersion.key == key)
+            .values(version=CatalogVersion.version + 1)
+        )
+        if db.session.get_bind().dialect.update_returning:
+            return db.session.execute(statement.returning(CatalogVersion.version)).scalar()
+        if db.session.execute(statement).rowcount == 0:
+            return None
+        return self._read(key)
+
+    def _seed(self, key):
+        # A missing row starts at the current time in microseconds, so a
+        # recreated table never hands out an ETag that a client still holds.
+        try:
+            db.session.execute(CatalogVersion.__table__.insert().values(key=key, version=time.time_ns() // 1000))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # Another process seeded it first.
+        return self._read(key)
+
+
+def _product_key(product_id):
+    return f"product:{product_id}"
+
+
+def _stock_stamp(rows):
+    """
+    Short digest of the rows a Product query returns: how many, the newest
+    updated_at and their total stock. Every stock change moves updated_at,
+    so the digest follows stock without a shared counter.
+    """
+    subquery = rows.with_entities(Product.id, Product.updated_at, Product.quantity_in_stock).subquery()
+    stamp = db.session.query(
+        func.count(subquery.c.id),
+        func.max(subquery.c.updated_at),
+        func.sum(subquery.c.quantity_in_stock),
+    ).one()
+    return hashlib.blake2b(repr(tuple(stamp)).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _version_stamp(product):
+    # updated_at moves on every ORM write, so an entry written by another
+    # worker (or before a write we were not told about) is never served stale.
+    stamp = product.updated_at or product.created_at
+    return stamp.isoformat() if stamp else None
+
+
+class CatalogCache:
+    """
+    Cache of serialized product representations keyed by product id.
+
+    Backends need get/set/delete_many/clear. Values are plain
+    JSON-compatible lists so a shared store (Redis, memcached) can be
+    plugged in through CATALOG_CACHE_BACKEND. Per-worker entries are safe:
+    each one is checked against the product's updated_at before use.
+
+    The catalog version is what product ETags are built from, so it must
+    be shared by every process. It lives in the database unless the
+    configured backend has get_counter/incr of its own. Stock is left out
+    of it: checkouts would otherwise bump the one shared row all the time,
+    so ETags add a stamp of the stock in the rows they describe instead.
+    """
+
+    def __init__(self, backend=None, counters=None):
+        self.backend = backend or LocalLRUBackend()
+        self.counters = counters or DatabaseCounters()
+
+    def init_app(self, app):
+        backend = app.config.get("CATALOG_CACHE_BACKEND")
+        if isinstance(backend, str):
+            backend = import_string(backend)()
+        if backend is None:
+            backend = LocalLRUBackend(app.config.get("CATALOG_CACHE_SIZE", DEFAULT_CACHE_SIZE))
+
+        self.backend = backend
+        self.counters = backend if hasattr(backend, "incr") else DatabaseCounters()
+        app.extensions["catalog_cache"] = self
+
+    def get_or_build(self, product, build):
+        """
+        Return the cached representation of product, building and storing it
+        with build(product) when missing or stale. Callers must not mutate
+        the returned dict.
+        """
+        key = _product_key(product.id)
+        stamp = _version_stamp(product)
+
+        cached = self.backend.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        value = build(product)
+        self.backend.set(key, [stamp, value])
+        return value
+
+    def invalidate(self, *product_ids):
+        """
+        Drop cached representations and bump the catalog version.
+        Call after committing any write that changes product data other
+        than stock.
+        """
+        self.forget(*product_ids)
+        self.bump_version()
+
+    def forget(self, *product_ids):
+        """
+        Drop cached representations but keep the catalog version. Call
+        after committing a change to stock only.
+        """
+        keys = [_product_key(product_id) for product_id in product_ids if product_id is not None]
+        if keys:
+            self.backend.delete_many(keys)
+
+    def version(self):
+        return int(self.counters.get_counter(CATALOG_VERSION_KEY))
+
+    def bump_version(self):
+        return int(self.counters.incr(CATALOG_VERSION_KEY))
+
+    def etag(self, rows=None):
+        """
+        ETag for the catalog version, narrowed to the stock of rows (a
+        Product query) when given.
+        """
+        etag = f"catalog-{self.version()}"
+        if rows is not None:
+            etag = f"{etag}-{_stock_stamp(rows)}"
+        return etag
+
+    def clear(self):
+        self.backend.clear()
+
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode
+
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Evict down to this share of the limit, so a full cache does not evict on
+# every single write.
+EVICT_TO_RATIO = 0.9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    body BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_responses_last_used ON responses (last_used);
+"""
+
+
+def cache_key(url, params=None):
+    """Content address of a GET: sha256 of the URL plus its sorted query params."""
+    query = urlencode(sorted((str(key), str(value)) for key, value in (params or {}).items()))
+    return hashlib.sha256(f"GET {url}?{query}".encode("utf-8")).hexdigest()
+
+
+class CachedResponse:
+    def __init__(self, key, body, etag, last_modified, expires_at):
+        self.key = key
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+    @property
+    def fresh(self):
+        return self.expires_at > time.time()
+
+    def json(self):
+        return json.loads(self.body)
+
+    def validators(self):
+        """Headers for a conditional GET that lets the server answer 304."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    On-disk cache of external JSON GET responses, in one SQLite file shared
+    by every worker process and thread.
+
+    Entries are fresh for a TTL and then revalidated with the ETag or
+    Last-Modified the server sent, so an unchanged response costs a 304
+    instead of a download. Once the file passes max_bytes, the least
+    recently used entries are evicted. In offline mode entries are served
+    however old they are and a miss never reaches the network, which lets
+    tests and local imports replay a recorded cache file.
+
+    Disabled (every lookup misses, nothing is stored) until init_app sets
+    OPENFOODFACTS_CACHE_PATH.
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES, offline=False):
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        self._bytes = None
+        self.configure(path, ttl, max_bytes, offline)
+
+    def init_app(self, app):
+        self.configure(
+            app.config.get("OPENFOODFACTS_CACHE_PATH") or None,
+            app.config.get("OPENFOODFACTS_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS),
+            app.config.get("OPENFOODFACTS_CACHE_MAX_MB", DEFAULT_MAX_BYTES // (1024 * 1024)) * 1024 * 1024,
+            app.config.get("OPENFOODFACTS_CACHE_OFFLINE", False),
+        )
+        app.extensions["openfoodfacts_cache"] = self
+
+    def configure(self, path=None, ttl=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES, offline=False):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+            self._connection = None
+            self._bytes = None
+            self.path = path
+            self.ttl = ttl
+            self.max_bytes = max_bytes
+            self.offline = bool(offline)
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _db(self):
+        # One connection per process: a connection must not cross a fork
+        # (gunicorn preloads the app before forking its workers).
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+            self._pid = os.getpid()
+            self._bytes = None
+        return self._connection
+
+    def get(self, url, params=None):
+        """The stored response for this request (fresh or not), or None."""
+        if not self.enabled:
+            return None
+        key = cache_key(url, params)
+        with self._lock:
+            db = self._db()
+            row = db.execute(
+                "SELECT body, etag, last_modified, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        return CachedResponse(key, *row)
+
+    def store(self, url, params, body, etag=None, last_modified=None):
+        if not self.enabled:
+            return
+        now = time.time()
+        key = cache_key(url, params)
+        with self._lock:
+            db = self._db()
+            previous = db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            db.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, url, body, etag, last_modified, stored_at, expires_at, last_used, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, body, etag, last_modified, now, now + self.ttl, now, len(body)),
+            )
+            if self._bytes is None:
+                self._bytes = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            else:
+                self._bytes += len(body) - (previous[0] if previous else 0)
+            if self._bytes > self.max_bytes:
+                self._evict(db)
+
+    def revalidated(self, cached, etag=None, last_modified=None):
+        """The server answered 304: the stored body is good for another TTL."""
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            self._db().execute(
+                "UPDATE responses SET expires_at = ?, last_used = ?, "
+                "etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE key = ?",
+                (now + self.ttl, now, etag, last_modified, cached.key),
+            )
+
+    def _evict(self, db):
+        # Other processes write to the same file, so recount before evicting.
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        target = int(self.max_bytes * EVICT_TO_RATIO)
+        if total > target:
+            rows = db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+            doomed = []
+            for key, size in rows:
+                if total <= target:
+                    break
+                doomed.append((key,))
+                total -= size
+            db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self._bytes = total
+
+    def stats(self):
+        if not self.enabled:
+            return {"enabled": False}
+        with self._lock:
+            entries, size = self._db().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"enabled": True, "path": self.path, "entries": entries, "bytes": size, "offline": self.offline}
+
+    def clear(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._db().execute("DELETE FROM responses")
+            self._bytes = 0
+
+
+response_cache = ResponseCache()
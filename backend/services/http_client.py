@@ -0,0 +1,114 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 16
+DEFAULT_RETRIES = 2
+DEFAULT_RETRY_BACKOFF_SECONDS = 0.5
+DEFAULT_TIMEOUT = (5, 20)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HttpClient:
+    """
+    Outbound HTTP for every external service (OpenFoodFacts, Algolia,
+    PayPal): one requests.Session per process, so connections are kept
+    alive and reused instead of paying a TCP + TLS handshake per call.
+
+    The adapter keeps a pool per host (pool_connections hosts, up to
+    pool_maxsize connections each; the parallel barcode import needs one
+    per fetch worker) and retries with exponential backoff on connection
+    errors and on 429/5xx answers. Reads and statuses are only retried for
+    idempotent methods, so a PayPal capture POST is never sent twice; a
+    failed connect is, since nothing reached the server. Calls without a
+    timeout get the default one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+        self._settings = None
+        self.configure()
+
+    def init_app(self, app):
+        self.configure(
+            pool_connections=app.config.get("HTTP_POOL_CONNECTIONS", DEFAULT_POOL_CONNECTIONS),
+            pool_maxsize=app.config.get("HTTP_POOL_MAXSIZE", DEFAULT_POOL_MAXSIZE),
+            retries=app.config.get("HTTP_RETRIES", DEFAULT_RETRIES),
+            backoff=app.config.get("HTTP_RETRY_BACKOFF_SECONDS", DEFAULT_RETRY_BACKOFF_SECONDS),
+            timeout=(
+                app.config.get("HTTP_CONNECT_TIMEOUT_SECONDS", DEFAULT_TIMEOUT[0]),
+                app.config.get("HTTP_READ_TIMEOUT_SECONDS", DEFAULT_TIMEOUT[1]),
+            ),
+        )
+        app.extensions["http_client"] = self
+
+    def configure(
+        self,
+        pool_connections=DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        retries=DEFAULT_RETRIES,
+        backoff=DEFAULT_RETRY_BACKOFF_SECONDS,
+        timeout=DEFAULT_TIMEOUT,
+    ):
+        settings = (pool_connections, pool_maxsize, retries, backoff, tuple(timeout))
+        with self._lock:
+            if self._settings == settings:
+                return
+            self._settings = settings
+            self.pool_connections, self.pool_maxsize, self.retries, self.backoff, self.timeout = settings
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+
+    def _build_session(self):
+        retry = Retry(
+            total=self.retries,
+            connect=self.retries,
+            read=self.retries,
+            status=self.retries,
+            backoff_factor=self.backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            respect_retry_after_header=True,
+            # Hand the last 429/5xx back; callers already check the status.
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @property
+    def session(self):
+        # Pooled sockets must not be shared across a fork (gunicorn preloads
+        # the app before forking its workers), so each process builds its own.
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                self._session = self._build_session()
+                self._pid = os.getpid()
+            return self._session
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+
+http_client = HttpClient()
@@ -1,9 +1,145 @@
+import json
+
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
 from extensions import db
 from models import Product
-from services.openfoodfacts_service import fetch_product_by_barcode
+from services.openfoodfacts_service import fetch_products_by_barcodes
 from scripts.barcodes import BARCODES
+from services.catalog_cache import catalog_cache
+from services.nutrition import NUTRITION_COLUMNS, nutrition_columns
 from sqlalchemy.exc import IntegrityError
 
+
+# Products are written this many at a time, one transaction per batch.
+IMPORT_BATCH_SIZE = 100
+
+# Every column an import sets on a new product; bulk INSERTs need the same
+# keys on every row.
+IMPORT_COLUMNS = (
+    "name",
+    "brand",
+    "barcode",
+    "category",
+    "description",
+    "unit",
+    "price",
+    "original_price",
+    "quantity_in_stock",
+    "picture_url",
+    "nutritional_info",
+    "ingredients",
+    "dietary_tags",
+) + tuple(NUTRITION_COLUMNS)
+
+
+def match_existing_products(payloads):
+    """
+    Find the products a batch of payloads (dicts with barcode, name and
+    brand) already matches, with one IN query per key. Returns
+    ({barcode: product}, {(name, brand): product}); like the row-by-row
+    lookup, the lowest id wins when several share a name and brand.
+    """
+    barcodes = {payload.get("barcode") for payload in payloads if payload.get("barcode")}
+    names = {payload["name"] for payload in payloads}
+    brands = {payload["brand"] for payload in payloads}
+
+    by_barcode = {}
+    if barcodes:
+        by_barcode = {product.barcode: product for product in Product.query.filter(Product.barcode.in_(barcodes))}
+
+    by_name_brand = {}
+    if names:
+        matches = Product.query.filter(Product.name.in_(names), Product.brand.in_(brands)).order_by(Product.id)
+        for product in matches:
+            by_name_brand.setdefault((product.name, product.brand), product)
+    return by_barcode, by_name_brand
+
+
+def insert_products_ignoring_conflicts(products):
+    """
+    INSERT unsaved products in one statement, skipping any whose barcode
+    already exists (ON CONFLICT DO NOTHING on PostgreSQL and SQLite).
+    Returns the set of barcodes actually inserted; rows without a barcode
+    never conflict. Drivers that cannot return rows from an executemany
+    get one INSERT per product instead, so skipped rows are still told
+    apart.
+    """
+    if not products:
+        return set()
+
+    table = Product.__table__
+    rows = [{column: getattr(product, column) for column in IMPORT_COLUMNS} for product in products]
+    dialect = db.session.get_bind().dialect
+    if dialect.name in ("postgresql", "sqlite"):
+        insert = postgresql_insert if dialect.name == "postgresql" else sqlite_insert
+        stmt = insert(table).on_conflict_do_nothing(index_elements=["barcode"])
+    else:
+        stmt = table.insert()
+
+    if dialect.insert_executemany_returning:
+        return {barcode for (barcode,) in db.session.execute(stmt.returning(table.c.barcode), rows)}
+    # An executemany's rowcount is a total at best, so per row is the only
+    # way to know which barcodes the conflict clause skipped.
+    inserted = set()
+    for row in rows:
+        if db.session.execute(stmt, row).rowcount == 1:
+            inserted.add(row["barcode"])
+    return inserted
+
+
+def _new_product(barcode, data):
+    nutriments = data.get("nutriments")
+    return Product(
+        name=data["product_name"][:200],
+        brand=data["brands"][:100],
+        barcode=barcode,
+        category=(data.get("categories") or "Unknown")[:100],
+        price=0.0,  # Default price
+        quantity_in_stock=100,
+        picture_url=data.get("image_front_url"),
+        nutritional_info=json.dumps(nutriments) if nutriments else None,
+        **nutrition_columns(nutriments if isinstance(nutriments, dict) else None),
+    )
+
+
+def _import_batch(batch):
+    """Insert the products of one batch that do not exist yet. Returns (imported, skipped)."""
+    by_barcode, by_name_brand = match_existing_products(
+        [{"barcode": barcode, "name": data["product_name"], "brand": data["brands"]} for barcode, data in batch]
+    )
+
+    new_products = []
+    skipped = 0
+    for barcode, data in batch:
+        # Prevent duplicates (prefer barcode, fallback name+brand)
+        key = (data["product_name"], data["brands"])
+        if barcode in by_barcode or key in by_name_brand:
+            print(f"Skipping existing: {data['product_name']}")
+            skipped += 1
+            continue
+        product = _new_product(barcode, data)
+        by_barcode[barcode] = by_name_brand[key] = product
+        new_products.append(product)
+
+    try:
+        inserted = insert_products_ignoring_conflicts(new_products)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return 0, skipped + len(new_products)
+
+    catalog_cache.invalidate()
+    imported = 0
+    for product in new_products:
+        if product.barcode in inserted:
+            print(f"Imported: {product.name}")
+            imported += 1
+    return imported, skipped + len(new_products) - imported
+
+
 def import_products_logic():
     """
     Core logic to import products from OpenFoodFacts using the barcode list.
@@ -15,55 +151,40 @@ def import_products_logic():
 
     print(f"Starting import for {len(BARCODES)} barcodes...")
 
-    for barcode in BARCODES:
-        try:
-            data = fetch_product_by_barcode(barcode)
-            if not data:
-                skipped += 1
-                continue
-
-            name = data.get("product_name")
-            brand = data.get("brands")
-            categories = data.get("categories")
-            image_url = data.get("image_front_url")
-            nutriments = data.get("nutriments")
-
-            if not name or not brand:
-                skipped += 1
-                continue
-
-            # Prevent duplicates (prefer barcode, fallback name+brand)
-            existing = Product.query.filter_by(barcode=barcode).first()
-            if not existing:
-                existing = Product.query.filter_by(name=name, brand=brand).first()
-            if existing:
-                print(f"Skipping existing: {name}")
-                skipped += 1
-                continue
-
-            product = Product(
-                name=name[:200],
-                brand=brand[:100],
-                barcode=barcode,
-                category=(categories or "Unknown")[:100],
-                price=0.0,  # Default price
-                quantity_in_stock=100,
-                picture_url=image_url,
-                nutritional_info=str(nutriments) if nutriments else None,
-            )
-
-            db.session.add(product)
-            db.session.commit()
-            imported += 1
-            print(f"Imported: {name}")
+    batch = []
 
-        except IntegrityError:
-            db.session.rollback()
-            skipped += 1
+    def flush():
+        nonlocal imported, skipped, errors
+        if not batch:
+            return
+        try:
+            batch_imported, batch_skipped = _import_batch(batch)
+            imported += batch_imported
+            skipped += batch_skipped
         except Exception as e:
-            print(f"Error importing {barcode}: {e}")
+            print(f"Error importing batch of {len(batch)}: {e}")
             db.session.rollback()
+            errors += len(batch)
+        batch.clear()
+
+    fetched = fetch_products_by_barcodes(
+        BARCODES,
+        workers=current_app.config.get("OPENFOODFACTS_FETCH_WORKERS", 8),
+        per_minute=current_app.config.get("OPENFOODFACTS_RATE_LIMIT_PER_MINUTE"),
+    )
+    for barcode, data, network_error in fetched:
+        if network_error is not None:
+            print(f"Error importing {barcode}: {network_error}")
             errors += 1
+            continue
+        if not data or not data.get("product_name") or not data.get("brands"):
+            skipped += 1
+            continue
+
+        batch.append((barcode, data))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush()
+    flush()
 
     return {
         "imported": imported,
@@ -0,0 +1,106 @@
+from datetime import datetime
+
+from sqlalchemy import case, select, update
+from sqlalchemy.orm import aliased
+
+from extensions import db
+from models import Product
+
+
+# Stock is only ever changed with a single UPDATE that re-checks the level in
+# its WHERE clause, never by reading the value into Python and writing it
+# back, so concurrent workers cannot oversell. Every change also moves
+# updated_at, which keeps catalog cache entries, product ETags and delta
+# sync honest; callers still call catalog_cache.forget after committing.
+
+def _execute(statement):
+    return db.session.execute(statement.execution_options(synchronize_session=False))
+
+
+def _take(statement, product_ids):
+    """
+    Run a stock-taking UPDATE and return {product_id: remaining} for the rows
+    it changed, using RETURNING where the database supports it.
+    """
+    if db.session.get_bind().dialect.update_returning:
+        rows = _execute(statement.returning(Product.id, Product.quantity_in_stock))
+        return {product_id: quantity for product_id, quantity in rows}
+
+    if _execute(statement).rowcount != len(product_ids):
+        return {}
+    return stock_levels(product_ids)
+
+
+def reserve_stock(product_id, quantity):
+    """
+    Take quantity units of a product if that many are available.
+    Returns the remaining stock, or None when there was not enough.
+    """
+    remaining = _take(
+        update(Product)
+        .where(Product.id == product_id, Product.quantity_in_stock >= quantity)
+        .values(
+            quantity_in_stock=Product.quantity_in_stock - quantity,
+            updated_at=datetime.utcnow(),
+        ),
+        [product_id],
+    )
+    return remaining.get(product_id)
+
+
+def release_stock(product_id, quantity):
+    """Give quantity units of a product back."""
+    release_stock_many({product_id: quantity})
+
+
+def reserve_stock_many(quantities):
+    """
+    Take stock for several products ({product_id: quantity}) in one UPDATE.
+    Returns {product_id: remaining} when every product had enough, None
+    otherwise. The NOT EXISTS guard makes the statement all or nothing; the
+    per-row check still stops a concurrent change from driving stock below
+    zero, and the caller rolls back if only some rows were taken.
+    """
+    if not quantities:
+        return {}
+    other = aliased(Product)
+    short = (
+        select(other.id)
+        .where(other.id.in_(quantities), other.quantity_in_stock < case(quantities, value=other.id))
+        .exists()
+    )
+    wanted = case(quantities, value=Product.id)
+    remaining = _take(
+        update(Product)
+        .where(Product.id.in_(quantities), Product.quantity_in_stock >= wanted, ~short)
+        .values(
+            quantity_in_stock=Product.quantity_in_stock - wanted,
+            updated_at=datetime.utcnow(),
+        ),
+        list(quantities),
+    )
+    return remaining if len(remaining) == len(quantities) else None
+
+
+def release_stock_many(quantities):
+    """Give stock back for several products ({product_id: quantity}) in one UPDATE."""
+    if not quantities:
+        return
+    _execute(
+        update(Product)
+        .where(Product.id.in_(quantities))
+        .values(
+            quantity_in_stock=Product.quantity_in_stock + case(quantities, value=Product.id),
+            updated_at=datetime.utcnow(),
+        )
+    )
+
+
+def stock_levels(product_ids):
+    """Current stock straight from the database, as {product_id: quantity}."""
+    if not product_ids:
+        return {}
+    rows = db.session.execute(
+        select(Product.id, Product.quantity_in_stock).where(Product.id.in_(list(product_ids)))
+    )
+    return {product_id: quantity for product_id, quantity in rows}
@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+import socket
+import time
+import traceback
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_, select, update
+
+from extensions import db
+from models import Job
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_BASE_SECONDS = 10
+DEFAULT_RETRY_MAX_SECONDS = 600
+# A running job whose worker has been silent this long is assumed dead.
+DEFAULT_LOCK_TIMEOUT_SECONDS = 900
+
+_HANDLERS = {}
+_current_job = ContextVar("current_job", default=None)
+
+
+# ===============================
+# Handlers and enqueueing
+# ===============================
+
+def job_handler(kind):
+    """
+    Register a function as the handler for jobs of this kind. It is called
+    with the job payload as keyword arguments inside an app context and may
+    return a JSON-serialisable result; raising schedules a retry.
+    """
+    def decorator(fn):
+        _HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+
+def enqueue_job(kind, payload=None, created_by=None, max_attempts=None, run_at=None):
+    """
+    Add a job to the session and flush it so its id is known. It commits
+    with the caller's transaction, so a job is only ever queued for changes
+    that were actually saved.
+    """
+    if kind not in _HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        status="queued",
+        attempts=0,
+        max_attempts=max_attempts or current_app.config.get("JOB_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS),
+        run_at=run_at or datetime.utcnow(),
+        created_by=created_by,
+    )
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+
+def job_json(job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "run_at": job.run_at.isoformat() if job.run_at else None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "result": json.loads(job.result) if job.result else None,
+        "checkpoint": json.loads(job.checkpoint) if job.checkpoint else None,
+        "last_error": job.last_error,
+    }
+
+
+# ===============================
+# Checkpoints
+# ===============================
+
+def current_job():
+    """The job whose handler is running in this context, or None."""
+    return _current_job.get()
+
+
+def job_checkpoint():
+    """The checkpoint the running job saved on an earlier attempt, or None."""
+    job = current_job()
+    if job is None or not job.checkpoint:
+        return None
+    return json.loads(job.checkpoint)
+
+
+def save_checkpoint(checkpoint):
+    """
+    Record how far the running job got and commit. A retry, a reclaimed
+    stale job or a resumed one passes it back through job_checkpoint(), so
+    long handlers can skip work that is already saved. Saving also renews
+    the lock, so a job that keeps checkpointing is never taken for dead.
+    No-op outside a job.
+    """
+    job = current_job()
+    if job is None:
+        return
+    job.checkpoint = json.dumps(checkpoint)
+    job.locked_at = datetime.utcnow()
+    db.session.commit()
+
+
+def resume_job(job):
+    """
+    Queue a failed job again with a fresh set of attempts. Its checkpoint is
+    kept, so the handler carries on from there. Returns False when the job
+    is not failed.
+    """
+    if job.status != "failed":
+        return False
+    job.status = "queued"
+    job.attempts = 0
+    job.run_at = datetime.utcnow()
+    job.finished_at = None
+    return True
+
+
+# ===============================
+# Worker
+# ===============================
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def retry_delay(attempts):
+    """Exponential backoff: base, 2*base, 4*base ... capped."""
+    base = current_app.config.get("JOB_RETRY_BASE_SECONDS", DEFAULT_RETRY_BASE_SECONDS)
+    cap = current_app.config.get("JOB_RETRY_MAX_SECONDS", DEFAULT_RETRY_MAX_SECONDS)
+    return timedelta(seconds=min(cap, base * 2 ** max(0, attempts - 1)))
+
+
+def claim_job(worker, now=None):
+    """
+    Take the next due job, or None. A job is due when it is queued and its
+    run_at has passed, or when it has been running longer than the lock
+    timeout (its worker died). The claim is a conditional UPDATE, so two
+    workers can never run the same job even where SKIP LOCKED is missing.
+    """
+    now = now or datetime.utcnow()
+    stale = now - timedelta(
+        seconds=current_app.config.get("JOB_LOCK_TIMEOUT_SECONDS", DEFAULT_LOCK_TIMEOUT_SECONDS)
+    )
+    due = or_(
+        and_(Job.status == "queued", Job.run_at <= now),
+        and_(Job.status == "running", Job.locked_at < stale),
+    )
+
+    while True:
+        job_id = db.session.execute(
+            select(Job.id)
+            .where(due)
+            .order_by(Job.run_at, Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).scalar()
+        if job_id is None:
+            db.session.rollback()
+            return None
+
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, due)
+            .values(status="running", attempts=Job.attempts + 1, locked_at=now, locked_by=worker)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+        # Another worker got there first; look again.
+
+
+def run_job(job):
+    """Run a claimed job and record success, a retry or the final failure."""
+    handler = _HANDLERS.get(job.kind)
+    token = _current_job.set(job)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job kind {job.kind!r}")
+        result = handler(**json.loads(job.payload or "{}"))
+    except Exception as exc:  # noqa: BLE001
+        db.session.rollback()
+        job.last_error = "".join(traceback.format_exception_only(type(exc), exc)).strip()[:4000]
+        job.locked_at = None
+        job.locked_by = None
+        if job.attempts < job.max_attempts and handler is not None:
+            job.status = "queued"
+            job.run_at = datetime.utcnow() + retry_delay(job.attempts)
+        else:
+            job.status = "failed"
+            job.finished_at = datetime.utcnow()
+        db.session.commit()
+        logger.warning("Job %s (%s) attempt %s failed: %s", job.id, job.kind, job.attempts, job.last_error)
+        return job
+    finally:
+        _current_job.reset(token)
+
+    job.status = "succeeded"
+    job.result = json.dumps(result) if result is not None else None
+    job.last_error = None
+    job.locked_at = None
+    job.locked_by = None
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+def run_pending_jobs(worker=None, max_jobs=None):
+    """Run due jobs until none are left (or max_jobs ran). Returns the count."""
+    worker = worker or worker_name()
+    count = 0
+    while max_jobs is None or count < max_jobs:
+        job = claim_job(worker)
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+
+def work(poll_interval=1.0, max_jobs=None):
+    """Worker loop for `flask run-jobs`: run due jobs, sleep when idle."""
+    worker = worker_name()
+    logger.info("Job worker %s started", worker)
+    done = 0
+    while max_jobs is None or done < max_jobs:
+        ran = run_pending_jobs(worker, max_jobs=None if max_jobs is None else max_jobs - done)
+        done += ran
+        if not ran:
+            time.sleep(poll_interval)
+    return done
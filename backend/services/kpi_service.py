@@ -1,39 +1,38 @@
-import json
 from models import Product
 from extensions import db
-from sqlalchemy import func
+from sqlalchemy import func, or_
 from models import Product, InvoiceItem
+from services.nutrition import NUTRITION_COLUMNS
 import requests
 
+
+def _nutrition_was_parsed():
+    """
+    Products whose nutritional_info parsed: the parser fills every typed
+    column with None when it cannot read the text.
+    """
+    return or_(*(getattr(Product, column).isnot(None) for column in NUTRITION_COLUMNS))
+
 def get_average_calories_by_category():
     """
     KPI: Average calories per product category
     """
-    products = Product.query.all()
-
-    category_totals = {}
-    category_counts = {}
-
-    for product in products:
-        if not product.nutritional_info:
-            continue
-
-        try:
-            nutriments = json.loads(product.nutritional_info.replace("'", '"'))
-            calories = nutriments.get("energy-kcal_100g", 0)
-        except Exception:
-            continue
-
-        category = product.category or "Unknown"
-
-        category_totals[category] = category_totals.get(category, 0) + calories
-        category_counts[category] = category_counts.get(category, 0) + 1
+    # One grouped aggregate over the typed column. Products that have
+    # nutrition data but no kcal value count as 0, as they always have;
+    # products whose nutrition data cannot be parsed are left out.
+    rows = (
+        db.session.query(
+            Product.category,
+            func.avg(func.coalesce(Product.energy_kcal_100g, 0)).label("average_calories"),
+        )
+        .filter(_nutrition_was_parsed())
+        .group_by(Product.category)
+        .all()
+    )
 
     result = {}
-    for category in category_totals:
-        result[category] = round(
-            category_totals[category] / category_counts[category], 2
-        )
+    for row in rows:
+        result[row.category or "Unknown"] = round(float(row.average_calories), 2)
 
     return result
 
@@ -42,29 +41,43 @@ def get_top_high_sugar_products(limit=5):
     """
     KPI: Top products with highest sugar content (per 100g)
     """
-    products = Product.query.all()
-    result = []
+    if limit <= 0:
+        return []
 
-    for product in products:
-        if not product.nutritional_info:
-            continue
+    columns = (Product.id, Product.name, Product.brand, Product.category, Product.sugars_100g)
+
+    # ORDER BY ... LIMIT on the indexed column: the database keeps only the
+    # top rows instead of us loading and sorting the whole catalog.
+    rows = (
+        db.session.query(*columns)
+        .filter(Product.sugars_100g.isnot(None))
+        .order_by(Product.sugars_100g.desc(), Product.id.asc())
+        .limit(limit)
+        .all()
+    )
 
-        try:
-            nutriments = json.loads(product.nutritional_info.replace("'", '"'))
-            sugar = nutriments.get("sugars_100g", 0)
-        except Exception:
-            continue
+    # Products with nutrition data but no sugar value rank as 0; text that
+    # could not be parsed has no sugar value to report.
+    if len(rows) < limit:
+        rows += (
+            db.session.query(*columns)
+            .filter(Product.sugars_100g.is_(None), _nutrition_was_parsed())
+            .order_by(Product.id.asc())
+            .limit(limit - len(rows))
+            .all()
+        )
 
+    result = []
+    for row in rows:
         result.append({
-            "id": product.id,
-            "name": product.name,
-            "brand": product.brand,
-            "category": product.category,
-            "sugars_100g": sugar
+            "id": row.id,
+            "name": row.name,
+            "brand": row.brand,
+            "category": row.category,
+            "sugars_100g": row.sugars_100g or 0
         })
 
-    result.sort(key=lambda x: x["sugars_100g"], reverse=True)
-    return result[:limit]
+    return result
 
 
 def get_best_selling_products(limit=5):
@@ -0,0 +1,362 @@
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import and_, case, false, func, literal, or_, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from extensions import db
+from models import Invoice, InvoiceItem, KpiDailyCategoryRevenue, KpiDailyRollup, Product, User
+
+
+# ===============================
+# Incremental maintenance
+# ===============================
+
+def _increment(model, keys, deltas):
+    """
+    Atomically add deltas to the rollup row identified by keys, creating it
+    when missing. Runs inside the caller's transaction so the rollup commits
+    (or rolls back) together with the change that caused it.
+    """
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        stmt = insert(table).values(**keys, **deltas)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={column: table.c[column] + stmt.excluded[column] for column in deltas},
+        )
+        db.session.execute(stmt)
+        return
+
+    result = db.session.execute(
+        table.update()
+        .where(*[table.c[key] == value for key, value in keys.items()])
+        .values(**{column: table.c[column] + value for column, value in deltas.items()})
+    )
+    if result.rowcount == 0:
+        db.session.execute(table.insert().values(**keys, **deltas))
+
+
+def _invoice_category_revenue(invoice):
+    rows = (
+        db.session.query(Product.category, func.sum(InvoiceItem.quantity * InvoiceItem.unit_price))
+        .select_from(InvoiceItem)
+        .join(Product, Product.id == InvoiceItem.product_id)
+        .filter(InvoiceItem.invoice_id == invoice.id)
+        .group_by(Product.category)
+        .all()
+    )
+    return {(category or "Other")[:100]: float(total or 0) for category, total in rows}
+
+
+def _apply_invoice(invoice, sign):
+    day = (invoice.paid_at or datetime.utcnow()).date()
+    _increment(
+        KpiDailyRollup,
+        {"day": day},
+        {"revenue": sign * float(invoice.total_amount), "orders": sign},
+    )
+    for category, revenue in _invoice_category_revenue(invoice).items():
+        _increment(KpiDailyCategoryRevenue, {"day": day, "category": category}, {"revenue": sign * revenue})
+
+
+def record_invoice_paid(invoice):
+    """Add a newly paid invoice to the rollups. Call before committing."""
+    _apply_invoice(invoice, 1)
+
+
+def record_invoice_reversed(invoice):
+    """Take a previously paid invoice back out of the rollups."""
+    _apply_invoice(invoice, -1)
+
+
+def record_customer_registered(user):
+    if user.role != "customer":
+        return
+    day = (user.created_at or datetime.utcnow()).date()
+    _increment(KpiDailyRollup, {"day": day}, {"new_customers": 1})
+
+
+def _as_date(value):
+    # func.date() returns a string on SQLite and a date on PostgreSQL.
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def rebuild_kpi_rollups():
+    """
+    Recompute every rollup from invoices and users. Used for the initial
+    backfill and to reconcile after manual data fixes.
+    """
+    db.session.query(KpiDailyCategoryRevenue).delete()
+    db.session.query(KpiDailyRollup).delete()
+
+    rollups = {}
+
+    paid_day = func.date(Invoice.paid_at)
+    invoice_rows = (
+        db.session.query(paid_day, func.sum(Invoice.total_amount), func.count(Invoice.id))
+        .filter(Invoice.payment_status == "paid", Invoice.paid_at.isnot(None))
+        .group_by(paid_day)
+        .all()
+    )
+    for day, revenue, orders in invoice_rows:
+        row = rollups.setdefault(_as_date(day), {"revenue": 0.0, "orders": 0, "new_customers": 0})
+        row["revenue"] = float(revenue or 0)
+        row["orders"] = int(orders or 0)
+
+    created_day = func.date(User.created_at)
+    customer_rows = (
+        db.session.query(created_day, func.count(User.id))
+        .filter(User.role == "customer", User.created_at.isnot(None))
+        .group_by(created_day)
+        .all()
+    )
+    for day, count in customer_rows:
+        row = rollups.setdefault(_as_date(day), {"revenue": 0.0, "orders": 0, "new_customers": 0})
+        row["new_customers"] = int(count or 0)
+
+    category_rows = (
+        db.session.query(paid_day, Product.category, func.sum(InvoiceItem.quantity * InvoiceItem.unit_price))
+        .select_from(Invoice)
+        .join(InvoiceItem, InvoiceItem.invoice_id == Invoice.id)
+        .join(Product, Product.id == InvoiceItem.product_id)
+        .filter(Invoice.payment_status == "paid", Invoice.paid_at.isnot(None))
+        .group_by(paid_day, Product.category)
+        .all()
+    )
+    category_revenue = {}
+    for day, category, revenue in category_rows:
+        key = (_as_date(day), (category or "Other")[:100])
+        category_revenue[key] = category_revenue.get(key, 0.0) + float(revenue or 0)
+
+    db.session.add_all([KpiDailyRollup(day=day, **values) for day, values in rollups.items()])
+    db.session.add_all(
+        [
+            KpiDailyCategoryRevenue(day=day, category=category, revenue=revenue)
+            for (day, category), revenue in category_revenue.items()
+        ]
+    )
+    db.session.commit()
+
+    return {"days": len(rollups), "category_days": len(category_revenue)}
+
+
+# ===============================
+# Reads
+# ===============================
+
+def _day_start(day):
+    return datetime.combine(day, time.min)
+
+
+def split_window(start, end):
+    """
+    Split [start, end) into whole days that can be read from rollups and the
+    partial days at the edges that have to be scanned live.
+
+    Returns ((first_day or None, end_day), live_ranges) where end_day is
+    exclusive, or (None, live_ranges) when no whole day is covered. The day
+    containing end is always partial, so today is always read live.
+    """
+    if start is None:
+        first_full = None
+    elif start == _day_start(start.date()):
+        first_full = start.date()
+    else:
+        first_full = start.date() + timedelta(days=1)
+
+    last_full = end.date()
+    if first_full is not None and first_full >= last_full:
+        return None, [(start, end)]
+
+    live = []
+    if first_full is not None and start < _day_start(first_full):
+        live.append((start, _day_start(first_full)))
+    if end > _day_start(last_full):
+        live.append((_day_start(last_full), end))
+    return (first_full, last_full), live
+
+
+def _day_condition(column, days):
+    first_day, end_day = days
+    condition = column < end_day
+    if first_day is not None:
+        condition = and_(column >= first_day, condition)
+    return condition
+
+
+def _live_condition(column, live):
+    ranges = []
+    for live_start, live_end in live:
+        condition = column < live_end
+        if live_start is not None:
+            condition = and_(column >= live_start, condition)
+        ranges.append(condition)
+    return or_(*ranges) if ranges else None
+
+
+def _sum_if(condition, value):
+    if condition is None:
+        return literal(0)
+    return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+
+def window_metrics_query(windows, customers=False):
+    """
+    The single SELECT behind window_metrics: one row of rollup_*, live_*
+    and (with customers=True) customers_* columns.
+
+    Every window becomes a SUM(CASE ...) column over the rollups plus one
+    over the live tail, so adding a window adds columns, not queries.
+    Invoices are only read inside the live tails, through the paid_at
+    index.
+    """
+    split = {name: split_window(start, end) for name, (start, end) in windows.items()}
+
+    rollup_columns = []
+    invoice_columns = []
+    user_columns = []
+    live_ranges = []
+    for name, (days, live) in split.items():
+        live_ranges += live
+        in_days = _day_condition(KpiDailyRollup.day, days) if days else None
+        paid_live = _live_condition(Invoice.paid_at, live)
+        rollup_columns += [
+            _sum_if(in_days, KpiDailyRollup.revenue).label(f"rollup_{name}_revenue"),
+            _sum_if(in_days, KpiDailyRollup.orders).label(f"rollup_{name}_orders"),
+        ]
+        invoice_columns += [
+            _sum_if(paid_live, Invoice.total_amount).label(f"live_{name}_revenue"),
+            _sum_if(paid_live, 1).label(f"live_{name}_orders"),
+        ]
+        if customers:
+            rollup_columns.append(_sum_if(in_days, KpiDailyRollup.new_customers).label(f"rollup_{name}_customers"))
+            user_columns.append(_sum_if(_live_condition(User.created_at, live), 1).label(f"live_{name}_customers"))
+
+    in_live_tail = _live_condition(Invoice.paid_at, live_ranges)
+    sources = [
+        select(*rollup_columns).subquery(),
+        select(*invoice_columns)
+        .where(Invoice.payment_status == "paid", in_live_tail if in_live_tail is not None else false())
+        .subquery(),
+    ]
+    if customers:
+        user_columns += [
+            func.count(User.id).label("customers_total"),
+            _sum_if(User.status == "active", 1).label("customers_active"),
+        ]
+        sources.append(select(*user_columns).where(User.role == "customer").subquery())
+
+    # Each source aggregates to exactly one row, so the cross join is one row.
+    return select(*sources)
+
+
+def window_metrics(windows, customers=False):
+    """
+    Paid revenue, orders and (with customers=True) new customers for several
+    [start, end) windows in one round trip. windows maps a name to
+    (start, end); start=None means all time.
+
+    Returns ({name: {"revenue", "orders"[, "new_customers"]}}, customer
+    totals) where the totals are {"total", "active"} or None.
+    """
+    row = db.session.execute(window_metrics_query(windows, customers)).one()._mapping
+
+    result = {}
+    for name in windows:
+        metrics = {
+            "revenue": float(row[f"rollup_{name}_revenue"] or 0) + float(row[f"live_{name}_revenue"] or 0),
+            "orders": int(row[f"rollup_{name}_orders"] or 0) + int(row[f"live_{name}_orders"] or 0),
+        }
+        if customers:
+            metrics["new_customers"] = int(row[f"rollup_{name}_customers"] or 0) + int(
+                row[f"live_{name}_customers"] or 0
+            )
+        result[name] = metrics
+
+    totals = None
+    if customers:
+        totals = {"total": int(row["customers_total"] or 0), "active": int(row["customers_active"] or 0)}
+    return result, totals
+
+
+def _paid_invoices_between(query, live_start, live_end):
+    query = query.filter(Invoice.payment_status == "paid", Invoice.paid_at < live_end)
+    if live_start is not None:
+        query = query.filter(Invoice.paid_at >= live_start)
+    return query
+
+
+def revenue_and_orders(start, end):
+    """Paid revenue and order count for [start, end). start=None means all time."""
+    metrics, _ = window_metrics({"window": (start, end)})
+    return metrics["window"]["revenue"], metrics["window"]["orders"]
+
+
+def new_customers(start, end):
+    """Customers registered in [start, end). start=None means all time."""
+    metrics, _ = window_metrics({"window": (start, end)}, customers=True)
+    return metrics["window"]["new_customers"]
+
+
+def daily_rollups(first_day, now):
+    """
+    Map each day from first_day to today to its revenue, orders and new
+    customers. Past days come from rollups, today is scanned live.
+    """
+    today = now.date()
+    result = {}
+
+    rows = (
+        KpiDailyRollup.query
+        .filter(KpiDailyRollup.day >= first_day, KpiDailyRollup.day < today)
+        .all()
+    )
+    for row in rows:
+        result[row.day] = {
+            "revenue": float(row.revenue or 0),
+            "orders": int(row.orders or 0),
+            "new_customers": int(row.new_customers or 0),
+        }
+
+    if today >= first_day:
+        metrics, _ = window_metrics({"today": (_day_start(today), now)}, customers=True)
+        result[today] = metrics["today"]
+
+    return result
+
+
+def category_revenue(now):
+    """All-time paid revenue per category: rollups before today plus a live scan of today."""
+    today_start = _day_start(now.date())
+    totals = {}
+
+    rollup_rows = (
+        db.session.query(KpiDailyCategoryRevenue.category, func.sum(KpiDailyCategoryRevenue.revenue))
+        .filter(KpiDailyCategoryRevenue.day < now.date())
+        .group_by(KpiDailyCategoryRevenue.category)
+        .all()
+    )
+    for category, revenue in rollup_rows:
+        totals[category] = totals.get(category, 0.0) + float(revenue or 0)
+
+    live_rows = _paid_invoices_between(
+        db.session.query(Product.category, func.sum(InvoiceItem.quantity * InvoiceItem.unit_price))
+        .select_from(Invoice)
+        .join(InvoiceItem, InvoiceItem.invoice_id == Invoice.id)
+        .join(Product, Product.id == InvoiceItem.product_id),
+        today_start,
+        now,
+    ).group_by(Product.category).all()
+    for category, revenue in live_rows:
+        key = (category or "Other")[:100]
+        totals[key] = totals.get(key, 0.0) + float(revenue or 0)
+
+    return totals
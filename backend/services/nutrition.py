@@ -0,0 +1,53 @@
+import json
+
+
+# Typed Product column -> OpenFoodFacts nutriments key (per 100g).
+NUTRITION_COLUMNS = {
+    "energy_kcal_100g": "energy-kcal_100g",
+    "sugars_100g": "sugars_100g",
+    "fat_100g": "fat_100g",
+    "salt_100g": "salt_100g",
+    "proteins_100g": "proteins_100g",
+}
+
+
+def parse_nutritional_info(value):
+    """
+    Parse the nutritional_info text into a dict.
+    Older imports stored str(dict) instead of JSON, so fall back to swapping
+    quotes the way the KPI code always has.
+    """
+    if not value:
+        return None
+    if isinstance(value, dict):
+        return value
+
+    for candidate in (value, str(value).replace("'", '"')):
+        try:
+            parsed = json.loads(candidate)
+        except (TypeError, ValueError):
+            continue
+        return parsed if isinstance(parsed, dict) else None
+    return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def nutrition_columns(nutriments):
+    """
+    Map a nutriments dict (or nutritional_info text) to the typed columns.
+    Missing or non-numeric values become None.
+    """
+    parsed = parse_nutritional_info(nutriments) or {}
+    return {column: _to_float(parsed.get(key)) for column, key in NUTRITION_COLUMNS.items()}
+
+
+def apply_nutrition_columns(product):
+    """Refresh a product's typed nutrition columns from its nutritional_info."""
+    for column, value in nutrition_columns(product.nutritional_info).items():
+        setattr(product, column, value)
@@ -0,0 +1,144 @@
+import csv
+import gzip
+import json
+import os
+
+
+JSONL_EXTENSIONS = (".jsonl", ".ndjson", ".json")
+CSV_EXTENSIONS = (".csv", ".tsv")
+
+# The official CSV export has fields far longer than csv's 128 KB default.
+csv.field_size_limit(2**31 - 1)
+
+
+class DumpFormatError(ValueError):
+    pass
+
+
+def dump_format(path):
+    """'jsonl' or 'csv' from the file name, ignoring a trailing .gz."""
+    name = path.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    if name.endswith(JSONL_EXTENSIONS):
+        return "jsonl"
+    if name.endswith(CSV_EXTENSIONS):
+        return "csv"
+    raise DumpFormatError(
+        f"Unsupported dump file {os.path.basename(path)!r}: expected .jsonl, .ndjson, .json, .csv or .tsv (optionally .gz)"
+    )
+
+
+def _open_text(path):
+    with open(path, "rb") as raw:
+        gzipped = raw.read(2) == b"\x1f\x8b"
+    if gzipped:
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace", newline="")
+    return open(path, "r", encoding="utf-8", errors="replace", newline="")
+
+
+def _float_or_text(value):
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def csv_row_to_product(row):
+    """
+    Reshape a row of the CSV export like an API product: *_tags columns
+    become lists and *_100g columns are gathered into nutriments.
+    """
+    product = {}
+    nutriments = {}
+    for key, value in row.items():
+        if not key or value is None or value == "":
+            continue
+        if key.endswith("_100g"):
+            nutriments[key] = _float_or_text(value)
+        elif key.endswith("_tags"):
+            product[key] = [tag.strip() for tag in value.split(",") if tag.strip()]
+        else:
+            product[key] = value
+    if nutriments:
+        product["nutriments"] = nutriments
+    return product
+
+
+def _records(stream, fmt, start=0):
+    """
+    Yield (position, product dict or None when unreadable) per record,
+    skipping the first `start` records without decoding them.
+    """
+    if fmt == "jsonl":
+        position = 0
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            position += 1
+            if position <= start:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield position, record if isinstance(record, dict) else None
+        return
+
+    header = stream.readline()
+    if not header:
+        return
+    # The official export is tab-separated and unquoted; hand-made files
+    # are usually comma-separated.
+    if "\t" in header:
+        options = {"delimiter": "\t", "quoting": csv.QUOTE_NONE}
+    else:
+        options = {"delimiter": ","}
+    fields = next(csv.reader([header], **options))
+    for position, row in enumerate(csv.DictReader(stream, fieldnames=fields, **options), start=1):
+        if position > start:
+            yield position, csv_row_to_product(row)
+
+
+def _tag(value):
+    value = str(value).strip().lower().replace(" ", "-")
+    return value if ":" in value else f"en:{value}"
+
+
+def _matches(product, wanted, tags_key, text_key):
+    if not wanted:
+        return True
+    tags = product.get(tags_key)
+    if isinstance(tags, str):
+        tags = [tag.strip() for tag in tags.split(",")]
+    if tags:
+        tags = {str(tag).lower() for tag in tags}
+        return any(tag in tags for tag in wanted)
+    text = str(product.get(text_key) or "").lower().replace(" ", "-")
+    return any(tag.split(":", 1)[1] in text for tag in wanted)
+
+
+def iter_dump_products(path, countries=None, categories=None, start=0):
+    """
+    Stream an OpenFoodFacts dump (JSONL or CSV export, optionally gzipped)
+    with constant memory. Yields (position, product or None) for records
+    sold in one of `countries` and filed under one of `categories` (names
+    like "france" or tags like "en:france"; empty means any). position is
+    the 1-based record number, so start=position resumes after it; None
+    marks an unreadable record.
+    """
+    fmt = dump_format(path)
+    wanted_countries = {_tag(country) for country in countries or ()}
+    wanted_categories = {_tag(category) for category in categories or ()}
+
+    with _open_text(path) as stream:
+        for position, product in _records(stream, fmt, start):
+            if product is None:
+                yield position, None
+                continue
+            if not _matches(product, wanted_countries, "countries_tags", "countries"):
+                continue
+            if not _matches(product, wanted_categories, "categories_tags", "categories"):
+                continue
+            yield position, product
@@ -1,5 +1,15 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
 import requests
 
+from services.http_cache import response_cache
+from services.http_client import http_client
+
 BASE_V2_URL = "https://world.openfoodfacts.org/api/v2/product"
 SEARCH_URL = "https://world.openfoodfacts.org/cgi/search.pl"
 REQUEST_HEADERS = {
@@ -29,27 +39,79 @@ DEFAULT_SEARCH_FIELDS = [
 ]
 
 
-def _request_json(url: str, *, params=None, retries: int = 3, timeout=(5, 20)):
-    last_error = None
-    for _ in range(max(1, retries)):
-        try:
-            response = requests.get(url, headers=REQUEST_HEADERS, params=params, timeout=timeout)
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as exc:
-            last_error = exc
+class HostRateLimiter:
+    """
+    Spaces requests to one host at least 60 / per_minute seconds apart,
+    across all threads. per_minute=None or 0 disables the limit.
+    """
+
+    def __init__(self, per_minute=None):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_host_limiters = {}
+_host_limiters_lock = threading.Lock()
+
+
+def host_rate_limiter(url: str, per_minute=None):
+    """The shared limiter for url's host, so parallel imports share one budget."""
+    host = urlsplit(url).netloc
+    with _host_limiters_lock:
+        limiter = _host_limiters.get(host)
+        if limiter is None or limiter.interval != (60.0 / per_minute if per_minute else 0.0):
+            limiter = _host_limiters[host] = HostRateLimiter(per_minute)
+        return limiter
+
+
+def _request_json(url: str, *, params=None, timeout=(5, 20), limiter=None):
+    """
+    GET url and decode its JSON body, through the on-disk response cache:
+    fresh entries are served without a request, stale ones are revalidated
+    with a conditional GET, and in offline mode a miss raises
+    requests.ConnectionError instead of reaching the network.
+    """
+    cached = response_cache.get(url, params)
+    if cached is not None and (cached.fresh or response_cache.offline):
+        return cached.json()
+    if response_cache.offline:
+        raise requests.ConnectionError(f"Offline and not in the response cache: {url}")
+
+    headers = {**REQUEST_HEADERS, **(cached.validators() if cached is not None else {})}
+    if limiter is not None:
+        limiter.wait()
+    # Connection errors, 429 and 5xx answers are retried with backoff by the
+    # shared client.
+    response = http_client.get(url, headers=headers, params=params, timeout=timeout)
+    if response.status_code == 304 and cached is not None:
+        response_cache.revalidated(cached, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return cached.json()
+    response.raise_for_status()
+    payload = response.json()
 
-    if last_error:
-        raise last_error
-    return {}
+    response_cache.store(
+        url, params, response.content, response.headers.get("ETag"), response.headers.get("Last-Modified")
+    )
+    return payload
 
 
-def fetch_product_by_barcode(barcode: str):
+def fetch_product_by_barcode(barcode: str, limiter=None):
     """
     Fetch a single product from OpenFoodFacts v2 API using barcode
     """
     url = f"{BASE_V2_URL}/{barcode}"
-    data = _request_json(url, retries=3, timeout=(3, 8))
+    data = _request_json(url, timeout=(3, 8), limiter=limiter)
 
     # OpenFoodFacts returns status = 1 when product exists
     if data.get("status") != 1:
@@ -58,6 +120,42 @@ def fetch_product_by_barcode(barcode: str):
     return data.get("product")
 
 
+def fetch_products_by_barcodes(barcodes, workers: int = 8, per_minute=None):
+    """
+    Fetch many barcodes with up to `workers` requests in flight, rate
+    limited per host. Yields (barcode, product or None, RequestException or
+    None) in input order, so the caller can write each product to the
+    database while later ones are still downloading.
+
+    At most 2 * workers results are buffered. Closing the generator early
+    cancels the fetches that have not started yet.
+    """
+    limiter = host_rate_limiter(BASE_V2_URL, per_minute)
+
+    def fetch(barcode):
+        try:
+            return barcode, fetch_product_by_barcode(barcode, limiter=limiter), None
+        except requests.RequestException as exc:
+            return barcode, None, exc
+
+    if workers <= 1:
+        for barcode in barcodes:
+            yield fetch(barcode)
+        return
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="openfoodfacts")
+    pending = deque()
+    try:
+        for barcode in barcodes:
+            pending.append(pool.submit(fetch, barcode))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
 def fetch_products_page(page: int, page_size: int = 100, fields=None):
     """
     Fetch a page of products from OpenFoodFacts search API.
@@ -75,7 +173,7 @@ def fetch_products_page(page: int, page_size: int = 100, fields=None):
         "page_size": page_size,
         "fields": ",".join(selected_fields),
     }
-    payload = _request_json(SEARCH_URL, params=params, retries=3, timeout=(5, 20))
+    payload = _request_json(SEARCH_URL, params=params, timeout=(5, 20))
     products = payload.get("products") or []
     if not isinstance(products, list):
         products = []
@@ -86,3 +184,40 @@ def fetch_products_page(page: int, page_size: int = 100, fields=None):
         "page_size": page_size,
         "products": products,
     }
+
+
+def prefetch_products_pages(pages: int, page_size: int = 100, depth: int = 2, first_page: int = 1):
+    """
+    Yield (page, result, RequestException or None) for pages
+    first_page..pages in order, while a background thread fetches up to `depth` pages ahead, so
+    the caller's database work overlaps with the next downloads.
+
+    Closing the generator early stops the prefetching.
+    """
+    fetched = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def produce():
+        for page in range(first_page, pages + 1):
+            if stop.is_set():
+                return
+            try:
+                item = (page, fetch_products_page(page=page, page_size=page_size), None)
+            except Exception as exc:  # noqa: BLE001 - handed to the consumer
+                item = (page, None, exc)
+            while not stop.is_set():
+                try:
+                    fetched.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    threading.Thread(target=produce, name="openfoodfacts-pages", daemon=True).start()
+    try:
+        for _ in range(first_page, pages + 1):
+            page, result, error = fetched.get()
+            if error is not None and not isinstance(error, requests.RequestException):
+                raise error
+            yield page, result, error
+    finally:
+        stop.set()
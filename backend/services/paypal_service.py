@@ -1,9 +1,12 @@
+import hashlib
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from uuid import uuid4
 
-import requests
 from flask import current_app, has_request_context, request
 
+from services.http_client import http_client
+from services.token_cache import paypal_token_cache
+
 
 MOCK_ORDERS = {}
 
@@ -51,16 +54,26 @@ def _parse_error_message(response):
     return "PayPal request failed"
 
 
-def get_paypal_access_token():
-    if _is_mock_mode():
-        return "mock-access-token"
-
+def _paypal_credentials():
     client_id = current_app.config.get("PAYPAL_CLIENT_ID") or ""
     client_secret = current_app.config.get("PAYPAL_CLIENT_SECRET") or ""
     if not client_id or not client_secret:
         raise RuntimeError("PayPal credentials are not configured")
+    return client_id, client_secret
+
+
+def _token_cache_key():
+    # One token per environment and app; the client id is hashed so it does
+    # not end up in a shared cache in clear.
+    client_id, _ = _paypal_credentials()
+    digest = hashlib.sha256(f"{_paypal_base_url()}|{client_id}".encode("utf-8")).hexdigest()
+    return f"paypal:token:{digest[:32]}"
 
-    response = requests.post(
+
+def _request_paypal_access_token():
+    """Ask PayPal for a new token. Returns (token, expires_in seconds)."""
+    client_id, client_secret = _paypal_credentials()
+    response = http_client.post(
         f"{_paypal_base_url()}/v1/oauth2/token",
         auth=(client_id, client_secret),
         data={"grant_type": "client_credentials"},
@@ -73,10 +86,45 @@ def get_paypal_access_token():
     if response.status_code >= 400:
         raise RuntimeError(_parse_error_message(response))
 
-    token = (response.json() or {}).get("access_token")
+    data = response.json() or {}
+    token = data.get("access_token")
     if not token:
         raise RuntimeError("PayPal token was not returned")
-    return token
+    # None lets the token cache fall back to a short default lifetime.
+    return token, int(data["expires_in"]) if data.get("expires_in") else None
+
+
+def get_paypal_access_token():
+    """
+    A valid PayPal access token, shared through paypal_token_cache: PayPal
+    tokens last hours, so create-order, capture and webhook verification
+    do not each pay for a round trip to /v1/oauth2/token.
+    """
+    if _is_mock_mode():
+        return "mock-access-token"
+
+    return paypal_token_cache.get(_token_cache_key(), _request_paypal_access_token)
+
+
+def _authorized_post(url, **kwargs):
+    """
+    POST to the PayPal API with the cached token. A 401 means PayPal no
+    longer accepts that token (it was revoked or rotated), and nothing was
+    processed, so the token is dropped and the call made once more.
+    """
+    for attempt in range(2):
+        access_token = get_paypal_access_token()
+        response = http_client.post(
+            url,
+            headers={
+                "Authorization": f"Bearer {access_token}",
+                "Content-Type": "application/json",
+            },
+            **kwargs,
+        )
+        if response.status_code != 401 or attempt:
+            return response
+        paypal_token_cache.invalidate(_token_cache_key(), access_token)
 
 
 def _default_redirect_urls():
@@ -103,8 +151,6 @@ def create_paypal_order(amount, return_url=None, cancel_url=None):
             "amount_value": amount_value,
         }
 
-    access_token = get_paypal_access_token()
-
     if not return_url or not cancel_url:
         default_return, default_cancel = _default_redirect_urls()
         return_url = return_url or default_return
@@ -132,15 +178,7 @@ def create_paypal_order(amount, return_url=None, cancel_url=None):
             }
         },
     }
-    response = requests.post(
-        f"{_paypal_base_url()}/v2/checkout/orders",
-        json=payload,
-        headers={
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json",
-        },
-        timeout=20,
-    )
+    response = _authorized_post(f"{_paypal_base_url()}/v2/checkout/orders", json=payload, timeout=20)
     if response.status_code >= 400:
         raise RuntimeError(_parse_error_message(response))
 
@@ -193,15 +231,7 @@ def capture_paypal_order(order_id):
             ],
         }
 
-    access_token = get_paypal_access_token()
-    response = requests.post(
-        f"{_paypal_base_url()}/v2/checkout/orders/{order_id}/capture",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json",
-        },
-        timeout=20,
-    )
+    response = _authorized_post(f"{_paypal_base_url()}/v2/checkout/orders/{order_id}/capture", timeout=20)
     if response.status_code >= 400:
         raise RuntimeError(_parse_error_message(response))
     return response.json() or {}
@@ -244,7 +274,6 @@ def verify_paypal_webhook_signature(headers, webhook_event):
     if any(not value for value in required_values):
         raise RuntimeError("Missing PayPal webhook headers")
 
-    access_token = get_paypal_access_token()
     payload = {
         "auth_algo": auth_algo,
         "cert_url": cert_url,
@@ -254,14 +283,8 @@ def verify_paypal_webhook_signature(headers, webhook_event):
         "webhook_id": webhook_id,
         "webhook_event": webhook_event or {},
     }
-    response = requests.post(
-        f"{_paypal_base_url()}/v1/notifications/verify-webhook-signature",
-        json=payload,
-        headers={
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json",
-        },
-        timeout=20,
+    response = _authorized_post(
+        f"{_paypal_base_url()}/v1/notifications/verify-webhook-signature", json=payload, timeout=20
     )
     if response.status_code >= 400:
         raise RuntimeError(_parse_error_message(response))
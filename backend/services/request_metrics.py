@@ -0,0 +1,209 @@
+import json
+import logging
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+_SLOWEST_STATEMENT_CHARS = 200
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram, one series per endpoint."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, endpoint, value):
+        series = self._series.get(endpoint)
+        if series is None:
+            series = self._series[endpoint] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["buckets"][index] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for endpoint in sorted(self._series):
+            series = self._series[endpoint]
+            label = _escape_label(endpoint)
+            for bound, count in zip(self.buckets, series["buckets"]):
+                lines.append(f'{self.name}_bucket{{endpoint="{label}",le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{endpoint="{label}",le="+Inf"}} {series["count"]}')
+            lines.append(f'{self.name}_sum{{endpoint="{label}"}} {series["sum"]:.6f}')
+            lines.append(f'{self.name}_count{{endpoint="{label}"}} {series["count"]}')
+        return lines
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("request_metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("request_metrics_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+
+    if not has_request_context():
+        return
+    stats = g.get("sql_stats")
+    if stats is None:
+        return
+
+    stats["count"] += 1
+    stats["time"] += elapsed
+    if elapsed >= stats["slowest_time"]:
+        stats["slowest_time"] = elapsed
+        stats["slowest_statement"] = statement
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute; drop its start
+    # time so the pooled connection's stack does not grow with every error.
+    conn = context.connection
+    started = conn.info.get("request_metrics_started") if conn is not None else None
+    if started:
+        started.pop()
+
+
+def _configure_logger(level):
+    """
+    Make the per-request log line visible: the root logger stays at WARNING
+    unless the deployment configures logging, which would hide INFO.
+    """
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    # Let an existing root handler (e.g. one set up by the deployment) emit
+    # the records instead of printing them twice.
+    if not logger.handlers and not logging.getLogger().handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+
+
+class RequestMetrics:
+    """
+    Per-request SQL instrumentation.
+
+    Counts statements and DB time for every request through SQLAlchemy
+    cursor events, reports them in a Server-Timing header and one JSON log
+    line, and keeps per-endpoint histograms for the /metrics endpoint.
+    Histograms live in process memory, so each gunicorn worker reports its
+    own share.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._create_histograms()
+
+    def _create_histograms(self):
+        self.duration = Histogram(
+            "http_request_duration_seconds", "Request wall time by endpoint.", DURATION_BUCKETS
+        )
+        self.db_time = Histogram(
+            "db_time_seconds", "Time spent in SQL statements per request by endpoint.", DURATION_BUCKETS
+        )
+        self.db_queries = Histogram(
+            "db_queries_per_request", "SQL statements per request by endpoint.", QUERY_COUNT_BUCKETS
+        )
+
+    def init_app(self, app):
+        app.extensions["request_metrics"] = self
+        if not app.config.get("REQUEST_METRICS_ENABLED", True):
+            return
+
+        # Listening on the Engine class covers engines Flask-SQLAlchemy
+        # creates lazily; statements outside a request are ignored.
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+            event.listen(Engine, "handle_error", _handle_error)
+
+        log_level = app.config.get("REQUEST_METRICS_LOG_LEVEL", "INFO")
+        if log_level:
+            _configure_logger(log_level)
+
+        app.before_request(self._start_request)
+        app.after_request(self._add_server_timing)
+        # Recorded on teardown, which also runs for requests that failed
+        # with an unhandled exception and never reached after_request.
+        app.teardown_request(self._finish_request)
+
+    def _start_request(self):
+        g.request_started = time.perf_counter()
+        g.sql_stats = {"count": 0, "time": 0.0, "slowest_time": 0.0, "slowest_statement": None}
+
+    def _add_server_timing(self, response):
+        stats = g.get("sql_stats")
+        started = g.get("request_started")
+        if stats is None or started is None:
+            return response
+
+        g.response_status = response.status_code
+        # Streamed bodies run their queries after this point, so for those
+        # the header only covers the work done before the first byte.
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={stats["time"] * 1000:.2f};desc="{stats["count"]} queries", '
+            f"app;dur={(time.perf_counter() - started) * 1000:.2f}",
+        )
+        return response
+
+    def _finish_request(self, error=None):
+        stats = g.pop("sql_stats", None)
+        started = g.pop("request_started", None)
+        status = g.pop("response_status", None)
+        if stats is None or started is None:
+            return
+
+        duration = time.perf_counter() - started
+        endpoint = request.endpoint or "unmatched"
+        if error is not None or status is None:
+            status = 500
+
+        with self._lock:
+            self.duration.observe(endpoint, duration)
+            self.db_time.observe(endpoint, stats["time"])
+            self.db_queries.observe(endpoint, stats["count"])
+
+        slowest = stats["slowest_statement"]
+        logger.info(json.dumps({
+            "event": "request",
+            "method": request.method,
+            "path": request.path,
+            "endpoint": endpoint,
+            "status": status,
+            "duration_ms": round(duration * 1000, 2),
+            "db_queries": stats["count"],
+            "db_time_ms": round(stats["time"] * 1000, 2),
+            "slowest_query_ms": round(stats["slowest_time"] * 1000, 2),
+            "slowest_query": " ".join(slowest.split())[:_SLOWEST_STATEMENT_CHARS] if slowest else None,
+        }))
+
+    def render_prometheus(self):
+        with self._lock:
+            lines = self.duration.render() + self.db_time.render() + self.db_queries.render()
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._create_histograms()
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from extensions import db
+from models import Invoice, InvoiceItem, StockReservation
+from services.catalog_cache import catalog_cache
+from services.inventory import release_stock_many, reserve_stock_many
+
+
+DEFAULT_TTL_MINUTES = 30
+DEFAULT_SWEEP_BATCH_SIZE = 500
+
+# Invoices whose stock is still held and may therefore expire.
+OPEN_STATUSES = ("unpaid", "pending")
+
+
+def reservation_ttl():
+    return timedelta(minutes=current_app.config.get("STOCK_RESERVATION_TTL_MINUTES", DEFAULT_TTL_MINUTES))
+
+
+def hold_reservation(invoice, now=None):
+    """
+    Start or extend the reservation for invoice's stock. Call whenever the
+    cart changes or payment starts, inside the same transaction. A single
+    upsert, so concurrent edits of one invoice cannot both try to insert.
+    """
+    table = StockReservation.__table__
+    expires_at = (now or datetime.utcnow()) + reservation_ttl()
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        stmt = insert(table).values(invoice_id=invoice.id, expires_at=expires_at, created_at=datetime.utcnow())
+        db.session.execute(
+            stmt.on_conflict_do_update(index_elements=["invoice_id"], set_={"expires_at": stmt.excluded.expires_at})
+        )
+        return
+
+    result = db.session.execute(
+        table.update().where(table.c.invoice_id == invoice.id).values(expires_at=expires_at)
+    )
+    if result.rowcount == 0:
+        db.session.execute(
+            table.insert().values(invoice_id=invoice.id, expires_at=expires_at, created_at=datetime.utcnow())
+        )
+
+
+def clear_reservation(invoice):
+    """Drop the reservation once the stock is sold or given back."""
+    db.session.query(StockReservation).filter(StockReservation.invoice_id == invoice.id).delete(
+        synchronize_session=False
+    )
+
+
+def _invoice_quantities(invoice_ids):
+    rows = (
+        db.session.query(InvoiceItem.product_id, func.sum(InvoiceItem.quantity))
+        .filter(InvoiceItem.invoice_id.in_(invoice_ids))
+        .group_by(InvoiceItem.product_id)
+        .all()
+    )
+    return {product_id: int(quantity) for product_id, quantity in rows}
+
+
+def reclaim_expired_invoice(invoice):
+    """
+    Try to take the stock of an expired invoice again, e.g. when its buyer
+    comes back to pay. On success the invoice is reopened and the product
+    ids are returned so the caller can drop them from the catalog cache
+    after committing; otherwise the session is rolled back and None is
+    returned.
+    """
+    quantities = _invoice_quantities([invoice.id])
+    if reserve_stock_many(quantities) is None:
+        db.session.rollback()
+        return None
+    invoice.payment_status = "unpaid"
+    hold_reservation(invoice)
+    return list(quantities)
+
+
+def _expire_open_invoices(invoice_ids):
+    """
+    Mark the still-open invoices among invoice_ids "expired" and return the
+    ids that were. The invoice rows are locked before any stock moves, in
+    the same order capture and the webhook take them, so a payment that
+    commits first wins and its invoice is simply skipped here.
+    """
+    statement = (
+        update(Invoice)
+        .where(Invoice.id.in_(invoice_ids), Invoice.payment_status.in_(OPEN_STATUSES))
+        .values(payment_status="expired")
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.get_bind().dialect.update_returning:
+        return [invoice_id for (invoice_id,) in db.session.execute(statement.returning(Invoice.id))]
+
+    open_ids = [
+        invoice_id
+        for (invoice_id,) in db.session.execute(
+            select(Invoice.id)
+            .where(Invoice.id.in_(invoice_ids), Invoice.payment_status.in_(OPEN_STATUSES))
+            .with_for_update()
+        )
+    ]
+    if open_ids:
+        db.session.execute(statement.where(Invoice.id.in_(open_ids)))
+    return open_ids
+
+
+def release_expired_reservations(now=None, batch_size=DEFAULT_SWEEP_BATCH_SIZE):
+    """
+    Release stock held by expired reservations, one batch per transaction.
+
+    Each batch is picked through the expires_at index and only touches the
+    expired invoices and their items, so a sweep costs in proportion to what
+    has expired, not to the number of invoices. Invoices are marked
+    "expired" first and stock is only released for the ones that were
+    still open, so a payment racing the sweep never loses its stock.
+    Returns {"invoices": n, "units": n}.
+    """
+    now = now or datetime.utcnow()
+    released_invoices = 0
+    released_units = 0
+
+    while True:
+        invoice_ids = [
+            invoice_id
+            for (invoice_id,) in db.session.execute(
+                select(StockReservation.invoice_id)
+                .where(StockReservation.expires_at <= now)
+                .order_by(StockReservation.expires_at)
+                .limit(batch_size)
+            )
+        ]
+        if not invoice_ids:
+            break
+
+        # Only invoices still open hold stock; anything else just loses its
+        # stale reservation.
+        expired_ids = _expire_open_invoices(invoice_ids)
+        quantities = _invoice_quantities(expired_ids) if expired_ids else {}
+        release_stock_many(quantities)
+        db.session.query(StockReservation).filter(StockReservation.invoice_id.in_(invoice_ids)).delete(
+            synchronize_session=False
+        )
+        db.session.commit()
+        catalog_cache.forget(*quantities)
+
+        released_invoices += len(expired_ids)
+        released_units += sum(quantities.values())
+        if len(invoice_ids) < batch_size:
+            break
+
+    return {"invoices": released_invoices, "units": released_units}
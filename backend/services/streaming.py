@@ -0,0 +1,62 @@
+from flask import Response, current_app, request, stream_with_context
+
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 500
+_FLUSH_BYTES = 64 * 1024
+
+
+def requested_stream_format():
+    """
+    Return "ndjson", "json" or None depending on what the client asked for.
+    NDJSON is chosen with ?format=ndjson or Accept: application/x-ndjson,
+    a streamed JSON array with ?stream=true.
+    """
+    fmt = (request.args.get("format") or "").strip().lower()
+    if fmt == "ndjson" or request.accept_mimetypes.best == NDJSON_MIMETYPE:
+        return "ndjson"
+    if str(request.args.get("stream") or "").strip().lower() in ("1", "true", "yes"):
+        return "json"
+    return None
+
+
+def stream_json_rows(rows, serialize, fmt="json"):
+    """
+    Stream rows as a JSON array (or one object per line for NDJSON) without
+    building the whole body in memory. rows should be a lazily iterated
+    query, e.g. query.yield_per(STREAM_BATCH_SIZE).
+    """
+    dumps = current_app.json.dumps
+    ndjson = fmt == "ndjson"
+
+    def generate():
+        buffer = []
+        size = 0
+        if not ndjson:
+            buffer.append("[")
+
+        first = True
+        for row in rows:
+            chunk = dumps(serialize(row))
+            if ndjson:
+                chunk += "\n"
+            elif not first:
+                chunk = "," + chunk
+            first = False
+
+            buffer.append(chunk)
+            size += len(chunk)
+            # Flush in ~64KB chunks: one write per row is too chatty for the
+            # WSGI server, one write per body defeats the point.
+            if size >= _FLUSH_BYTES:
+                yield "".join(buffer)
+                buffer = []
+                size = 0
+
+        if not ndjson:
+            buffer.append("]")
+        if buffer:
+            yield "".join(buffer)
+
+    mimetype = NDJSON_MIMETYPE if ndjson else "application/json"
+    return Response(stream_with_context(generate()), mimetype=mimetype)
@@ -0,0 +1,215 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+from werkzeug.utils import import_string
+
+try:
+    import fcntl
+except ImportError:  # Windows: the file backend falls back to a per-process lock.
+    fcntl = None
+
+
+DEFAULT_REFRESH_MARGIN_SECONDS = 300
+# Assumed when the token response leaves out expires_in.
+DEFAULT_TOKEN_LIFETIME_SECONDS = 300
+
+
+class LocalTokenBackend:
+    """
+    In-process store used when no shared backend is configured. Every
+    gunicorn worker then fetches and holds its own token.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class FileTokenBackend:
+    """
+    Tokens in one JSON file (mode 0600) shared by every process on the
+    host, e.g. the gunicorn workers of one container. lock() is an flock on
+    a sibling file, so only one worker at a time asks for a new token.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock_path = f"{path}.lock"
+        self._local_lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _write(self, data):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump(data, handle)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key):
+        return self._read().get(key)
+
+    def set(self, key, value):
+        with self._local_lock:
+            data = self._read()
+            data[key] = value
+            self._write(data)
+
+    def delete(self, key):
+        with self._local_lock:
+            data = self._read()
+            if data.pop(key, None) is not None:
+                self._write(data)
+
+    @contextlib.contextmanager
+    def lock(self, key, blocking=True):
+        """Hold the lock for the block; yields False when not blocking and it is taken."""
+        if fcntl is None:
+            yield True
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self._lock_path)), exist_ok=True)
+        with open(self._lock_path, "a") as handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+class AccessTokenCache:
+    """
+    OAuth access tokens cached until refresh_margin seconds before their
+    expires_in runs out.
+
+    Refreshes are single-flight: one thread per process (and, with a
+    backend that has lock, one process per backend) calls fetch while
+    the others wait for its result. Inside the refresh margin the old
+    token is still valid, so only the caller that wins the refresh waits;
+    everyone else keeps using the old token, and so does the winner if the
+    refresh fails.
+
+    Backends need get/set/delete of JSON-compatible values; lock(key,
+    blocking), a context manager yielding whether it got the lock, is
+    optional. Configure one through
+    PAYPAL_TOKEN_CACHE_BACKEND (an import path) or PAYPAL_TOKEN_CACHE_PATH
+    (FileTokenBackend).
+    """
+
+    def __init__(self, backend=None, refresh_margin=DEFAULT_REFRESH_MARGIN_SECONDS):
+        self.backend = backend or LocalTokenBackend()
+        self.refresh_margin = refresh_margin
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def init_app(self, app):
+        backend = app.config.get("PAYPAL_TOKEN_CACHE_BACKEND")
+        if isinstance(backend, str):
+            backend = import_string(backend)()
+        if backend is None and app.config.get("PAYPAL_TOKEN_CACHE_PATH"):
+            backend = FileTokenBackend(app.config["PAYPAL_TOKEN_CACHE_PATH"])
+
+        self.backend = backend or LocalTokenBackend()
+        self.refresh_margin = app.config.get("PAYPAL_TOKEN_REFRESH_MARGIN_SECONDS", DEFAULT_REFRESH_MARGIN_SECONDS)
+        app.extensions["paypal_token_cache"] = self
+
+    def _local_lock(self, key):
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    @contextlib.contextmanager
+    def _shared_lock(self, key, blocking):
+        lock = getattr(self.backend, "lock", None)
+        if lock is None:
+            yield True
+        else:
+            with lock(key, blocking=blocking) as locked:
+                yield locked
+
+    def _usable(self, entry, now):
+        return bool(entry) and entry.get("expires_at", 0) > now
+
+    def _fresh(self, entry, now):
+        if not entry:
+            return False
+        return entry.get("refresh_at", entry.get("expires_at", 0) - self.refresh_margin) > now
+
+    def get(self, key, fetch):
+        """
+        Return a cached token for key, calling fetch() -> (token, expires_in)
+        when it is missing, expired or due for refresh. An expires_in of
+        None means the server did not say: the token is then kept for
+        DEFAULT_TOKEN_LIFETIME_SECONDS and fetched again once that is up.
+        """
+        entry = self.backend.get(key)
+        now = time.time()
+        if self._fresh(entry, now):
+            return entry["token"]
+
+        # Proactive refresh: only one caller does it, nobody waits.
+        proactive = self._usable(entry, now)
+        local_lock = self._local_lock(key)
+        if not local_lock.acquire(blocking=not proactive):
+            return entry["token"]
+
+        try:
+            with self._shared_lock(key, blocking=not proactive) as locked:
+                if not locked:
+                    return entry["token"]
+                # Whoever held the lock before us may have refreshed already.
+                entry = self.backend.get(key)
+                now = time.time()
+                if self._fresh(entry, now):
+                    return entry["token"]
+                try:
+                    token, expires_in = fetch()
+                except Exception:
+                    if self._usable(entry, time.time()):
+                        return entry["token"]
+                    raise
+                if expires_in is None:
+                    expires_at = refresh_at = now + DEFAULT_TOKEN_LIFETIME_SECONDS
+                else:
+                    expires_at = now + float(expires_in)
+                    refresh_at = expires_at - self.refresh_margin
+                self.backend.set(key, {"token": token, "expires_at": expires_at, "refresh_at": refresh_at})
+                return token
+        finally:
+            local_lock.release()
+
+    def invalidate(self, key, token):
+        """
+        Forget a token the server rejected, so the next get() fetches anew.
+        A newer token another worker already stored is left alone.
+        """
+        entry = self.backend.get(key)
+        if entry and entry.get("token") == token:
+            self.backend.delete(key)
+
+
+paypal_token_cache = AccessTokenCache()
@@ -1,8 +1,10 @@
 import os
 import sys
 import types
+from contextlib import contextmanager
 
 import pytest
+from sqlalchemy import event
 
 # Add backend to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -30,7 +32,7 @@ def app():
     app = create_app(
         {
             "TESTING": True,
-            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQLALCHEMY_DATABASE_URI": os.environ.get("TEST_DATABASE_URL", "sqlite:///:memory:"),
             "JWT_SECRET_KEY": "test-jwt-secret",
             "SECRET_KEY": "test-secret",
             "_SUPER_ADMIN_SEEDED": True,
@@ -49,3 +51,31 @@ def app():
 def client(app):
     with app.test_client() as client:
         yield client
+
+
+@pytest.fixture
+def count_queries(app):
+    """
+    Count SQL statements run inside a block:
+
+        with count_queries() as statements:
+            client.get("/invoices/1", headers=headers)
+        assert len(statements) <= 3
+    """
+    with app.app_context():
+        engine = db.engine
+
+    @contextmanager
+    def counter():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+    return counter
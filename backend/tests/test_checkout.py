@@ -0,0 +1,152 @@
+from extensions import db
+from models import Invoice, InvoiceItem, Product
+
+
+BASE_PASSWORD = "Password123"
+
+DELIVERY = {
+    "fullName": "Checkout Tester",
+    "email": "checkout.tester@example.com",
+    "phone": "+15553334444",
+    "address": "3 Checkout Street",
+    "city": "New York",
+    "state": "NY",
+    "zipCode": "10001",
+}
+
+
+def login(client, email):
+    client.post(
+        "/auth/register",
+        json={
+            "first_name": "Checkout",
+            "last_name": "Tester",
+            "email": email,
+            "password": BASE_PASSWORD,
+            "phone_number": "+15553334444",
+            "address": "3 Checkout Street",
+            "zip_code": "10001",
+            "city": "New York",
+            "country": "USA",
+        },
+    )
+    response = client.post("/auth/login", json={"email": email, "password": BASE_PASSWORD})
+    return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+
+def create_products(app, *rows):
+    ids = []
+    with app.app_context():
+        for index, (price, stock) in enumerate(rows):
+            product = Product(
+                name=f"Checkout Product {index}",
+                brand="Checkout Brand",
+                category="General",
+                unit="1 unit",
+                price=price,
+                quantity_in_stock=stock,
+            )
+            db.session.add(product)
+            db.session.flush()
+            ids.append(product.id)
+        db.session.commit()
+    return ids
+
+
+def test_checkout_creates_invoice_items_and_reserves_stock(client, app):
+    headers = login(client, "checkout.success@example.com")
+    bread_id, jam_id = create_products(app, (2.0, 5), (3.5, 2))
+
+    response = client.post(
+        "/checkout",
+        json={
+            "deliveryAddress": DELIVERY,
+            "paymentMethod": "paypal",
+            "items": [
+                {"product_id": jam_id, "quantity": 2},
+                {"product_id": bread_id, "quantity": 3},
+            ],
+        },
+        headers=headers,
+    )
+    body = response.get_json()
+
+    assert response.status_code == 201
+    assert body["total_amount"] == 13.0
+    assert body["payment_status"] == "unpaid"
+    assert [(line["product_id"], line["remaining_stock"]) for line in body["results"]] == [
+        (jam_id, 0),
+        (bread_id, 2),
+    ]
+
+    with app.app_context():
+        invoice = Invoice.query.get(body["invoice_id"])
+        assert float(invoice.total_amount) == 13.0
+        assert invoice.payment_method == "paypal"
+        assert invoice.delivery_full_name == "Checkout Tester"
+        assert sorted(item.quantity for item in invoice.invoice_items) == [2, 3]
+        assert Product.query.get(bread_id).quantity_in_stock == 2
+        assert Product.query.get(jam_id).quantity_in_stock == 0
+
+
+def test_checkout_rolls_back_everything_when_a_line_fails(client, app):
+    headers = login(client, "checkout.failure@example.com")
+    bread_id, jam_id = create_products(app, (2.0, 5), (3.5, 1))
+
+    response = client.post(
+        "/checkout",
+        json={
+            "deliveryAddress": DELIVERY,
+            "items": [
+                {"product_id": bread_id, "quantity": 1},
+                {"product_id": jam_id, "quantity": 2},
+            ],
+        },
+        headers=headers,
+    )
+    body = response.get_json()
+
+    assert response.status_code == 400
+    assert [line["status"] for line in body["results"]] == ["ok", "error"]
+    assert body["results"][1]["available_stock"] == 1
+
+    with app.app_context():
+        assert Invoice.query.count() == 0
+        assert InvoiceItem.query.count() == 0
+        assert Product.query.get(bread_id).quantity_in_stock == 5
+
+
+def test_checkout_validates_delivery_and_basket(client):
+    headers = login(client, "checkout.invalid@example.com")
+
+    response = client.post("/checkout", json={"deliveryAddress": {}, "items": []}, headers=headers)
+    errors = response.get_json()["errors"]
+
+    assert response.status_code == 400
+    assert errors["items"] == "items must be a non-empty list"
+    assert errors["address"] == "address is required"
+
+
+def test_checkout_requires_authentication(client):
+    assert client.post("/checkout", json={}).status_code == 401
+
+
+def test_checkout_locks_products_in_id_order(client, app, count_queries):
+    headers = login(client, "checkout.locks@example.com")
+    product_ids = create_products(app, *[(1.0, 5)] * 4)
+
+    with count_queries() as statements:
+        response = client.post(
+            "/checkout",
+            json={
+                "deliveryAddress": DELIVERY,
+                "items": [{"product_id": product_id, "quantity": 1} for product_id in reversed(product_ids)],
+            },
+            headers=headers,
+        )
+
+    assert response.status_code == 201
+    product_reads = [statement for statement in statements if statement.startswith("SELECT products.")]
+    assert len(product_reads) == 1
+    assert product_reads[0].rstrip().endswith("ORDER BY products.id")
+    assert len([statement for statement in statements if statement.startswith("UPDATE products")]) == 1
@@ -0,0 +1,93 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from services.http_client import HttpClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def _answer(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.command, self.client_address[1]))
+            status = server.statuses.pop(0) if server.statuses else 200
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        body = b'{"ok": true}'
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _answer
+    do_POST = _answer
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.statuses = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(**settings):
+    client = HttpClient()
+    client.configure(**{"retries": 2, "backoff": 0, **settings})
+    return client
+
+
+def test_requests_reuse_one_kept_alive_connection(stub_server):
+    client = make_client()
+    url = f"http://127.0.0.1:{stub_server.server_port}/ping"
+
+    for _ in range(5):
+        assert client.get(url).json() == {"ok": True}
+    client.post(url, json={"x": 1})
+
+    client_ports = {port for _, port in stub_server.requests}
+    assert len(stub_server.requests) == 6
+    assert len(client_ports) == 1
+
+
+def test_get_is_retried_on_server_errors(stub_server):
+    client = make_client()
+    stub_server.statuses.extend([503, 502])
+
+    response = client.get(f"http://127.0.0.1:{stub_server.server_port}/flaky")
+
+    assert response.status_code == 200
+    assert [method for method, _ in stub_server.requests] == ["GET"] * 3
+
+
+def test_post_is_not_replayed_after_the_server_saw_it(stub_server):
+    client = make_client()
+    stub_server.statuses.append(503)
+
+    response = client.post(f"http://127.0.0.1:{stub_server.server_port}/capture", json={})
+
+    assert response.status_code == 503
+    assert len(stub_server.requests) == 1
+
+
+def test_reconfiguring_replaces_the_session():
+    client = make_client()
+    first = client.session
+    client.configure(retries=2, backoff=0)
+    assert client.session is first
+
+    client.configure(pool_maxsize=4, retries=2, backoff=0)
+    assert client.session is not first
+    assert client.timeout == (5, 20)
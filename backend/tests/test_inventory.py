@@ -0,0 +1,154 @@
+import threading
+
+import pytest
+
+from app import create_app
+from extensions import db
+from models import InvoiceItem, Product, User
+from services.inventory import release_stock_many, reserve_stock, reserve_stock_many
+
+
+BASE_PASSWORD = "Password123"
+
+
+def create_products(app, *stocks):
+    with app.app_context():
+        products = [
+            Product(
+                name=f"Stock Product {index}",
+                brand="Stock Brand",
+                category="General",
+                unit="1 unit",
+                price=1.0,
+                quantity_in_stock=stock,
+            )
+            for index, stock in enumerate(stocks)
+        ]
+        db.session.add_all(products)
+        db.session.commit()
+        return [product.id for product in products]
+
+
+def stock_of(product_id):
+    return db.session.get(Product, product_id).quantity_in_stock
+
+
+def test_reserve_stock_is_conditional(app):
+    (product_id,) = create_products(app, 3)
+
+    with app.app_context():
+        assert reserve_stock(product_id, 2) == 1
+        assert reserve_stock(product_id, 2) is None
+        assert reserve_stock(product_id, 1) == 0
+        db.session.commit()
+        assert stock_of(product_id) == 0
+
+
+def test_reserve_stock_many_is_all_or_nothing(app):
+    first_id, second_id = create_products(app, 5, 1)
+
+    with app.app_context():
+        assert reserve_stock_many({first_id: 2, second_id: 2}) is None
+        db.session.commit()
+        assert (stock_of(first_id), stock_of(second_id)) == (5, 1)
+
+        assert reserve_stock_many({first_id: 2, second_id: 1}) == {first_id: 3, second_id: 0}
+        release_stock_many({first_id: 1, second_id: 4})
+        db.session.commit()
+        assert (stock_of(first_id), stock_of(second_id)) == (4, 4)
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    # A file database shared by several connections, standing in for
+    # PostgreSQL with concurrent gunicorn workers.
+    app = create_app(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'stock.db'}",
+            "SQLALCHEMY_ENGINE_OPTIONS": {"connect_args": {"timeout": 30, "check_same_thread": False}},
+            "JWT_SECRET_KEY": "test-jwt-secret",
+            "SECRET_KEY": "test-secret",
+            "_SUPER_ADMIN_SEEDED": True,
+        }
+    )
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+
+
+def test_concurrent_add_to_cart_never_oversells(file_app):
+    stock = 25
+    workers = 16
+    requests_per_worker = 5
+    (product_id,) = create_products(file_app, stock)
+
+    client = file_app.test_client()
+    sessions = []
+    for worker in range(workers):
+        email = f"stock.worker{worker}@example.com"
+        client.post(
+            "/auth/register",
+            json={
+                "first_name": "Stock",
+                "last_name": "Worker",
+                "email": email,
+                "password": BASE_PASSWORD,
+                "phone_number": "+15550001111",
+                "address": "1 Stock Street",
+                "zip_code": "10001",
+                "city": "New York",
+                "country": "USA",
+            },
+        )
+        token = client.post("/auth/login", json={"email": email, "password": BASE_PASSWORD}).get_json()[
+            "access_token"
+        ]
+        headers = {"Authorization": f"Bearer {token}"}
+        invoice = client.post(
+            "/invoices/",
+            json={
+                "deliveryAddress": {
+                    "fullName": "Stock Worker",
+                    "address": "1 Stock Street",
+                    "city": "New York",
+                    "zipCode": "10001",
+                }
+            },
+            headers=headers,
+        ).get_json()
+        sessions.append((headers, invoice["invoice_id"]))
+
+    start = threading.Barrier(workers)
+    statuses = []
+    lock = threading.Lock()
+
+    def worker(headers, invoice_id):
+        worker_client = file_app.test_client()
+        start.wait()
+        for _ in range(requests_per_worker):
+            response = worker_client.post(
+                f"/invoices/{invoice_id}/items",
+                json={"product_id": product_id, "quantity": 1},
+                headers=headers,
+            )
+            with lock:
+                statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=worker, args=session) for session in sessions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(set(statuses)) == [201, 400]
+    assert statuses.count(201) == stock
+    with file_app.app_context():
+        assert stock_of(product_id) == 0
+        sold = db.session.query(db.func.sum(InvoiceItem.quantity)).filter_by(product_id=product_id).scalar()
+        assert sold == stock
+        assert User.query.count() == workers
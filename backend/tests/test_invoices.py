@@ -1,3 +1,5 @@
+import pytest
+
 from extensions import db
 from models import Invoice, InvoiceItem, Product
 
@@ -328,6 +330,32 @@ def test_get_my_invoices_returns_only_current_user_history(client):
     assert second_invoice_id in invoice_ids
 
 
+def test_get_my_invoices_streams_json_and_ndjson(client, app):
+    import json
+
+    email = "invoice.history.stream@example.com"
+    register_user(client, email)
+    token = login_and_get_token(client, email)
+
+    product_id = create_product(app, barcode="9000000000020")
+    invoice_id = create_invoice(client, token)
+    add_invoice_item(client, token, invoice_id, product_id, 2)
+    create_invoice(client, token)
+
+    buffered = client.get("/invoices/me", headers=auth_headers(token)).get_json()
+
+    streamed = client.get("/invoices/me?stream=true", headers=auth_headers(token))
+    assert streamed.is_streamed
+    assert streamed.mimetype == "application/json"
+    assert json.loads(streamed.get_data(as_text=True)) == buffered
+
+    ndjson = client.get("/invoices/me?format=ndjson", headers=auth_headers(token))
+    assert ndjson.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in ndjson.get_data(as_text=True).splitlines()]
+    assert lines == buffered
+    assert {item["invoice_id"]: item["item_count"] for item in lines}[invoice_id] == 1
+
+
 def test_update_invoice_item_increase_quantity_updates_total_and_stock(client, app):
     email = "invoice.patch.increase@example.com"
     register_user(client, email)
@@ -481,3 +509,108 @@ def test_delete_invoice_item_forbidden_for_other_user(client, app):
 
     assert response.status_code == 403
     assert body["message"] == "You are not allowed to modify this invoice"
+
+
+@pytest.mark.parametrize("update_returning", [True, False])
+def test_bulk_add_invoice_items_reserves_stock_in_one_transaction(client, app, monkeypatch, update_returning):
+    with app.app_context():
+        monkeypatch.setattr(db.engine.dialect, "update_returning", update_returning)
+    email = "invoice.bulk@example.com"
+    register_user(client, email)
+    token = login_and_get_token(client, email)
+
+    juice_id = create_product(app, barcode="9000000000011", price=2.5, quantity_in_stock=10)
+    milk_id = create_product(app, name="Milk", barcode="9000000000012", price=1.0, quantity_in_stock=4)
+    invoice_id = create_invoice(client, token)
+
+    response = client.post(
+        f"/invoices/{invoice_id}/items/bulk",
+        json={
+            "items": [
+                {"product_id": juice_id, "quantity": 2},
+                {"product_id": milk_id, "quantity": 4},
+                {"product_id": juice_id, "quantity": 1},
+            ]
+        },
+        headers=auth_headers(token),
+    )
+    body = response.get_json()
+
+    assert response.status_code == 201
+    assert body["new_total_amount"] == 11.5
+    assert [(line["index"], line["status"], line["quantity"]) for line in body["results"]] == [
+        (0, "ok", 2),
+        (1, "ok", 4),
+        (2, "ok", 1),
+    ]
+    assert [line["remaining_stock"] for line in body["results"]] == [7, 0, 7]
+    assert all(line["id"] for line in body["results"])
+
+    with app.app_context():
+        assert Product.query.get(juice_id).quantity_in_stock == 7
+        assert Product.query.get(milk_id).quantity_in_stock == 0
+        assert float(Invoice.query.get(invoice_id).total_amount) == 11.5
+        assert InvoiceItem.query.filter_by(invoice_id=invoice_id).count() == 3
+
+
+def test_bulk_add_invoice_items_is_all_or_nothing(client, app):
+    email = "invoice.bulk.fail@example.com"
+    register_user(client, email)
+    token = login_and_get_token(client, email)
+
+    juice_id = create_product(app, barcode="9000000000013", quantity_in_stock=3)
+    invoice_id = create_invoice(client, token)
+
+    response = client.post(
+        f"/invoices/{invoice_id}/items/bulk",
+        json={
+            "items": [
+                {"product_id": juice_id, "quantity": 2},
+                {"product_id": juice_id, "quantity": 2},
+                {"product_id": 999999, "quantity": 1},
+                {"product_id": juice_id, "quantity": 0},
+            ]
+        },
+        headers=auth_headers(token),
+    )
+    body = response.get_json()
+
+    assert response.status_code == 400
+    assert body["message"] == "No items were added"
+    assert [line["status"] for line in body["results"]] == ["ok", "error", "error", "error"]
+    assert body["results"][1]["errors"] == {"quantity": "Not enough stock"}
+    assert body["results"][1]["available_stock"] == 1
+    assert body["results"][2]["errors"] == {"product_id": "Product not found"}
+    assert body["results"][3]["errors"] == {"quantity": "quantity must be greater than 0"}
+
+    with app.app_context():
+        assert Product.query.get(juice_id).quantity_in_stock == 3
+        assert float(Invoice.query.get(invoice_id).total_amount) == 0.0
+        assert InvoiceItem.query.filter_by(invoice_id=invoice_id).count() == 0
+
+
+def test_bulk_add_invoice_items_validates_payload_and_owner(client, app):
+    owner_email = "invoice.bulk.owner@example.com"
+    other_email = "invoice.bulk.other@example.com"
+    register_user(client, owner_email)
+    register_user(client, other_email)
+    owner_token = login_and_get_token(client, owner_email)
+    other_token = login_and_get_token(client, other_email)
+
+    product_id = create_product(app, barcode="9000000000014")
+    invoice_id = create_invoice(client, owner_token)
+
+    response = client.post(
+        f"/invoices/{invoice_id}/items/bulk",
+        json={"items": []},
+        headers=auth_headers(owner_token),
+    )
+    assert response.status_code == 400
+    assert response.get_json()["errors"]["items"] == "items must be a non-empty list"
+
+    response = client.post(
+        f"/invoices/{invoice_id}/items/bulk",
+        json={"items": [{"product_id": product_id, "quantity": 1}]},
+        headers=auth_headers(other_token),
+    )
+    assert response.status_code == 403
@@ -0,0 +1,221 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db
+from models import Job, Product, User
+from services.jobs import claim_job, enqueue_job, job_handler, run_job, run_pending_jobs
+
+
+BASE_PASSWORD = "Password123"
+
+calls = []
+
+
+@job_handler("tests.echo")
+def _echo_job(value):
+    calls.append(value)
+    return {"echo": value}
+
+
+@job_handler("tests.always_fails")
+def _failing_job():
+    calls.append("fail")
+    raise RuntimeError("provider down")
+
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    calls.clear()
+
+
+def login(client, email):
+    client.post(
+        "/auth/register",
+        json={
+            "first_name": "Job",
+            "last_name": "Tester",
+            "email": email,
+            "password": BASE_PASSWORD,
+            "phone_number": "+15554443333",
+            "address": "4 Job Street",
+            "zip_code": "10001",
+            "city": "New York",
+            "country": "USA",
+        },
+    )
+    response = client.post("/auth/login", json={"email": email, "password": BASE_PASSWORD})
+    return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+
+def admin_headers(client, app, email="jobs.admin@example.com"):
+    login(client, email)
+    with app.app_context():
+        user = User.query.filter_by(email=email).first()
+        user.role = "admin"
+        db.session.commit()
+    response = client.post("/auth/login", json={"email": email, "password": BASE_PASSWORD})
+    return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+
+def test_worker_runs_queued_job_and_records_result(app):
+    with app.app_context():
+        job_id = enqueue_job("tests.echo", {"value": 7}).id
+        db.session.commit()
+
+        assert run_pending_jobs() == 1
+        job = db.session.get(Job, job_id)
+        assert job.status == "succeeded"
+        assert job.attempts == 1
+        assert job.finished_at is not None
+
+        # Nothing left to do.
+        assert run_pending_jobs() == 0
+
+    assert calls == [7]
+
+
+def test_failed_job_is_retried_with_backoff_then_marked_failed(app):
+    app.config["JOB_RETRY_BASE_SECONDS"] = 10
+    with app.app_context():
+        job_id = enqueue_job("tests.always_fails", max_attempts=3).id
+        db.session.commit()
+
+        delays = []
+        for _ in range(3):
+            before = datetime.utcnow()
+            job = claim_job("test-worker", now=datetime.utcnow() + timedelta(hours=1))
+            assert job is not None and job.id == job_id
+            run_job(job)
+            if job.status == "queued":
+                delays.append(round((job.run_at - before).total_seconds()))
+
+        job = db.session.get(Job, job_id)
+        assert job.status == "failed"
+        assert job.attempts == 3
+        assert "provider down" in job.last_error
+        assert delays == [10, 20]
+
+        # A retry is not due before its backoff has passed.
+        assert claim_job("test-worker") is None
+
+    assert calls == ["fail"] * 3
+
+
+def test_stale_running_job_is_picked_up_again(app):
+    with app.app_context():
+        job_id = enqueue_job("tests.echo", {"value": "again"}).id
+        db.session.commit()
+        assert claim_job("dead-worker").id == job_id
+
+        # Its worker died; nobody else may take it until the lock times out.
+        assert claim_job("other-worker") is None
+        later = datetime.utcnow() + timedelta(seconds=app.config["JOB_LOCK_TIMEOUT_SECONDS"] + 1)
+        job = claim_job("other-worker", now=later)
+
+        assert job.id == job_id
+        assert job.attempts == 2
+        assert job.locked_by == "other-worker"
+
+
+def test_sync_products_is_queued_and_status_is_visible_to_admin(client, app, monkeypatch):
+    headers = admin_headers(client, app)
+    monkeypatch.setattr("routes.recommendation_routes.sync_products_to_algolia", lambda: {"sent": 3})
+
+    response = client.post("/recommendations/sync-products", headers=headers)
+    body = response.get_json()
+
+    assert response.status_code == 202
+    assert body["job"]["status"] == "queued"
+
+    status = client.get(body["status_url"], headers=headers).get_json()
+    assert status["status"] == "queued"
+
+    with app.app_context():
+        run_pending_jobs()
+
+    status = client.get(body["status_url"], headers=headers).get_json()
+    assert status["status"] == "succeeded"
+    assert status["result"] == {"sent": 3}
+
+    other = login(client, "jobs.other@example.com")
+    assert client.get(body["status_url"], headers=other).status_code == 404
+
+
+def test_product_import_runs_in_the_worker(client, app, monkeypatch):
+    headers = admin_headers(client, app, "jobs.import@example.com")
+    pages = []
+
+    def fake_fetch_products_page(page, page_size):
+        pages.append(page)
+        if page > 1:
+            return {"products": []}
+        return {
+            "count": 1,
+            "products": [{"code": "1234567890123", "product_name": "Queued Oats", "brands": "Job Farm"}],
+        }
+
+    monkeypatch.setattr("services.openfoodfacts_service.fetch_products_page", fake_fetch_products_page)
+
+    response = client.post("/admin/products/import?pages=2&page_size=10", headers=headers)
+
+    assert response.status_code == 202
+    assert pages == []
+
+    with app.app_context():
+        run_pending_jobs()
+        assert Product.query.filter_by(barcode="1234567890123").count() == 1
+
+    status = client.get(response.get_json()["status_url"], headers=headers).get_json()
+    assert status["status"] == "succeeded"
+    assert status["result"]["imported"] == 1
+
+
+def test_failed_import_resumes_from_its_checkpoint(client, app, monkeypatch):
+    headers = admin_headers(client, app, "jobs.resume@example.com")
+    app.config["JOB_MAX_ATTEMPTS"] = 1
+    fetched = []
+    broken = {"page": 3}
+
+    def fake_fetch_products_page(page, page_size):
+        fetched.append(page)
+        if page == broken["page"]:
+            raise RuntimeError("worker killed")
+        if page > 4:
+            return {"products": []}
+        return {"products": [{"code": f"55500000000{page}{index}", "product_name": f"Resumed {page}-{index}",
+                              "brands": "Job Farm"} for index in range(2)]}
+
+    monkeypatch.setattr("services.openfoodfacts_service.fetch_products_page", fake_fetch_products_page)
+
+    response = client.post("/admin/products/import?pages=5&page_size=2", headers=headers)
+    job_id = response.get_json()["job"]["id"]
+    with app.app_context():
+        run_pending_jobs()
+
+    status = client.get(f"/jobs/{job_id}", headers=headers).get_json()
+    assert status["status"] == "failed"
+    assert status["checkpoint"]["page"] == 2
+    assert status["checkpoint"]["imported"] == 4
+
+    # Only failed jobs can be resumed, and only by their owner or an admin.
+    other = login(client, "jobs.resume.other@example.com")
+    assert client.post(f"/jobs/{job_id}/resume", headers=other).status_code == 404
+
+    broken["page"] = None
+    fetched.clear()
+    response = client.post(f"/jobs/{job_id}/resume", headers=headers)
+    assert response.status_code == 202
+    assert response.get_json()["job"]["status"] == "queued"
+
+    with app.app_context():
+        run_pending_jobs()
+        assert Product.query.filter(Product.barcode.like("555%")).count() == 8
+
+    status = client.get(f"/jobs/{job_id}", headers=headers).get_json()
+    assert status["status"] == "succeeded"
+    assert fetched[0] == 3
+    assert status["result"]["imported"] == 8
+    assert status["result"]["resumed_from"] == {"page": 2}
+
+    assert client.post(f"/jobs/{job_id}/resume", headers=headers).status_code == 409
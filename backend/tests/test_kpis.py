@@ -0,0 +1,423 @@
+import json
+from datetime import datetime, timedelta
+
+from extensions import db
+from models import Invoice, InvoiceItem, KpiDailyCategoryRevenue, KpiDailyRollup, Product, Promotion, User
+from services.kpi_service import get_average_calories_by_category, get_top_high_sugar_products
+from services.kpi_snapshots import (
+    rebuild_kpi_rollups,
+    record_invoice_paid,
+    record_invoice_reversed,
+    revenue_and_orders,
+    split_window,
+)
+from services.nutrition import apply_nutrition_columns
+
+
+BASE_PASSWORD = "Password123"
+
+
+def register_and_login(client, email):
+    client.post(
+        "/auth/register",
+        json={
+            "first_name": "Kpi",
+            "last_name": "Tester",
+            "email": email,
+            "password": BASE_PASSWORD,
+            "phone_number": "+15554443333",
+            "address": "4 Kpi Street",
+            "zip_code": "10001",
+            "city": "New York",
+            "country": "USA",
+        },
+    )
+    response = client.post("/auth/login", json={"email": email, "password": BASE_PASSWORD})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+
+def admin_headers(client, app, email="kpi.admin@example.com"):
+    register_and_login(client, email)
+    with app.app_context():
+        user = User.query.filter_by(email=email).first()
+        user.role = "admin"
+        db.session.commit()
+    response = client.post("/auth/login", json={"email": email, "password": BASE_PASSWORD})
+    return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+
+def create_nutrition_products(app, rows):
+    with app.app_context():
+        for index, (category, nutritional_info) in enumerate(rows):
+            product = Product(
+                name=f"Kpi Product {index}",
+                brand="Kpi Brand",
+                category=category,
+                unit="100g",
+                price=1.0,
+                quantity_in_stock=5,
+                nutritional_info=nutritional_info,
+            )
+            apply_nutrition_columns(product)
+            db.session.add(product)
+        db.session.commit()
+
+
+def python_average_calories_by_category():
+    """The original Python implementation, kept as the reference output."""
+    category_totals = {}
+    category_counts = {}
+
+    for product in Product.query.all():
+        if not product.nutritional_info:
+            continue
+        try:
+            nutriments = json.loads(product.nutritional_info.replace("'", '"'))
+            calories = nutriments.get("energy-kcal_100g", 0)
+        except Exception:
+            continue
+
+        category = product.category or "Unknown"
+        category_totals[category] = category_totals.get(category, 0) + calories
+        category_counts[category] = category_counts.get(category, 0) + 1
+
+    return {
+        category: round(category_totals[category] / category_counts[category], 2)
+        for category in category_totals
+    }
+
+
+NUTRITION_ROWS = [
+    ("Snacks", json.dumps({"energy-kcal_100g": 539, "sugars_100g": 56.3})),
+    ("Snacks", json.dumps({"energy-kcal_100g": 120.5})),
+    ("Snacks", json.dumps({"sugars_100g": 3})),
+    ("Dairy", "{'energy-kcal_100g': 64, 'fat_100g': 3.6}"),
+    ("Dairy", json.dumps({"energy-kcal_100g": 101})),
+    ("Beverages", json.dumps({"energy-kcal_100g": 0})),
+    ("Beverages", None),
+    ("Other", None),
+    ("Other", "energy: lots"),
+]
+
+
+def test_average_calories_by_category_matches_python_implementation(app):
+    create_nutrition_products(app, NUTRITION_ROWS)
+
+    with app.app_context():
+        expected = python_average_calories_by_category()
+        assert get_average_calories_by_category() == expected
+
+    assert expected == {"Snacks": 219.83, "Dairy": 82.5, "Beverages": 0.0}
+
+
+def test_average_calories_by_category_ignores_unparseable_nutrition(app):
+    create_nutrition_products(app, [
+        ("Snacks", json.dumps({"energy-kcal_100g": 200})),
+        ("Snacks", json.dumps({"sugars_100g": 3})),
+        ("Snacks", "energy: lots"),
+    ])
+
+    with app.app_context():
+        assert get_average_calories_by_category() == {"Snacks": 100.0}
+
+
+def test_average_calories_by_category_endpoint(client, app):
+    create_nutrition_products(app, NUTRITION_ROWS)
+    headers = register_and_login(client, "kpi.calories@example.com")
+
+    response = client.get("/kpis/average-calories-by-category", headers=headers)
+
+    assert response.status_code == 200
+    assert response.get_json()["Snacks"] == 219.83
+
+
+def python_top_high_sugar_products(limit):
+    """The original Python implementation, kept as the reference output."""
+    result = []
+    for product in Product.query.all():
+        if not product.nutritional_info:
+            continue
+        try:
+            nutriments = json.loads(product.nutritional_info.replace("'", '"'))
+            sugar = nutriments.get("sugars_100g", 0)
+        except Exception:
+            continue
+        result.append({
+            "id": product.id,
+            "name": product.name,
+            "brand": product.brand,
+            "category": product.category,
+            "sugars_100g": sugar,
+        })
+
+    result.sort(key=lambda x: x["sugars_100g"], reverse=True)
+    return result[:limit]
+
+
+def test_top_high_sugar_products_matches_python_implementation(app):
+    create_nutrition_products(app, NUTRITION_ROWS)
+
+    with app.app_context():
+        for limit in (1, 2, 3, 5, 10):
+            assert get_top_high_sugar_products(limit) == python_top_high_sugar_products(limit)
+        assert get_top_high_sugar_products(0) == []
+
+
+def test_top_high_sugar_products_endpoint(client, app):
+    create_nutrition_products(app, NUTRITION_ROWS)
+    headers = register_and_login(client, "kpi.sugar@example.com")
+
+    response = client.get("/kpis/top-high-sugar-products?limit=1", headers=headers)
+
+    assert response.status_code == 200
+    assert [item["sugars_100g"] for item in response.get_json()] == [56.3]
+
+
+def create_paid_invoice(app, paid_at, items, email="kpi.buyer@example.com"):
+    """Create a paid invoice for (category, quantity, unit_price) items and record it."""
+    with app.app_context():
+        user = User.query.filter_by(email=email).first()
+        invoice = Invoice(
+            user_id=user.id,
+            total_amount=sum(quantity * unit_price for _, quantity, unit_price in items),
+            payment_status="paid",
+            paid_at=paid_at,
+        )
+        db.session.add(invoice)
+        db.session.flush()
+        for index, (category, quantity, unit_price) in enumerate(items):
+            product = Product(
+                name=f"Rollup Product {invoice.id}-{index}",
+                brand="Kpi Brand",
+                category=category,
+                unit="1 unit",
+                price=unit_price,
+                quantity_in_stock=5,
+            )
+            db.session.add(product)
+            db.session.flush()
+            db.session.add(
+                InvoiceItem(invoice_id=invoice.id, product_id=product.id, quantity=quantity, unit_price=unit_price)
+            )
+        db.session.flush()
+        record_invoice_paid(invoice)
+        db.session.commit()
+        return invoice.id
+
+
+def rollup_snapshot():
+    return (
+        sorted((row.day, row.revenue, row.orders, row.new_customers) for row in KpiDailyRollup.query.all()),
+        sorted((row.day, row.category, row.revenue) for row in KpiDailyCategoryRevenue.query.all()),
+    )
+
+
+def test_split_window_reads_whole_days_from_rollups():
+    start = datetime(2026, 3, 1, 10, 30)
+    end = datetime(2026, 3, 8, 9, 0)
+
+    days, live = split_window(start, end)
+
+    assert days == (datetime(2026, 3, 2).date(), datetime(2026, 3, 8).date())
+    assert live == [(start, datetime(2026, 3, 2)), (datetime(2026, 3, 8), end)]
+
+
+def test_split_window_handles_midnight_edges_and_short_windows():
+    days, live = split_window(datetime(2026, 3, 1), datetime(2026, 3, 3))
+    assert days == (datetime(2026, 3, 1).date(), datetime(2026, 3, 3).date())
+    assert live == []
+
+    start = datetime(2026, 3, 1, 8)
+    end = datetime(2026, 3, 1, 20)
+    assert split_window(start, end) == (None, [(start, end)])
+
+    days, live = split_window(None, end)
+    assert days == (None, end.date())
+    assert live == [(datetime(2026, 3, 1), end)]
+
+
+def test_rollups_match_a_live_scan(client, app):
+    register_and_login(client, "kpi.buyer@example.com")
+    now = datetime.utcnow()
+    create_paid_invoice(app, now - timedelta(days=3), [("Snacks", 2, 1.5), ("Dairy", 1, 4.0)])
+    create_paid_invoice(app, now - timedelta(days=3, hours=2), [("Snacks", 1, 2.0)])
+    create_paid_invoice(app, now - timedelta(days=40), [("Dairy", 3, 1.0)])
+    create_paid_invoice(app, now, [("Snacks", 1, 10.0)])
+
+    with app.app_context():
+        live_revenue, live_orders = (
+            db.session.query(db.func.sum(Invoice.total_amount), db.func.count(Invoice.id))
+            .filter(Invoice.payment_status == "paid")
+            .one()
+        )
+        assert revenue_and_orders(None, datetime.utcnow()) == (float(live_revenue), live_orders)
+
+        week_start = now - timedelta(days=7)
+        assert revenue_and_orders(week_start, datetime.utcnow()) == (19.0, 3)
+
+        incremental = rollup_snapshot()
+        rebuild_kpi_rollups()
+        assert rollup_snapshot() == incremental
+
+
+def test_reversed_invoice_leaves_the_rollups(client, app):
+    register_and_login(client, "kpi.buyer@example.com")
+    invoice_id = create_paid_invoice(app, datetime.utcnow() - timedelta(days=2), [("Snacks", 1, 5.0)])
+
+    with app.app_context():
+        invoice = db.session.get(Invoice, invoice_id)
+        record_invoice_reversed(invoice)
+        invoice.payment_status = "failed"
+        db.session.commit()
+
+        assert revenue_and_orders(None, datetime.utcnow()) == (0.0, 0)
+        category = KpiDailyCategoryRevenue.query.filter_by(category="Snacks").one()
+        assert category.revenue == 0
+
+
+def test_revenue_and_customer_metrics_use_rollups(client, app):
+    headers = admin_headers(client, app)
+    register_and_login(client, "kpi.buyer@example.com")
+    create_paid_invoice(app, datetime.utcnow() - timedelta(days=2), [("Snacks", 2, 3.0)])
+    create_paid_invoice(app, datetime.utcnow(), [("Dairy", 1, 4.0)])
+
+    with app.app_context():
+        today = datetime.utcnow().date()
+        assert KpiDailyRollup.query.filter_by(day=today).one().new_customers == 2
+
+    revenue = client.get("/kpis/revenue-metrics?period=year", headers=headers).get_json()
+    assert revenue["totalRevenue"] == 10.0
+    assert revenue["periodRevenue"] == 10.0
+    assert revenue["averageOrderValue"] == 5.0
+
+    orders = client.get("/kpis/order-customer-metrics?period=year", headers=headers).get_json()
+    assert orders["totalOrders"] == 2
+    assert orders["periodCustomers"] == 1
+    assert orders["totalCustomers"] == 1
+
+
+def test_dashboard_charts_from_rollups(client, app):
+    headers = admin_headers(client, app)
+    register_and_login(client, "kpi.buyer@example.com")
+    create_paid_invoice(app, datetime.utcnow() - timedelta(days=1), [("Snacks", 2, 3.0), ("Dairy", 1, 1.0)])
+    create_paid_invoice(app, datetime.utcnow(), [("Dairy", 1, 4.0)])
+
+    response = client.get("/kpis/dashboard-charts", headers=headers)
+    body = response.get_json()
+
+    assert response.status_code == 200
+    assert [point["revenue"] for point in body["revenueChartData"]][-2:] == [7.0, 4.0]
+    assert body["categoryChartData"] == [
+        {"category": "Snacks", "revenue": 6.0},
+        {"category": "Dairy", "revenue": 5.0},
+    ]
+    assert body["customerGrowthData"][-1]["customers"] == 1
+
+
+def test_revenue_metrics_shape_and_single_query(client, app, count_queries):
+    headers = admin_headers(client, app)
+    register_and_login(client, "kpi.buyer@example.com")
+    create_paid_invoice(app, datetime.utcnow() - timedelta(days=10), [("Snacks", 1, 8.0)])
+    create_paid_invoice(app, datetime.utcnow() - timedelta(days=3), [("Snacks", 1, 4.0)])
+
+    with count_queries() as statements:
+        response = client.get("/kpis/revenue-metrics?period=week", headers=headers)
+
+    assert response.status_code == 200
+    # One lookup for the admin check, one for every figure on the card.
+    assert len(statements) == 2
+    assert response.get_json() == {
+        "period": "week",
+        "totalRevenue": 12.0,
+        "periodRevenue": 4.0,
+        "previousPeriodRevenue": 8.0,
+        "averageOrderValue": 6.0,
+        "periodAverageOrderValue": 4.0,
+        "revenueGrowth": -50.0,
+    }
+
+
+def test_order_customer_metrics_shape_and_single_query(client, app, count_queries):
+    headers = admin_headers(client, app)
+    register_and_login(client, "kpi.buyer@example.com")
+    register_and_login(client, "kpi.inactive@example.com")
+    with app.app_context():
+        User.query.filter_by(email="kpi.inactive@example.com").one().status = "inactive"
+        db.session.commit()
+    create_paid_invoice(app, datetime.utcnow() - timedelta(days=10), [("Snacks", 1, 8.0)])
+    create_paid_invoice(app, datetime.utcnow() - timedelta(days=3), [("Snacks", 1, 4.0)])
+    create_paid_invoice(app, datetime.utcnow() - timedelta(days=2), [("Snacks", 1, 4.0)])
+
+    with count_queries() as statements:
+        response = client.get("/kpis/order-customer-metrics?period=week", headers=headers)
+
+    assert response.status_code == 200
+    assert len(statements) == 2
+    assert response.get_json() == {
+        "period": "week",
+        "totalOrders": 3,
+        "periodOrdersCount": 2,
+        "pendingOrders": 0,
+        "completedOrders": 3,
+        "orderGrowth": 100.0,
+        "totalCustomers": 2,
+        "periodCustomers": 2,
+        "activeCustomers": 1,
+    }
+
+
+def test_product_promotion_metrics_shape_and_single_query(client, app, count_queries):
+    headers = admin_headers(client, app)
+    today = datetime.utcnow().date()
+    with app.app_context():
+        for index, (price, quantity) in enumerate([(2.0, 0), (1.5, 4), (3.0, 20)]):
+            db.session.add(
+                Product(
+                    name=f"Stock Product {index}",
+                    brand="Kpi Brand",
+                    category="General",
+                    unit="1 unit",
+                    price=price,
+                    quantity_in_stock=quantity,
+                )
+            )
+        db.session.add_all(
+            [
+                Promotion(
+                    title="Running",
+                    description="Running promotion",
+                    categories="[]",
+                    discount_type="percentage",
+                    discount_value=10,
+                    start_date=today - timedelta(days=1),
+                    end_date=today + timedelta(days=1),
+                    status="active",
+                ),
+                Promotion(
+                    title="Expired",
+                    description="Expired promotion",
+                    categories="[]",
+                    discount_type="percentage",
+                    discount_value=10,
+                    start_date=today - timedelta(days=10),
+                    end_date=today - timedelta(days=5),
+                    status="active",
+                ),
+            ]
+        )
+        db.session.commit()
+
+    with count_queries() as statements:
+        response = client.get("/kpis/product-promotion-metrics", headers=headers)
+
+    assert response.status_code == 200
+    assert len(statements) == 2
+    assert response.get_json() == {
+        "totalProducts": 3,
+        "lowStockProducts": 1,
+        "outOfStockProducts": 1,
+        "totalInventoryValue": 66.0,
+        "activePromotions": 1,
+        "totalPromotions": 0,
+    }
@@ -0,0 +1,63 @@
+from extensions import db
+from models import Product
+from routes.admin_product_import_routes import _build_product_payload, _upsert_product
+from services.nutrition import nutrition_columns, parse_nutritional_info
+
+
+def test_parse_nutritional_info_accepts_json_and_legacy_repr():
+    assert parse_nutritional_info('{"sugars_100g": 4}') == {"sugars_100g": 4}
+    assert parse_nutritional_info("{'sugars_100g': 4}") == {"sugars_100g": 4}
+    assert parse_nutritional_info("not json") is None
+    assert parse_nutritional_info(None) is None
+
+
+def test_nutrition_columns_maps_numeric_values():
+    columns = nutrition_columns({"energy-kcal_100g": 120, "sugars_100g": "9.5", "fat_100g": "n/a"})
+
+    assert columns == {
+        "energy_kcal_100g": 120.0,
+        "sugars_100g": 9.5,
+        "fat_100g": None,
+        "salt_100g": None,
+        "proteins_100g": None,
+    }
+
+
+def test_importer_upsert_populates_nutrition_columns(app):
+    raw = {
+        "code": "3017620422003",
+        "product_name": "Hazelnut Spread",
+        "brands": "Nutty",
+        "categories": "Spreads",
+        "nutriments": {"energy-kcal_100g": 539, "sugars_100g": 56.3, "salt_100g": 0.107},
+    }
+
+    with app.app_context():
+        assert _upsert_product(_build_product_payload(raw)) == "created"
+        product = Product.query.filter_by(barcode="3017620422003").first()
+
+        assert product.energy_kcal_100g == 539
+        assert product.sugars_100g == 56.3
+        assert product.salt_100g == 0.107
+        assert product.fat_100g is None
+
+
+def test_product_listing_filters_on_nutrition_columns(client, app):
+    with app.app_context():
+        for name, sugars in (("Water", 0.0), ("Soda", 10.6), ("Unknown", None)):
+            db.session.add(
+                Product(
+                    name=name,
+                    brand="Demo",
+                    category="Beverages",
+                    unit="1L",
+                    price=1.0,
+                    quantity_in_stock=5,
+                    sugars_100g=sugars,
+                )
+            )
+        db.session.commit()
+
+    body = client.get("/products/?max_sugars=5").get_json()
+
+    assert [item["name"] for item in body] == ["Water"]
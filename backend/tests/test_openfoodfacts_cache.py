@@ -0,0 +1,109 @@
+import json
+import time
+
+import pytest
+import requests
+
+from services import openfoodfacts_service
+from services.http_cache import response_cache
+from services.openfoodfacts_service import fetch_product_by_barcode, fetch_products_page
+
+
+def make_response(status_code=200, body=None, etag=None, last_modified=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(body).encode() if body is not None else b""
+    if etag:
+        response.headers["ETag"] = etag
+    if last_modified:
+        response.headers["Last-Modified"] = last_modified
+    return response
+
+
+def product_body(barcode):
+    return {"status": 1, "product": {"code": barcode, "product_name": f"Cached {barcode}", "brands": "Disk"}}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    response_cache.configure(str(tmp_path / "openfoodfacts.sqlite3"), ttl=60)
+    yield response_cache
+    response_cache.configure(None)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Fake OpenFoodFacts: records each request, answers with the queued responses."""
+    calls = []
+    responses = []
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        calls.append({"url": url, "headers": headers or {}, "params": params})
+        return responses.pop(0)
+
+    monkeypatch.setattr(openfoodfacts_service.http_client, "get", fake_get)
+    return calls, responses
+
+
+def test_fresh_responses_are_served_from_disk(cache, server):
+    calls, responses = server
+    responses.append(make_response(body=product_body("111")))
+    responses.append(make_response(body={"count": 1, "products": [{"code": "111"}]}))
+
+    assert fetch_product_by_barcode("111")["product_name"] == "Cached 111"
+    assert fetch_product_by_barcode("111")["product_name"] == "Cached 111"
+    assert fetch_products_page(1, page_size=5)["products"] == [{"code": "111"}]
+    assert fetch_products_page(1, page_size=5)["count"] == 1
+
+    assert len(calls) == 2
+    assert cache.stats()["entries"] == 2
+
+
+def test_stale_responses_are_revalidated_with_a_conditional_get(cache, server, monkeypatch):
+    calls, responses = server
+    responses.append(make_response(body=product_body("222"), etag='"v1"', last_modified="Mon, 01 Jan 2024 00:00:00 GMT"))
+    fetch_product_by_barcode("222")
+
+    later = time.time() + 120
+    monkeypatch.setattr("services.http_cache.time.time", lambda: later)
+    responses.append(make_response(status_code=304, etag='"v1"'))
+
+    assert fetch_product_by_barcode("222")["product_name"] == "Cached 222"
+    assert calls[1]["headers"]["If-None-Match"] == '"v1"'
+    assert calls[1]["headers"]["If-Modified-Since"] == "Mon, 01 Jan 2024 00:00:00 GMT"
+
+    # The 304 bought the entry another TTL.
+    assert fetch_product_by_barcode("222")["product_name"] == "Cached 222"
+    assert len(calls) == 2
+
+
+def test_least_recently_used_entries_are_evicted_past_the_size_limit(cache, server):
+    calls, responses = server
+    cache.max_bytes = 200  # room for two of these responses
+    for barcode in ("301", "302", "303", "304"):
+        responses.append(make_response(body=product_body(barcode)))
+        fetch_product_by_barcode(barcode)
+        time.sleep(0.01)
+        if barcode == "302":
+            fetch_product_by_barcode("301")  # keep 301 warm
+
+    stats = cache.stats()
+    assert stats["bytes"] <= 200
+    assert cache.get(f"{openfoodfacts_service.BASE_V2_URL}/302") is None
+    assert cache.get(f"{openfoodfacts_service.BASE_V2_URL}/304") is not None
+
+
+def test_offline_mode_replays_recorded_responses(cache, server, monkeypatch):
+    calls, responses = server
+    responses.append(make_response(body=product_body("401")))
+    fetch_product_by_barcode("401")
+
+    # Expired and offline: still served, and nothing reaches the network.
+    later = time.time() + 3600
+    monkeypatch.setattr("services.http_cache.time.time", lambda: later)
+    cache.offline = True
+
+    assert fetch_product_by_barcode("401")["product_name"] == "Cached 401"
+    with pytest.raises(requests.ConnectionError):
+        fetch_product_by_barcode("402")
+    assert len(calls) == 1
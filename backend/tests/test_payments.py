@@ -1,7 +1,8 @@
 from uuid import uuid4
 
 from extensions import db
-from models import Invoice, Product
+from models import Invoice, KpiDailyRollup, Product
+from services.jobs import run_pending_jobs
 
 
 BASE_PASSWORD = "Password123"
@@ -270,7 +271,13 @@ def test_capture_paypal_order_sends_algolia_purchase_event(client, app, monkeypa
     body = response.get_json()
 
     assert response.status_code == 200
-    assert body["algolia_purchase_event"]["sent"] is True
+    assert body["algolia_purchase_event"]["queued"] is True
+    # Sent by the job worker, not during the request.
+    assert sent_payload == {}
+
+    with app.app_context():
+        assert run_pending_jobs() == 1
+
     assert sent_payload["product_object_ids"] == [str(product_id)]
     assert isinstance(sent_payload["user_id"], int)
 
@@ -408,6 +415,64 @@ def test_paypal_webhook_marks_invoice_paid_on_capture_completed(client, app, mon
         assert invoice.paid_at is not None
 
 
+def test_capture_and_webhook_racing_count_the_sale_once(client, app, monkeypatch):
+    email = "payments.webhook.race@example.com"
+    register_user(client, email)
+    token = login_and_get_token(client, email)
+
+    product_id = create_product(app, price=5.0)
+    invoice_id = create_invoice(client, token)
+    add_invoice_item(client, token, invoice_id, product_id, 2)  # total 10.00
+
+    with app.app_context():
+        invoice = Invoice.query.get(invoice_id)
+        invoice.payment_method = "paypal"
+        invoice.payment_status = "pending"
+        invoice.paypal_order_id = "ORDER-RACE-1"
+        db.session.commit()
+
+    monkeypatch.setattr("routes.payment_routes.verify_paypal_webhook_signature", lambda headers, payload: True)
+    monkeypatch.setattr("routes.payment_routes.send_purchase_event_to_algolia", lambda **kwargs: None)
+    from routes import payment_routes
+
+    real_to_money = payment_routes._to_money
+    captures = []
+
+    def to_money_while_capture_commits(value):
+        # The webhook has read the invoice as pending; the capture endpoint
+        # marks it paid and records the sale before the webhook commits.
+        if not captures:
+            with app.app_context():
+                invoice = Invoice.query.get(invoice_id)
+                captures.append(
+                    payment_routes._mark_paid(invoice, "ORDER-RACE-1", "CAPTURE-RACE-1")
+                )
+                payment_routes.record_invoice_paid(invoice)
+                db.session.commit()
+        return real_to_money(value)
+
+    monkeypatch.setattr(payment_routes, "_to_money", to_money_while_capture_commits)
+
+    response = client.post(
+        "/payments/paypal/webhook",
+        json={
+            "event_type": "PAYMENT.CAPTURE.COMPLETED",
+            "resource": {
+                "id": "CAPTURE-RACE-1",
+                "amount": {"currency_code": "USD", "value": "10.00"},
+                "supplementary_data": {"related_ids": {"order_id": "ORDER-RACE-1"}},
+            },
+        },
+    )
+
+    assert captures == [True]
+    assert response.status_code == 200
+    with app.app_context():
+        assert Invoice.query.get(invoice_id).payment_status == "paid"
+        rollups = KpiDailyRollup.query.all()
+        assert [(rollup.orders, rollup.revenue) for rollup in rollups] == [(1, 10.0)]
+
+
 def test_paypal_webhook_marks_invoice_failed_on_amount_mismatch(client, app, monkeypatch):
     email = "payments.webhook.mismatch@example.com"
     register_user(client, email)
@@ -0,0 +1,159 @@
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+from services import paypal_service
+from services.token_cache import AccessTokenCache, FileTokenBackend
+
+
+def make_response(status_code=200, body=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(body or {}).encode()
+    return response
+
+
+@pytest.fixture
+def paypal(app, monkeypatch):
+    """Live-mode PayPal against a fake API; records the paths that were called."""
+    app.config.update(PAYPAL_MOCK_MODE=False, PAYPAL_CLIENT_ID="client", PAYPAL_CLIENT_SECRET="secret")
+    calls = []
+    capture_statuses = []
+
+    def fake_post(url, **kwargs):
+        path = url.split("paypal.com", 1)[1]
+        calls.append(path)
+        if path == "/v1/oauth2/token":
+            time.sleep(0.05)
+            return make_response(body={"access_token": f"token-{len(calls)}", "expires_in": 32400})
+        status = capture_statuses.pop(0) if capture_statuses else 200
+        return make_response(status, {"id": "ORDER-1", "status": "COMPLETED"})
+
+    monkeypatch.setattr(paypal_service.http_client, "post", fake_post)
+    with app.app_context():
+        yield calls, capture_statuses
+
+
+def token_calls(calls):
+    return [path for path in calls if path == "/v1/oauth2/token"]
+
+
+def test_payment_calls_share_one_token(paypal):
+    calls, _ = paypal
+
+    for _ in range(3):
+        paypal_service.capture_paypal_order("ORDER-1")
+
+    assert len(token_calls(calls)) == 1
+    assert len(calls) == 4
+
+
+def test_concurrent_callers_fetch_the_token_once(paypal, app):
+    calls, _ = paypal
+    tokens = []
+
+    def worker():
+        with app.app_context():
+            tokens.append(paypal_service.get_paypal_access_token())
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(token_calls(calls)) == 1
+    assert len(set(tokens)) == 1
+
+
+def test_rejected_token_is_replaced_and_the_call_retried_once(paypal):
+    calls, capture_statuses = paypal
+    capture_statuses.append(401)
+
+    assert paypal_service.capture_paypal_order("ORDER-1")["status"] == "COMPLETED"
+    assert calls == [
+        "/v1/oauth2/token",
+        "/v2/checkout/orders/ORDER-1/capture",
+        "/v1/oauth2/token",
+        "/v2/checkout/orders/ORDER-1/capture",
+    ]
+
+
+def test_token_is_refreshed_ahead_of_expiry_and_kept_if_refresh_fails():
+    cache = AccessTokenCache(refresh_margin=60)
+    results = iter([("first", 30), RuntimeError("token endpoint down"), ("second", 3600)])
+
+    def fetch():
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    assert cache.get("paypal", fetch) == "first"
+    # 30s left and a 60s margin: due for refresh but still valid, so a
+    # failed refresh keeps serving it.
+    assert cache.get("paypal", fetch) == "first"
+    assert cache.get("paypal", fetch) == "second"
+    assert cache.get("paypal", fetch) == "second"
+
+
+def test_expired_token_is_not_served_when_refresh_fails():
+    cache = AccessTokenCache(refresh_margin=0)
+    cache.backend.set("paypal", {"token": "old", "expires_at": time.time() - 1})
+
+    def fetch():
+        raise RuntimeError("token endpoint down")
+
+    with pytest.raises(RuntimeError):
+        cache.get("paypal", fetch)
+
+
+def test_token_without_expires_in_is_kept_for_the_default_lifetime():
+    cache = AccessTokenCache(refresh_margin=300)
+    fetched = []
+
+    def fetch():
+        fetched.append(1)
+        return f"token-{len(fetched)}", None
+
+    assert cache.get("paypal", fetch) == "token-1"
+    assert cache.get("paypal", fetch) == "token-1"
+    assert len(fetched) == 1
+    assert cache.backend.get("paypal")["expires_at"] > time.time() + 290
+
+
+def test_proactive_refresh_does_not_wait_for_another_workers_lock(tmp_path):
+    path = str(tmp_path / "paypal-token.json")
+    backend = FileTokenBackend(path)
+    cache = AccessTokenCache(backend, refresh_margin=60)
+    backend.set("paypal", {"token": "old", "expires_at": time.time() + 30})
+
+    def fetch():
+        raise AssertionError("the worker holding the lock is refreshing")
+
+    with FileTokenBackend(path).lock("paypal"):
+        assert cache.get("paypal", fetch) == "old"
+
+
+def test_file_backend_shares_tokens_between_workers(tmp_path):
+    path = str(tmp_path / "paypal-token.json")
+    worker_a = AccessTokenCache(FileTokenBackend(path))
+    worker_b = AccessTokenCache(FileTokenBackend(path))
+    fetched = []
+
+    def fetch():
+        fetched.append(1)
+        return f"token-{len(fetched)}", 3600
+
+    assert worker_a.get("paypal", fetch) == "token-1"
+    assert worker_b.get("paypal", fetch) == "token-1"
+
+    worker_b.invalidate("paypal", "token-1")
+    assert worker_a.get("paypal", fetch) == "token-2"
+    # A stale rejection does not throw away the newer token.
+    worker_b.invalidate("paypal", "token-1")
+    assert worker_b.get("paypal", fetch) == "token-2"
+    assert len(fetched) == 2
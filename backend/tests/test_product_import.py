@@ -0,0 +1,435 @@
+import gzip
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+from extensions import db
+from models import Product, User
+from routes import admin_product_import_routes as import_routes
+from routes.admin_product_import_routes import (
+    ImportSourceUnavailable,
+    _build_product_payload,
+    _upsert_products,
+    _upsert_products_one_by_one,
+    run_product_import,
+)
+from services import openfoodfacts_service
+from services.catalog_cache import catalog_cache
+from services.jobs import run_pending_jobs
+from services.openfoodfacts_dump import iter_dump_products
+from services.openfoodfacts_service import HostRateLimiter, fetch_products_by_barcodes
+
+
+def admin_headers(client, app, email="import.admin@example.com", password="Password123"):
+    client.post(
+        "/auth/register",
+        json={
+            "first_name": "Import",
+            "last_name": "Admin",
+            "email": email,
+            "password": password,
+            "phone_number": "+15554443333",
+            "address": "5 Import Street",
+            "zip_code": "10001",
+            "city": "New York",
+            "country": "USA",
+        },
+    )
+    with app.app_context():
+        User.query.filter_by(email=email).first().role = "admin"
+        db.session.commit()
+    response = client.post("/auth/login", json={"email": email, "password": password})
+    return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+
+def off_product(barcode, name=None):
+    return {"code": barcode, "product_name": name or f"Imported {barcode}", "brands": "Import Brand"}
+
+
+def test_concurrent_fetch_keeps_barcode_order_and_bounds_parallelism(monkeypatch):
+    lock = threading.Lock()
+    in_flight = {"now": 0, "max": 0}
+
+    def fake_fetch(barcode, limiter=None):
+        with lock:
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        # Later barcodes answer first, so ordering has to be restored.
+        time.sleep(0.002 * (20 - int(barcode)))
+        with lock:
+            in_flight["now"] -= 1
+        if barcode == "7":
+            raise requests.ConnectionError("boom")
+        return off_product(barcode)
+
+    monkeypatch.setattr(openfoodfacts_service, "fetch_product_by_barcode", fake_fetch)
+
+    results = list(fetch_products_by_barcodes([str(index) for index in range(20)], workers=4))
+
+    assert [barcode for barcode, _, _ in results] == [str(index) for index in range(20)]
+    assert isinstance(results[7][2], requests.ConnectionError)
+    assert results[8][1]["code"] == "8"
+    assert 1 < in_flight["max"] <= 4
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = HostRateLimiter(per_minute=60 * 50)  # one request per 20 ms
+    started = time.monotonic()
+    for _ in range(5):
+        limiter.wait()
+
+    assert time.monotonic() - started >= 0.075
+
+
+def test_barcode_import_writes_fetched_products(app, monkeypatch):
+    def fake_fetch(barcode, limiter=None):
+        return None if barcode == "3000000000002" else off_product(barcode)
+
+    monkeypatch.setattr(openfoodfacts_service, "fetch_product_by_barcode", fake_fetch)
+    app.config["OPENFOODFACTS_FETCH_WORKERS"] = 3
+
+    barcodes = [f"300000000000{index}" for index in range(6)]
+    with app.app_context():
+        result = run_product_import(source="barcodes", barcodes=barcodes)
+
+        assert result["imported"] == 5
+        assert result["skipped"] == 1
+        assert result["total_available"] == 6
+        assert Product.query.filter(Product.barcode.in_(barcodes)).count() == 5
+
+
+def test_barcode_import_stops_when_openfoodfacts_is_unreachable(app, monkeypatch):
+    def fake_fetch(barcode, limiter=None):
+        raise requests.ConnectionError("unreachable")
+
+    monkeypatch.setattr(openfoodfacts_service, "fetch_product_by_barcode", fake_fetch)
+
+    with app.app_context():
+        with pytest.raises(ImportSourceUnavailable) as excinfo:
+            run_product_import(source="barcodes", barcodes=[f"31{index:011d}" for index in range(50)])
+
+    assert excinfo.value.result["errors"] == 3
+
+
+def import_rows():
+    return [
+        off_product("5000000000001", "Existing By Barcode"),
+        {"product_name": "Existing By Name", "brands": "Import Brand", "nutriments": {"sugars_100g": 3}},
+        off_product("5000000000003", "Brand New"),
+        # Same product twice in one page: created, then updated.
+        off_product("5000000000004", "Twice"),
+        {**off_product("5000000000004", "Twice"), "categories": "Snacks"},
+        {"product_name": "No Barcode", "brands": "Import Brand"},
+    ]
+
+
+def seed_existing():
+    db.session.add_all([
+        Product(name="Old Name", brand="Import Brand", barcode="5000000000001", category="Other",
+                price=2.0, quantity_in_stock=5),
+        Product(name="Existing By Name", brand="Import Brand", category="Other", price=0.0, quantity_in_stock=0),
+    ])
+    db.session.commit()
+
+
+def snapshot():
+    return sorted(
+        (product.name, product.brand, product.barcode, product.category, product.price, product.quantity_in_stock,
+         product.sugars_100g)
+        for product in Product.query.all()
+    )
+
+
+def test_batch_upsert_matches_row_by_row_upsert(app):
+    payloads = [_build_product_payload(row) for row in import_rows()]
+
+    with app.app_context():
+        seed_existing()
+        row_by_row = _upsert_products_one_by_one(payloads)
+        expected = snapshot()
+        Product.query.delete()
+        db.session.commit()
+
+        seed_existing()
+        batched = _upsert_products(payloads)
+
+        assert batched == row_by_row == ["updated", "updated", "created", "created", "updated", "created"]
+        assert snapshot() == expected
+
+
+def test_batch_upsert_uses_a_fixed_number_of_queries(app, count_queries):
+    with app.app_context():
+        seed_existing()
+        catalog_cache.version()
+        for size in (6, 60):
+            payloads = [
+                _build_product_payload(off_product(f"6{size:03d}{index:09d}")) for index in range(size)
+            ]
+            with count_queries() as statements:
+                statuses = _upsert_products(payloads)
+            assert statuses == ["created"] * size
+            # Two lookups, one INSERT (possibly split by the driver), the
+            # commit and the catalog version bump.
+            assert len([statement for statement in statements if not statement.startswith("INSERT")]) <= 3
+
+
+@pytest.mark.parametrize("executemany_returning", [True, False])
+def test_batch_upsert_counts_rows_taken_concurrently_as_skipped(app, monkeypatch, executemany_returning):
+    with app.app_context():
+        # False stands in for drivers that cannot RETURN from an executemany.
+        monkeypatch.setattr(db.engine.dialect, "insert_executemany_returning", executemany_returning)
+        payloads = [_build_product_payload(off_product("7000000000001")), _build_product_payload(off_product("7000000000002"))]
+
+        # Another importer inserts the first barcode after our lookup ran.
+        real_match = import_routes.match_existing_products
+
+        def match_then_race(batch):
+            result = real_match(batch)
+            db.session.add(Product(name="Racer", brand="Other", barcode="7000000000001", category="Other",
+                                   price=1.0, quantity_in_stock=1))
+            db.session.flush()
+            return result
+
+        monkeypatch.setattr(import_routes, "match_existing_products", match_then_race)
+
+        assert _upsert_products(payloads) == ["skipped", "created"]
+
+
+def test_search_import_prefetches_the_next_page_while_writing(app, monkeypatch):
+    page_two_requested = threading.Event()
+
+    def fake_fetch_products_page(page, page_size):
+        if page == 2:
+            page_two_requested.set()
+        if page > 2:
+            return {"products": []}
+        return {"count": 2, "products": [off_product(f"800000000000{page}")]}
+
+    real_upsert = import_routes._upsert_products
+    overlapped = []
+
+    def slow_upsert(payloads):
+        # Page 2 should be on its way while page 1 is being written.
+        overlapped.append(page_two_requested.wait(timeout=2))
+        return real_upsert(payloads)
+
+    monkeypatch.setattr(openfoodfacts_service, "fetch_products_page", fake_fetch_products_page)
+    monkeypatch.setattr(import_routes, "_upsert_products", slow_upsert)
+
+    with app.app_context():
+        result = run_product_import(source="search", pages=5, page_size=1)
+
+    assert overlapped[0] is True
+    assert result["imported"] == 2
+    assert result["attempted"] == 2
+
+
+def test_search_import_honours_limit_across_pages(app, monkeypatch):
+    def fake_fetch_products_page(page, page_size):
+        return {"products": [off_product(f"90000000{page:02d}{index:03d}") for index in range(page_size)]}
+
+    monkeypatch.setattr(openfoodfacts_service, "fetch_products_page", fake_fetch_products_page)
+
+    with app.app_context():
+        result = run_product_import(source="search", pages=5, page_size=4, limit=6)
+
+    assert result["attempted"] == 6
+    assert result["imported"] == 6
+
+
+def test_barcode_import_continues_from_checkpoint(app, monkeypatch):
+    requested = []
+
+    def fake_fetch(barcode, limiter=None):
+        requested.append(barcode)
+        return off_product(barcode)
+
+    monkeypatch.setattr(openfoodfacts_service, "fetch_product_by_barcode", fake_fetch)
+    monkeypatch.setattr(import_routes, "IMPORT_BATCH_SIZE", 2)
+
+    barcodes = [f"320000000000{index}" for index in range(7)]
+    checkpoints = []
+    with app.app_context():
+        result = run_product_import(
+            source="barcodes",
+            barcodes=barcodes,
+            checkpoint={"next_barcode": 3, "attempted": 3, "imported": 3},
+            on_checkpoint=checkpoints.append,
+        )
+
+    assert sorted(requested) == barcodes[3:]
+    assert [checkpoint["next_barcode"] for checkpoint in checkpoints] == [5, 7, 7]
+    assert checkpoints[-1]["imported"] == 7
+    assert result["imported"] == 7
+    assert result["attempted"] == 7
+    assert result["resumed_from"] == {"next_barcode": 3}
+
+
+def test_barcode_import_checkpoint_stops_at_the_first_failed_fetch(app, monkeypatch):
+    barcodes = [f"330000000000{index}" for index in range(7)]
+    failing = {barcodes[2], barcodes[3]}
+    requested = []
+
+    def flaky_fetch(barcode, limiter=None):
+        requested.append(barcode)
+        if barcode in failing:
+            raise requests.ConnectionError("timed out")
+        return off_product(barcode)
+
+    monkeypatch.setattr(openfoodfacts_service, "fetch_product_by_barcode", flaky_fetch)
+    monkeypatch.setattr(import_routes, "IMPORT_BATCH_SIZE", 2)
+    app.config["OPENFOODFACTS_FETCH_WORKERS"] = 1
+    checkpoints = []
+
+    with app.app_context():
+        result = run_product_import(source="barcodes", barcodes=barcodes, on_checkpoint=checkpoints.append)
+        assert result["errors"] == 2
+        assert checkpoints[-1]["next_barcode"] == 2
+        assert checkpoints[-1]["errors"] == 0
+
+        failing.clear()
+        requested.clear()
+        resumed = run_product_import(source="barcodes", barcodes=barcodes, checkpoint=checkpoints[-1])
+
+    assert requested == barcodes[2:]
+    assert resumed["errors"] == 0
+    assert resumed["attempted"] == 7
+    assert resumed["imported"] + resumed["updated"] == 7
+
+
+def test_search_import_checkpoint_stops_at_a_failed_page(app, monkeypatch):
+    failing = {2}
+    requested = []
+
+    def flaky_fetch_products_page(page, page_size):
+        requested.append(page)
+        if page in failing:
+            raise requests.ConnectionError("timed out")
+        return {"products": [off_product(f"34000000000{page:02d}")]}
+
+    monkeypatch.setattr(openfoodfacts_service, "fetch_products_page", flaky_fetch_products_page)
+    checkpoints = []
+
+    with app.app_context():
+        result = run_product_import(source="search", pages=3, page_size=1, on_checkpoint=checkpoints.append)
+        assert result["errors"] == 1
+        assert result["imported"] == 2
+        assert [checkpoint["page"] for checkpoint in checkpoints] == [1]
+
+        failing.clear()
+        requested.clear()
+        resumed = run_product_import(source="search", pages=3, page_size=1, checkpoint=checkpoints[-1])
+
+    assert requested == [2, 3]
+    assert resumed["errors"] == 0
+    assert resumed["resumed_from"] == {"page": 1}
+
+
+def write_jsonl_dump(path, records):
+    with gzip.open(path, "wt", encoding="utf-8") as dump:
+        for record in records:
+            dump.write(record if isinstance(record, str) else json.dumps(record))
+            dump.write("\n")
+
+
+def dump_record(barcode, country="en:france", category="en:snacks"):
+    return {**off_product(barcode), "countries_tags": [country], "categories_tags": [category]}
+
+
+def test_csv_dump_rows_are_reshaped_and_filtered(tmp_path):
+    path = tmp_path / "products.csv.gz"
+    header = ["code", "product_name", "brands", "countries_tags", "categories", "categories_tags", "sugars_100g"]
+    rows = [
+        ["1001", "Crisps", "Dump Brand", "en:france,en:belgium", "Snacks", "en:snacks,en:chips", "0.5"],
+        ["1002", "Cola", "Dump Brand", "en:germany", "Drinks", "en:beverages", "10.6"],
+        ["1003", 'Say "cheese"', "Dump Brand", "en:france", "Dairy", "en:dairies", ""],
+    ]
+    with gzip.open(path, "wt", encoding="utf-8") as dump:
+        for row in [header] + rows:
+            dump.write("\t".join(row) + "\n")
+
+    french = list(iter_dump_products(str(path), countries=["France"]))
+    assert [position for position, _ in french] == [1, 3]
+    crisps = french[0][1]
+    assert crisps["categories_tags"] == ["en:snacks", "en:chips"]
+    assert crisps["nutriments"] == {"sugars_100g": 0.5}
+    assert french[1][1]["product_name"] == 'Say "cheese"'
+
+    assert [product["code"] for _, product in iter_dump_products(str(path), categories=["beverages"])] == ["1002"]
+    assert [position for position, _ in iter_dump_products(str(path), start=2)] == [3]
+
+
+def test_dump_import_writes_batches_and_resumes(app, tmp_path):
+    path = tmp_path / "products.jsonl.gz"
+    write_jsonl_dump(
+        path,
+        [dump_record(f"10000000000{index:02d}") for index in range(5)]
+        + ["{not json"]
+        + [dump_record("1000000000099", country="en:spain")]
+        + [dump_record(f"10000000001{index:02d}") for index in range(3)],
+    )
+    app.config["OPENFOODFACTS_DUMP_BATCH_SIZE"] = 4
+    checkpoints = []
+
+    with app.app_context():
+        result = run_product_import(
+            source="dump", dump_path=str(path), countries=["france"], on_checkpoint=checkpoints.append
+        )
+
+        assert result["imported"] == 8
+        assert result["errors"] == 1
+        assert result["attempted"] == 9
+        assert [checkpoint["next_record"] for checkpoint in checkpoints] == [4, 10]
+        assert Product.query.filter_by(barcode="1000000000099").count() == 0
+
+        # Resuming from the middle redoes nothing before the checkpoint.
+        resumed = run_product_import(
+            source="dump", dump_path=str(path), countries=["france"], checkpoint=checkpoints[0]
+        )
+        assert resumed["updated"] == 4
+        assert resumed["imported"] == 4
+        assert resumed["resumed_from"] == {"next_record": 4}
+        assert Product.query.count() == 8
+
+
+def test_dump_import_limit_checkpoints_the_last_written_record(app, tmp_path):
+    path = tmp_path / "products.jsonl.gz"
+    write_jsonl_dump(path, [dump_record(f"11000000000{index:02d}") for index in range(5)])
+    checkpoints = []
+
+    with app.app_context():
+        result = run_product_import(
+            source="dump", dump_path=str(path), limit=3, on_checkpoint=checkpoints.append
+        )
+        assert result["imported"] == 3
+        assert checkpoints[-1]["next_record"] == 3
+
+        resumed = run_product_import(source="dump", dump_path=str(path), checkpoint=checkpoints[-1])
+        assert resumed["imported"] == 5
+        assert resumed["updated"] == 0
+        assert Product.query.count() == 5
+
+
+def test_admin_dump_import_only_reads_the_dump_directory(client, app, tmp_path):
+    headers = admin_headers(client, app)
+    write_jsonl_dump(tmp_path / "fr.jsonl.gz", [dump_record("2000000000001")])
+
+    response = client.post("/admin/products/import?source=dump&file=fr.jsonl.gz", headers=headers)
+    assert response.status_code == 400
+
+    app.config["OPENFOODFACTS_DUMP_DIR"] = str(tmp_path / "dumps")
+    (tmp_path / "dumps").mkdir()
+    write_jsonl_dump(tmp_path / "dumps" / "fr.jsonl.gz", [dump_record("2000000000001")])
+
+    response = client.post("/admin/products/import?source=dump&file=../fr.jsonl.gz", headers=headers)
+    assert response.status_code == 400
+
+    response = client.post("/admin/products/import?source=dump&file=fr.jsonl.gz&country=france", headers=headers)
+    assert response.status_code == 202
+
+    with app.app_context():
+        run_pending_jobs()
+        assert Product.query.filter_by(barcode="2000000000001").count() == 1
@@ -1,5 +1,37 @@
+from datetime import datetime, timedelta
+
+import pytest
+
 from extensions import db
-from models import Product
+from models import Product, ProductTombstone, User
+
+
+BASE_PASSWORD = "Password123"
+
+
+def admin_headers(client, app, email="products.admin@example.com"):
+    client.post(
+        "/auth/register",
+        json={
+            "first_name": "Product",
+            "last_name": "Admin",
+            "email": email,
+            "password": BASE_PASSWORD,
+            "phone_number": "+15550009999",
+            "address": "1 Admin Street",
+            "zip_code": "10001",
+            "city": "New York",
+            "country": "USA",
+        },
+    )
+    with app.app_context():
+        user = User.query.filter_by(email=email).first()
+        user.role = "admin"
+        db.session.commit()
+
+    response = client.post("/auth/login", json={"email": email, "password": BASE_PASSWORD})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
 
 
 def test_get_product_by_barcode_returns_product(client, app):
@@ -30,3 +62,333 @@ def test_get_product_by_barcode_returns_404_when_not_found(client):
 
     assert response.status_code == 404
     assert body["message"] == "Product not found"
+
+
+def create_products(app, rows):
+    with app.app_context():
+        for index, overrides in enumerate(rows):
+            defaults = {
+                "name": f"Product {index}",
+                "brand": "Demo Brand",
+                "barcode": f"LIST-{index:06d}",
+                "category": "Dairy",
+                "unit": "1 unit",
+                "price": 2.0,
+                "quantity_in_stock": 10,
+            }
+            defaults.update(overrides)
+            db.session.add(Product(**defaults))
+        db.session.commit()
+
+
+def test_get_products_without_pagination_returns_list(client, app):
+    create_products(app, [{}, {}])
+
+    response = client.get("/products/")
+
+    assert response.status_code == 200
+    assert isinstance(response.get_json(), list)
+    assert len(response.get_json()) == 2
+
+
+def test_get_products_paginates_with_cursor(client, app):
+    create_products(app, [{} for _ in range(5)])
+
+    first = client.get("/products/?limit=2").get_json()
+    assert [item["name"] for item in first["items"]] == ["Product 0", "Product 1"]
+    assert first["next_cursor"]
+
+    second = client.get(f"/products/?limit=2&cursor={first['next_cursor']}").get_json()
+    assert [item["name"] for item in second["items"]] == ["Product 2", "Product 3"]
+
+    third = client.get(f"/products/?limit=2&cursor={second['next_cursor']}").get_json()
+    assert [item["name"] for item in third["items"]] == ["Product 4"]
+    assert third["next_cursor"] is None
+
+
+def test_get_products_caps_page_size(client, app):
+    create_products(app, [{}])
+
+    body = client.get("/products/?limit=100000").get_json()
+
+    assert body["limit"] == 200
+
+
+def test_get_products_applies_filters(client, app):
+    create_products(
+        app,
+        [
+            {"name": "Vegan Milk", "price": 3.5, "dietary_tags": '["vegan", "halal"]'},
+            {"name": "Cheap Milk", "price": 0.5, "dietary_tags": '["halal"]'},
+            {"name": "Empty Milk", "price": 3.0, "quantity_in_stock": 0},
+            {"name": "Cola", "category": "Beverages", "brand": "Fizz", "price": 2.0},
+        ],
+    )
+
+    body = client.get(
+        "/products/?limit=10&category=Dairy&in_stock=true&min_price=1&dietary_tags=vegan"
+    ).get_json()
+    assert [item["name"] for item in body["items"]] == ["Vegan Milk"]
+
+    body = client.get("/products/?brand=Fizz").get_json()
+    assert [item["name"] for item in body] == ["Cola"]
+
+    body = client.get("/products/?in_stock=false").get_json()
+    assert [item["name"] for item in body] == ["Empty Milk"]
+
+
+def test_get_products_rejects_invalid_params(client):
+    assert client.get("/products/?limit=0").status_code == 400
+    assert client.get("/products/?cursor=not-a-cursor").status_code == 400
+    assert client.get("/products/?min_price=abc").status_code == 400
+    assert client.get("/products/?min_price=5&max_price=1").status_code == 400
+
+
+def test_product_serialization_is_cached_until_product_changes(client, app, monkeypatch):
+    from routes import product_routes
+    from services.catalog_cache import catalog_cache
+
+    create_products(app, [{"name": "Cached Milk", "ingredients": '["milk"]'}])
+    calls = []
+    original_build = product_routes._build_product_json
+
+    def counting_build(product):
+        calls.append(product.id)
+        return original_build(product)
+
+    monkeypatch.setattr(product_routes, "_build_product_json", counting_build)
+
+    client.get("/products/")
+    client.get("/products/")
+    assert len(calls) == 1
+
+    with app.app_context():
+        product = Product.query.first()
+        product.name = "Renamed Milk"
+        db.session.commit()
+
+    body = client.get("/products/").get_json()
+    assert body[0]["name"] == "Renamed Milk"
+    assert body[0]["ingredients"] == ["milk"]
+    assert len(calls) == 2
+
+    catalog_cache.invalidate(body[0]["id"])
+    client.get("/products/")
+    assert len(calls) == 3
+
+
+def test_local_lru_backend_evicts_least_recently_used():
+    from services.catalog_cache import LocalLRUBackend
+
+    backend = LocalLRUBackend(max_entries=2)
+    backend.set("a", 1)
+    backend.set("b", 2)
+    backend.get("a")
+    backend.set("c", 3)
+
+    assert backend.get("a") == 1
+    assert backend.get("b") is None
+    assert backend.get("c") == 3
+
+
+def test_product_endpoints_return_304_for_matching_etag(client, app):
+    create_products(app, [{"barcode": "1111111111111"}])
+    with app.app_context():
+        product_id = Product.query.first().id
+
+    for url in ("/products/", f"/products/{product_id}", "/products/barcode/1111111111111"):
+        first = client.get(url)
+        etag = first.headers["ETag"]
+        assert first.status_code == 200
+        assert etag
+
+        second = client.get(url, headers={"If-None-Match": etag})
+        assert second.status_code == 304
+        assert second.headers["ETag"] == etag
+        assert second.get_data() == b""
+
+
+def test_product_etag_changes_after_catalog_write(client, app):
+    from services.catalog_cache import catalog_cache
+
+    create_products(app, [{}])
+    etag = client.get("/products/").headers["ETag"]
+
+    with app.app_context():
+        product = Product.query.first()
+        product.price = 9.99
+        db.session.commit()
+        catalog_cache.invalidate(product.id)
+
+    response = client.get("/products/", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.get_json()[0]["price"] == 9.99
+
+
+def test_stock_change_keeps_catalog_version_but_changes_product_etags(client, app):
+    from services.catalog_cache import catalog_cache
+    from services.inventory import reserve_stock
+
+    create_products(app, [{}, {}])
+    with app.app_context():
+        sold_id, untouched_id = [product.id for product in Product.query.order_by(Product.id)]
+        version = catalog_cache.version()
+
+    list_etag = client.get("/products/").headers["ETag"]
+    untouched_etag = client.get(f"/products/{untouched_id}").headers["ETag"]
+
+    with app.app_context():
+        reserve_stock(sold_id, 3)
+        db.session.commit()
+        catalog_cache.forget(sold_id)
+        assert catalog_cache.version() == version
+
+    response = client.get("/products/", headers={"If-None-Match": list_etag})
+    assert response.status_code == 200
+    assert response.get_json()[0]["quantity_in_stock"] == 7
+
+    response = client.get(f"/products/{untouched_id}", headers={"If-None-Match": untouched_etag})
+    assert response.status_code == 304
+
+
+@pytest.mark.parametrize("update_returning", [True, False])
+def test_catalog_version_is_shared_between_cache_instances(app, monkeypatch, update_returning):
+    # Two instances with their own in-process stores stand in for two
+    # gunicorn workers (or a worker and the job runner).
+    from services.catalog_cache import CatalogCache, LocalLRUBackend
+
+    first = CatalogCache(LocalLRUBackend())
+    second = CatalogCache(LocalLRUBackend())
+
+    with app.app_context():
+        monkeypatch.setattr(db.engine.dialect, "update_returning", update_returning)
+        etag = second.etag()
+        assert first.etag() == etag
+
+        first.invalidate(1)
+
+        assert second.etag() != etag
+        assert second.etag() == first.etag()
+
+
+def test_product_not_found_has_no_etag(client):
+    response = client.get("/products/999")
+
+    assert response.status_code == 404
+    assert "ETag" not in response.headers
+
+
+def test_product_changes_returns_created_updated_and_deleted(client, app):
+    app.config["PRODUCT_CHANGES_LAG_SECONDS"] = 0
+    headers = admin_headers(client, app)
+    create_products(app, [{"name": "Kept"}, {"name": "Edited"}, {"name": "Removed"}])
+
+    full_sync = client.get("/products/changes").get_json()
+    assert [item["name"] for item in full_sync["created"]] == ["Kept", "Edited", "Removed"]
+    assert full_sync["has_more"] is False
+    token = full_sync["next_token"]
+
+    with app.app_context():
+        ids = {product.name: product.id for product in Product.query.all()}
+
+    assert client.put(f"/products/{ids['Edited']}", json={"price": 7.5}, headers=headers).status_code == 200
+    assert client.delete(f"/products/{ids['Removed']}", headers=headers).status_code == 200
+    create_products(app, [{"name": "Added", "barcode": "LIST-NEW"}])
+
+    delta = client.get(f"/products/changes?since={token}").get_json()
+
+    assert [item["name"] for item in delta["created"]] == ["Added"]
+    assert [item["name"] for item in delta["updated"]] == ["Edited"]
+    assert delta["deleted"] == [{"id": ids["Removed"], "barcode": "LIST-000002"}]
+
+    empty = client.get(f"/products/changes?since={delta['next_token']}").get_json()
+    assert empty["created"] == [] and empty["updated"] == [] and empty["deleted"] == []
+    assert empty["next_token"] == delta["next_token"]
+
+
+def test_product_changes_pages_through_large_deltas(client, app):
+    app.config["PRODUCT_CHANGES_LAG_SECONDS"] = 0
+    create_products(app, [{} for _ in range(5)])
+
+    names = []
+    token = None
+    for _ in range(5):
+        url = "/products/changes?limit=2" + (f"&since={token}" if token else "")
+        body = client.get(url).get_json()
+        names.extend(item["name"] for item in body["created"])
+        token = body["next_token"]
+        if not body["has_more"]:
+            break
+
+    assert names == [f"Product {index}" for index in range(5)]
+
+
+def test_product_changes_hold_back_changes_younger_than_the_lag(client, app):
+    now = datetime.utcnow()
+    settled_at = now - timedelta(minutes=1)
+    create_products(app, [{"name": "Settled", "created_at": settled_at, "updated_at": settled_at}])
+
+    body = client.get("/products/changes").get_json()
+    assert [item["name"] for item in body["created"]] == ["Settled"]
+    token = body["next_token"]
+
+    # Stamped before that sync ran, but committed after it.
+    stamped_at = now - timedelta(seconds=5)
+    create_products(app, [{"name": "Late", "barcode": "LATE", "created_at": stamped_at, "updated_at": stamped_at}])
+
+    body = client.get(f"/products/changes?since={token}").get_json()
+    assert body["created"] == []
+    assert body["next_token"] == token
+
+    app.config["PRODUCT_CHANGES_LAG_SECONDS"] = 0
+    body = client.get(f"/products/changes?since={token}").get_json()
+    assert [item["name"] for item in body["created"]] == ["Late"]
+
+
+def test_product_changes_keep_tombstones_sharing_a_timestamp(client, app):
+    app.config["PRODUCT_CHANGES_LAG_SECONDS"] = 0
+    deleted_at = datetime.utcnow() - timedelta(minutes=1)
+    with app.app_context():
+        db.session.add(ProductTombstone(product_id=1, barcode="GONE-1", deleted_at=deleted_at))
+        db.session.commit()
+
+    body = client.get("/products/changes").get_json()
+    assert body["deleted"] == [{"id": 1, "barcode": "GONE-1"}]
+
+    # A second deletion stamped in the same microsecond commits later.
+    with app.app_context():
+        db.session.add(ProductTombstone(product_id=2, barcode="GONE-2", deleted_at=deleted_at))
+        db.session.commit()
+
+    body = client.get(f"/products/changes?since={body['next_token']}").get_json()
+    assert body["deleted"] == [{"id": 2, "barcode": "GONE-2"}]
+
+
+def test_product_changes_rejects_invalid_token(client):
+    response = client.get("/products/changes?since=garbage")
+
+    assert response.status_code == 400
+
+
+def test_get_products_streams_full_listing(client, app):
+    import json
+
+    create_products(app, [{} for _ in range(3)])
+    buffered = client.get("/products/").get_json()
+
+    streamed = client.get("/products/?stream=true")
+    assert streamed.status_code == 200
+    assert streamed.is_streamed
+    assert json.loads(streamed.get_data(as_text=True)) == buffered
+
+    ndjson = client.get("/products/", headers={"Accept": "application/x-ndjson"})
+    assert ndjson.mimetype == "application/x-ndjson"
+    assert [json.loads(line) for line in ndjson.get_data(as_text=True).splitlines()] == buffered
+
+
+def test_get_products_streams_empty_listing(client):
+    response = client.get("/products/?stream=true")
+
+    assert response.get_data(as_text=True) == "[]"
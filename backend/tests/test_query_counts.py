@@ -0,0 +1,207 @@
+from uuid import uuid4
+
+import pytest
+
+from extensions import db
+from models import Invoice, InvoiceItem, Product, User
+from services.catalog_cache import catalog_cache
+
+
+BASE_PASSWORD = "Password123"
+
+
+@pytest.fixture(autouse=True)
+def seeded_catalog_version(app):
+    # The shared catalog version row is created on first use; budgets are
+    # for the steady state.
+    with app.app_context():
+        catalog_cache.version()
+
+
+def login(client, email):
+    client.post(
+        "/auth/register",
+        json={
+            "first_name": "Query",
+            "last_name": "Counter",
+            "email": email,
+            "password": BASE_PASSWORD,
+            "phone_number": "+15557778888",
+            "address": "7 Query Street",
+            "zip_code": "10001",
+            "city": "New York",
+            "country": "USA",
+        },
+    )
+    response = client.post("/auth/login", json={"email": email, "password": BASE_PASSWORD})
+    return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+
+def create_invoice_with_items(app, email, item_count, **fields):
+    """Create an invoice holding item_count lines, each for its own product."""
+    with app.app_context():
+        user = User.query.filter_by(email=email).one()
+        invoice = Invoice(user_id=user.id, total_amount=2.0 * item_count, **fields)
+        db.session.add(invoice)
+        for index in range(item_count):
+            product = Product(
+                name=f"Counted Product {index}",
+                brand="Query Brand",
+                barcode=f"QC-{uuid4().hex[:12]}",
+                category="General",
+                unit="1 unit",
+                price=2.0,
+                quantity_in_stock=10,
+            )
+            db.session.add(product)
+            db.session.flush()
+            db.session.add(InvoiceItem(invoice=invoice, product_id=product.id, quantity=1, unit_price=2.0))
+        db.session.commit()
+        return invoice.id
+
+
+def queries_for(count_queries, request):
+    with count_queries() as statements:
+        response = request()
+    assert response.status_code == 200, response.get_json()
+    return len(statements)
+
+
+# Each bound holds whatever the number of rows involved, so a regression
+# back to one query per row shows up as soon as there are a few of them.
+@pytest.mark.parametrize("item_count", [1, 6])
+def test_invoice_details_query_budget(client, app, count_queries, item_count):
+    headers = login(client, "query.details@example.com")
+    invoice_id = create_invoice_with_items(app, "query.details@example.com", item_count)
+
+    count = queries_for(count_queries, lambda: client.get(f"/invoices/{invoice_id}", headers=headers))
+
+    assert count <= 2
+
+
+@pytest.mark.parametrize("invoice_count", [1, 6])
+def test_invoice_list_query_budget(client, app, count_queries, invoice_count):
+    headers = login(client, "query.list@example.com")
+    for _ in range(invoice_count):
+        create_invoice_with_items(app, "query.list@example.com", 2)
+
+    count = queries_for(count_queries, lambda: client.get("/invoices/me", headers=headers))
+
+    assert count <= 1
+
+
+@pytest.mark.parametrize("product_count", [1, 6])
+def test_product_list_query_budget(client, app, count_queries, product_count):
+    login(client, "query.products@example.com")
+    create_invoice_with_items(app, "query.products@example.com", product_count)
+
+    count = queries_for(count_queries, lambda: client.get("/products/"))
+
+    # The catalog version and stock stamp (for the ETag) and the page.
+    assert count <= 3
+
+
+@pytest.mark.parametrize("item_count", [1, 6])
+def test_paypal_capture_query_budget(client, app, count_queries, monkeypatch, item_count):
+    headers = login(client, "query.capture@example.com")
+    invoice_id = create_invoice_with_items(
+        app,
+        "query.capture@example.com",
+        item_count,
+        payment_method="paypal",
+        payment_status="pending",
+        paypal_order_id=f"ORDER-COUNT-{item_count}",
+    )
+    monkeypatch.setattr(
+        "routes.payment_routes.capture_paypal_order",
+        lambda order_id: {
+            "id": order_id,
+            "status": "COMPLETED",
+            "purchase_units": [
+                {
+                    "payments": {
+                        "captures": [
+                            {
+                                "id": "CAPTURE-COUNT",
+                                "status": "COMPLETED",
+                                "amount": {"currency_code": "USD", "value": f"{2.0 * item_count:.2f}"},
+                            }
+                        ]
+                    }
+                }
+            ],
+        },
+    )
+    monkeypatch.setattr("routes.payment_routes.send_purchase_event_to_algolia", lambda **kwargs: None)
+
+    count = queries_for(
+        count_queries,
+        lambda: client.post("/payments/paypal/capture-order", json={"invoice_id": invoice_id}, headers=headers),
+    )
+
+    # Includes dropping the invoice's stock reservation and queueing the
+    # Algolia purchase event job.
+    assert count <= 9
+
+
+@pytest.mark.parametrize("item_count", [1, 6])
+def test_paypal_webhook_failure_query_budget(client, app, count_queries, monkeypatch, item_count):
+    login(client, "query.webhook@example.com")
+    order_id = f"ORDER-WEBHOOK-COUNT-{item_count}"
+    create_invoice_with_items(
+        app,
+        "query.webhook@example.com",
+        item_count,
+        payment_method="paypal",
+        payment_status="pending",
+        paypal_order_id=order_id,
+    )
+    monkeypatch.setattr("routes.payment_routes.verify_paypal_webhook_signature", lambda headers, payload: True)
+    payload = {
+        "event_type": "PAYMENT.CAPTURE.COMPLETED",
+        "resource": {
+            "id": "CAPTURE-WEBHOOK-COUNT",
+            "amount": {"currency_code": "USD", "value": "0.01"},
+            "supplementary_data": {"related_ids": {"order_id": order_id}},
+        },
+    }
+
+    count = queries_for(count_queries, lambda: client.post("/payments/paypal/webhook", json=payload))
+
+    # Includes bumping the catalog version for the released stock.
+    assert count <= 7
+
+
+@pytest.mark.parametrize("line_count", [1, 6])
+def test_bulk_add_items_query_budget(client, app, count_queries, line_count):
+    headers = login(client, "query.bulk@example.com")
+    invoice_id = create_invoice_with_items(app, "query.bulk@example.com", 0)
+    product_ids = []
+    with app.app_context():
+        for index in range(line_count):
+            product = Product(
+                name=f"Bulk Product {index}",
+                brand="Query Brand",
+                category="General",
+                unit="1 unit",
+                price=1.0,
+                quantity_in_stock=5,
+            )
+            db.session.add(product)
+            db.session.flush()
+            product_ids.append(product.id)
+        db.session.commit()
+
+    with count_queries() as statements:
+        response = client.post(
+            f"/invoices/{invoice_id}/items/bulk",
+            json={"items": [{"product_id": product_id, "quantity": 1} for product_id in product_ids]},
+            headers=headers,
+        )
+
+    assert response.status_code == 201
+    # Invoice and products are read once and stock is reserved with one
+    # UPDATE, plus the catalog version bump. Line INSERTs are left out:
+    # PostgreSQL batches them, SQLite sends one per row to get the new ids
+    # back.
+    assert len([statement for statement in statements if not statement.startswith("INSERT")]) <= 5
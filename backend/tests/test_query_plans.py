@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select, text
+
+from extensions import db
+from models import Invoice, InvoiceItem, Product
+from services.kpi_snapshots import window_metrics_query
+
+
+# Hot queries and the index each one must be served by. Point
+# TEST_DATABASE_URL at a PostgreSQL database to check the same plans there.
+HOT_QUERIES = {
+    "my_invoices": (
+        lambda: select(Invoice).where(Invoice.user_id == 1).order_by(Invoice.created_at.desc()),
+        "ix_invoices_user_created",
+    ),
+    "recent_paid_invoices": (
+        lambda: select(Invoice)
+        .where(Invoice.user_id == 1, Invoice.payment_status == "paid")
+        .order_by(Invoice.created_at.desc())
+        .limit(10),
+        "ix_invoices_user_status_created",
+    ),
+    "paypal_webhook_lookup": (
+        lambda: select(Invoice).where(Invoice.paypal_order_id == "ORDER-1"),
+        "paypal_order_id",
+    ),
+    "paid_revenue_window": (
+        lambda: select(func.sum(Invoice.total_amount)).where(
+            Invoice.payment_status == "paid",
+            Invoice.paid_at >= datetime(2026, 1, 1),
+            Invoice.paid_at < datetime(2026, 1, 2),
+        ),
+        "ix_invoices_paid_at",
+    ),
+    "items_by_invoice": (
+        lambda: select(InvoiceItem).where(InvoiceItem.invoice_id == 1),
+        "ix_invoice_items_invoice_id",
+    ),
+    "items_by_product": (
+        lambda: select(InvoiceItem).where(InvoiceItem.product_id == 1),
+        "ix_invoice_items_product_id",
+    ),
+    "products_by_category": (
+        lambda: select(Product).where(Product.category == "Snacks"),
+        "ix_products_category_energy_kcal",
+    ),
+    "products_by_brand": (
+        lambda: select(Product).where(Product.brand == "Brand"),
+        "ix_products_brand",
+    ),
+    "import_dedup_by_name_and_brand": (
+        lambda: select(Product).where(Product.name == "Name", Product.brand == "Brand").limit(1),
+        "ix_products_name_brand",
+    ),
+}
+
+
+def query_plan(statement):
+    """Return the database's query plan for statement as one string."""
+    dialect = db.engine.dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+
+    if dialect.name == "sqlite":
+        rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+        return "\n".join(row[-1] for row in rows)
+
+    if dialect.name == "postgresql":
+        # Test tables are tiny, so the planner would rightly prefer a
+        # sequential scan; forbid it to see which index it would pick.
+        db.session.execute(text("SET LOCAL enable_seqscan = off"))
+        rows = db.session.execute(text(f"EXPLAIN {sql}")).all()
+        db.session.rollback()
+        return "\n".join(row[0] for row in rows)
+
+    pytest.skip(f"No query plan check for {dialect.name}")
+
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_query_uses_index(app, name):
+    build, index_name = HOT_QUERIES[name]
+
+    with app.app_context():
+        plan = query_plan(build())
+
+    assert index_name in plan, plan
+    table = build().get_final_froms()[0].name
+    # A bare "SCAN <table>" (SQLite) or "Seq Scan" (PostgreSQL) means the
+    # whole table is read.
+    assert f"SCAN {table}\n" not in plan + "\n"
+    assert "Seq Scan" not in plan
+
+
+def test_kpi_windows_read_only_live_invoices_through_paid_at_index(app):
+    now = datetime(2026, 3, 10, 15, 30)
+    windows = {
+        "today": (datetime(2026, 3, 10), now),
+        "last_7_days": (now - timedelta(days=7), now),
+    }
+
+    with app.app_context():
+        plan = query_plan(window_metrics_query(windows))
+
+    assert "ix_invoices_paid_at" in plan, plan
+    assert "SCAN invoices\n" not in plan + "\n"
+    assert "Seq Scan on invoices" not in plan
@@ -0,0 +1,160 @@
+import json
+import logging
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from extensions import db
+from models import Product, User
+from services.catalog_cache import catalog_cache
+from services.request_metrics import request_metrics
+
+
+BASE_PASSWORD = "Password123"
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    request_metrics.reset()
+    yield
+    request_metrics.reset()
+
+
+def login(client, app, email, role="customer"):
+    client.post(
+        "/auth/register",
+        json={
+            "first_name": "Metrics",
+            "last_name": "Tester",
+            "email": email,
+            "password": BASE_PASSWORD,
+            "phone_number": "+15556667777",
+            "address": "6 Metrics Street",
+            "zip_code": "10001",
+            "city": "New York",
+            "country": "USA",
+        },
+    )
+    if role != "customer":
+        with app.app_context():
+            User.query.filter_by(email=email).one().role = role
+            db.session.commit()
+    response = client.post("/auth/login", json={"email": email, "password": BASE_PASSWORD})
+    return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+
+def create_product(app):
+    with app.app_context():
+        db.session.add(
+            Product(
+                name="Metrics Product",
+                brand="Metrics Brand",
+                category="General",
+                unit="1 unit",
+                price=1.0,
+                quantity_in_stock=3,
+            )
+        )
+        db.session.commit()
+        # Seed the shared catalog version, so /products/ costs its steady
+        # three queries: the version, the stock stamp and the page.
+        catalog_cache.version()
+
+
+def test_server_timing_header_reports_queries(client, app):
+    create_product(app)
+
+    response = client.get("/products/")
+
+    assert response.status_code == 200
+    timing = response.headers["Server-Timing"]
+    assert timing.startswith("db;dur=")
+    assert 'desc="3 queries"' in timing
+    assert "app;dur=" in timing
+
+
+def test_server_timing_without_database_work(client):
+    response = client.get("/health")
+
+    assert 'desc="0 queries"' in response.headers["Server-Timing"]
+
+
+def test_request_log_line_is_structured(client, app, caplog):
+    create_product(app)
+
+    with caplog.at_level(logging.INFO, logger="services.request_metrics"):
+        client.get("/products/?category=General")
+
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record["event"] == "request"
+    assert record["endpoint"] == "products.get_products"
+    assert record["path"] == "/products/"
+    assert record["status"] == 200
+    assert record["db_queries"] == 3
+    assert record["slowest_query"].startswith("SELECT")
+    assert record["db_time_ms"] >= record["slowest_query_ms"] >= 0
+
+
+@pytest.mark.parametrize("propagate", [True, False])
+def test_failed_request_is_recorded(client, app, caplog, monkeypatch, propagate):
+    from routes import product_routes
+
+    def broken_listing(args):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(product_routes, "product_listing_query", broken_listing)
+    app.config["PROPAGATE_EXCEPTIONS"] = propagate
+
+    with caplog.at_level(logging.INFO, logger="services.request_metrics"):
+        if propagate:
+            with pytest.raises(RuntimeError):
+                client.get("/products/")
+        else:
+            assert client.get("/products/").status_code == 500
+
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record["endpoint"] == "products.get_products"
+    assert record["status"] == 500
+    body = request_metrics.render_prometheus()
+    assert 'http_request_duration_seconds_count{endpoint="products.get_products"} 1' in body
+
+
+def test_request_log_line_is_emitted_at_info_by_default(app):
+    # create_app configures the logger; nothing else raises it past WARNING.
+    assert logging.getLogger("services.request_metrics").isEnabledFor(logging.INFO)
+
+
+def test_failed_statement_does_not_leak_timer(app):
+    with app.app_context():
+        with db.engine.connect() as conn:
+            with pytest.raises(DBAPIError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+            assert conn.info.get("request_metrics_started") == []
+
+
+def test_metrics_requires_admin(client, app):
+    assert client.get("/metrics").status_code == 401
+
+    headers = login(client, app, "metrics.customer@example.com")
+    assert client.get("/metrics", headers=headers).status_code == 403
+
+
+def test_metrics_exposes_per_endpoint_histograms(client, app):
+    create_product(app)
+    headers = login(client, app, "metrics.admin@example.com", role="admin")
+    client.get("/products/")
+    client.get("/products/")
+
+    response = client.get("/metrics", headers=headers)
+    body = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert "# TYPE db_time_seconds histogram" in body
+    assert "# TYPE db_queries_per_request histogram" in body
+    assert 'http_request_duration_seconds_count{endpoint="products.get_products"} 2' in body
+    assert 'db_queries_per_request_bucket{endpoint="products.get_products",le="2"} 0' in body
+    assert 'db_queries_per_request_bucket{endpoint="products.get_products",le="5"} 2' in body
+    assert 'db_queries_per_request_sum{endpoint="products.get_products"} 6.000000' in body
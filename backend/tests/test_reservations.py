@@ -0,0 +1,363 @@
+from datetime import datetime, timedelta
+
+from extensions import db
+from models import Invoice, Product, StockReservation
+from services.reservations import release_expired_reservations
+
+
+BASE_PASSWORD = "Password123"
+
+DELIVERY = {
+    "fullName": "Reservation Tester",
+    "email": "reservation.tester@example.com",
+    "phone": "+15556667777",
+    "address": "6 Reservation Street",
+    "city": "New York",
+    "state": "NY",
+    "zipCode": "10001",
+}
+
+
+def login(client, email):
+    client.post(
+        "/auth/register",
+        json={
+            "first_name": "Reservation",
+            "last_name": "Tester",
+            "email": email,
+            "password": BASE_PASSWORD,
+            "phone_number": "+15556667777",
+            "address": "6 Reservation Street",
+            "zip_code": "10001",
+            "city": "New York",
+            "country": "USA",
+        },
+    )
+    response = client.post("/auth/login", json={"email": email, "password": BASE_PASSWORD})
+    return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+
+def create_product(app, price=2.0, stock=10):
+    with app.app_context():
+        product = Product(
+            name="Reservation Product",
+            brand="Reservation Brand",
+            category="General",
+            unit="1 unit",
+            price=price,
+            quantity_in_stock=stock,
+        )
+        db.session.add(product)
+        db.session.commit()
+        return product.id
+
+
+def checkout(client, headers, product_id, quantity):
+    response = client.post(
+        "/checkout",
+        json={
+            "deliveryAddress": DELIVERY,
+            "paymentMethod": "paypal",
+            "items": [{"product_id": product_id, "quantity": quantity}],
+        },
+        headers=headers,
+    )
+    assert response.status_code == 201
+    return response.get_json()["invoice_id"]
+
+
+def stock_of(app, product_id):
+    with app.app_context():
+        return db.session.get(Product, product_id).quantity_in_stock
+
+
+def sweep(app, minutes=31, **kwargs):
+    with app.app_context():
+        return release_expired_reservations(now=datetime.utcnow() + timedelta(minutes=minutes), **kwargs)
+
+
+def test_cart_changes_hold_and_extend_the_reservation(client, app):
+    headers = login(client, "reservation.hold@example.com")
+    product_id = create_product(app)
+    invoice_id = checkout(client, headers, product_id, 2)
+
+    with app.app_context():
+        first_expiry = db.session.get(StockReservation, invoice_id).expires_at
+        assert first_expiry > datetime.utcnow() + timedelta(minutes=29)
+
+    item_id = client.get(f"/invoices/{invoice_id}", headers=headers).get_json()["items"][0]["id"]
+    response = client.patch(f"/invoices/{invoice_id}/items/{item_id}", json={"quantity": 3}, headers=headers)
+    assert response.status_code == 200
+
+    with app.app_context():
+        assert db.session.get(StockReservation, invoice_id).expires_at >= first_expiry
+        assert StockReservation.query.count() == 1
+
+
+def test_sweep_releases_expired_stock_and_expires_invoice(client, app):
+    headers = login(client, "reservation.sweep@example.com")
+    product_id = create_product(app, stock=10)
+    invoice_id = checkout(client, headers, product_id, 4)
+    assert stock_of(app, product_id) == 6
+
+    assert sweep(app, minutes=5) == {"invoices": 0, "units": 0}
+    assert stock_of(app, product_id) == 6
+
+    assert sweep(app) == {"invoices": 1, "units": 4}
+    assert stock_of(app, product_id) == 10
+    with app.app_context():
+        assert db.session.get(Invoice, invoice_id).payment_status == "expired"
+        assert StockReservation.query.count() == 0
+
+    # Running again must not give the stock back twice.
+    assert sweep(app) == {"invoices": 0, "units": 0}
+    assert stock_of(app, product_id) == 10
+
+
+def test_sweep_works_through_several_batches(client, app):
+    headers = login(client, "reservation.batches@example.com")
+    product_id = create_product(app, stock=10)
+    for _ in range(5):
+        checkout(client, headers, product_id, 1)
+
+    assert sweep(app, batch_size=2) == {"invoices": 5, "units": 5}
+    assert stock_of(app, product_id) == 10
+
+
+def test_expired_invoice_cannot_be_modified(client, app):
+    headers = login(client, "reservation.modify@example.com")
+    product_id = create_product(app)
+    invoice_id = checkout(client, headers, product_id, 1)
+    sweep(app)
+
+    response = client.post(
+        f"/invoices/{invoice_id}/items",
+        json={"product_id": product_id, "quantity": 1},
+        headers=headers,
+    )
+
+    assert response.status_code == 409
+    assert stock_of(app, product_id) == 10
+
+
+def test_paying_clears_the_reservation(client, app, monkeypatch):
+    headers = login(client, "reservation.paid@example.com")
+    product_id = create_product(app, price=2.5)
+    invoice_id = checkout(client, headers, product_id, 2)
+    monkeypatch.setattr(
+        "routes.payment_routes.capture_paypal_order",
+        lambda order_id: {
+            "id": order_id,
+            "status": "COMPLETED",
+            "purchase_units": [
+                {
+                    "payments": {
+                        "captures": [
+                            {
+                                "id": "CAPTURE-RES",
+                                "status": "COMPLETED",
+                                "amount": {"currency_code": "USD", "value": "5.00"},
+                            }
+                        ]
+                    }
+                }
+            ],
+        },
+    )
+    monkeypatch.setattr("routes.payment_routes.send_purchase_event_to_algolia", lambda **kwargs: None)
+
+    response = client.post(
+        "/payments/paypal/capture-order",
+        json={"invoice_id": invoice_id, "order_id": "ORDER-RES"},
+        headers=headers,
+    )
+
+    assert response.status_code == 200
+    assert sweep(app) == {"invoices": 0, "units": 0}
+    assert stock_of(app, product_id) == 8
+    with app.app_context():
+        assert StockReservation.query.count() == 0
+
+
+def test_capture_of_expired_invoice_reclaims_stock_or_refuses(client, app, monkeypatch):
+    headers = login(client, "reservation.reclaim@example.com")
+    product_id = create_product(app, stock=3)
+    invoice_id = checkout(client, headers, product_id, 2)
+    sweep(app)
+
+    # Someone else bought the released stock.
+    with app.app_context():
+        db.session.get(Product, product_id).quantity_in_stock = 1
+        db.session.commit()
+
+    captured = []
+    monkeypatch.setattr("routes.payment_routes.capture_paypal_order", lambda order_id: captured.append(order_id))
+
+    response = client.post(
+        "/payments/paypal/capture-order",
+        json={"invoice_id": invoice_id, "order_id": "ORDER-EXPIRED"},
+        headers=headers,
+    )
+
+    assert response.status_code == 409
+    assert captured == []
+    assert stock_of(app, product_id) == 1
+
+    with app.app_context():
+        db.session.get(Product, product_id).quantity_in_stock = 5
+        db.session.commit()
+
+    monkeypatch.setattr(
+        "routes.payment_routes.create_paypal_order",
+        lambda amount, return_url=None, cancel_url=None: {"order_id": "ORDER-AGAIN", "status": "CREATED"},
+    )
+    response = client.post("/payments/paypal/create-order", json={"invoice_id": invoice_id}, headers=headers)
+
+    assert response.status_code == 200
+    assert response.get_json()["invoice"]["payment_status"] == "pending"
+    assert stock_of(app, product_id) == 3
+    with app.app_context():
+        assert db.session.get(StockReservation, invoice_id) is not None
+
+
+def test_capture_reclaims_stock_when_invoice_expires_while_paypal_answers(client, app, monkeypatch):
+    headers = login(client, "reservation.race@example.com")
+    product_id = create_product(app, stock=3)
+    invoice_id = checkout(client, headers, product_id, 2)
+
+    def capture_while_sweep_runs(order_id):
+        # Another process sweeps while PayPal is capturing.
+        with app.app_context():
+            assert release_expired_reservations(now=datetime.utcnow() + timedelta(minutes=31))["invoices"] == 1
+        return {
+            "id": order_id,
+            "status": "COMPLETED",
+            "purchase_units": [
+                {
+                    "payments": {
+                        "captures": [
+                            {
+                                "id": "CAPTURE-RACE",
+                                "status": "COMPLETED",
+                                "amount": {"currency_code": "USD", "value": "4.00"},
+                            }
+                        ]
+                    }
+                }
+            ],
+        }
+
+    monkeypatch.setattr("routes.payment_routes.capture_paypal_order", capture_while_sweep_runs)
+    monkeypatch.setattr("routes.payment_routes.send_purchase_event_to_algolia", lambda **kwargs: None)
+
+    response = client.post(
+        "/payments/paypal/capture-order",
+        json={"invoice_id": invoice_id, "order_id": "ORDER-RACE"},
+        headers=headers,
+    )
+
+    assert response.status_code == 200
+    assert response.get_json()["invoice"]["payment_status"] == "paid"
+    # The sweep gave the two units back; the capture took them again.
+    assert stock_of(app, product_id) == 1
+    with app.app_context():
+        invoice = db.session.get(Invoice, invoice_id)
+        assert invoice.payment_status == "paid"
+        assert invoice.paypal_capture_id == "CAPTURE-RACE"
+        assert db.session.get(StockReservation, invoice_id) is None
+
+
+def test_sweep_leaves_stock_of_invoice_paid_after_it_was_picked(client, app, monkeypatch):
+    headers = login(client, "reservation.sweep.race@example.com")
+    product_id = create_product(app, stock=3)
+    invoice_id = checkout(client, headers, product_id, 2)
+
+    from services import reservations
+
+    real_expire = reservations._expire_open_invoices
+
+    def pay_then_expire(invoice_ids):
+        # A capture commits after the sweep picked the reservation.
+        with app.app_context():
+            db.session.get(Invoice, invoice_id).payment_status = "paid"
+            db.session.commit()
+        return real_expire(invoice_ids)
+
+    monkeypatch.setattr(reservations, "_expire_open_invoices", pay_then_expire)
+
+    assert sweep(app) == {"invoices": 0, "units": 0}
+    assert stock_of(app, product_id) == 1
+    with app.app_context():
+        assert db.session.get(Invoice, invoice_id).payment_status == "paid"
+        assert db.session.get(StockReservation, invoice_id) is None
+
+
+def test_sweeper_command_survives_a_failed_sweep(app, monkeypatch):
+    import app as app_module
+
+    calls = []
+
+    def flaky_sweep(batch_size):
+        calls.append(batch_size)
+        if len(calls) == 1:
+            raise RuntimeError("connection lost")
+        return {"invoices": 0, "units": 0}
+
+    class Stop(Exception):
+        pass
+
+    def sleep(seconds):
+        if len(calls) == 2:
+            raise Stop()
+
+    monkeypatch.setattr(app_module, "release_expired_reservations", flaky_sweep)
+    monkeypatch.setattr(app_module.time, "sleep", sleep)
+
+    result = app.test_cli_runner().invoke(args=["release-expired-reservations", "--interval", "5"])
+
+    assert isinstance(result.exception, Stop)
+    assert len(calls) == 2
+
+
+def test_webhook_reclaims_stock_when_invoice_expires_after_it_was_read(client, app, monkeypatch):
+    headers = login(client, "reservation.webhook.race@example.com")
+    product_id = create_product(app, stock=3)
+    invoice_id = checkout(client, headers, product_id, 2)
+    with app.app_context():
+        db.session.get(Invoice, invoice_id).paypal_order_id = "ORDER-WEBHOOK-RACE"
+        db.session.commit()
+
+    from routes import payment_routes
+
+    real_to_money = payment_routes._to_money
+    swept = []
+
+    def to_money_while_sweep_runs(value):
+        # The webhook has loaded the invoice; another process sweeps now.
+        if not swept:
+            with app.app_context():
+                swept.append(release_expired_reservations(now=datetime.utcnow() + timedelta(minutes=31)))
+        return real_to_money(value)
+
+    monkeypatch.setattr(payment_routes, "_to_money", to_money_while_sweep_runs)
+    monkeypatch.setattr(payment_routes, "verify_paypal_webhook_signature", lambda headers, payload: True)
+
+    response = client.post(
+        "/payments/paypal/webhook",
+        json={
+            "event_type": "PAYMENT.CAPTURE.COMPLETED",
+            "resource": {
+                "id": "CAPTURE-WEBHOOK-RACE",
+                "amount": {"currency_code": "USD", "value": "4.00"},
+                "supplementary_data": {"related_ids": {"order_id": "ORDER-WEBHOOK-RACE"}},
+            },
+        },
+    )
+
+    assert response.status_code == 200
+    assert swept == [{"invoices": 1, "units": 2}]
+    assert stock_of(app, product_id) == 1
+    with app.app_context():
+        invoice = db.session.get(Invoice, invoice_id)
+        assert invoice.payment_status == "paid"
+        assert invoice.paypal_capture_id == "CAPTURE-WEBHOOK-RACE"